@@ -21,6 +21,8 @@ import signal
 import struct
 import threading
 
+from collections import OrderedDict, deque, namedtuple
+
 SPICOMM_DEV = '/dev/vision_spicomm'
 
 SPICOMM_IOCTL_RESET         = 0x00008901
@@ -34,11 +36,40 @@ FLAG_ERROR = 1 << 0
 FLAG_TIMEOUT = 1 << 1
 FLAG_OVERFLOW = 1 << 2
 
+DEFAULT_MMAP_BUFFERS = 1
+DEFAULT_SMALL_PAYLOAD_SIZE = 64 * 1024  # 64K
+
+# Number of transactions with the same request key observed before buffers are
+# sized from their responses instead of the default payload size.
+_MIN_OBSERVATIONS = 8
+# Requests up to this size are keyed by their bytes, larger ones by size class.
+_MAX_KEYED_REQUEST_SIZE = 256
+# Max number of distinct small requests whose responses are tracked.
+_MAX_KEYED_REQUESTS = 64
+# Max number of reused large buffers.
+_MAX_LARGE_BUFFERS = 2
+# Number of transactions after which an unused temporary mapping is unmapped.
+_MAX_TEMP_IDLE = 16
+
 def _get_default_payload_size():
     return int(os.environ.get('VISION_BONNET_SPICOMM_DEFAULT_PAYLOAD_SIZE',
                               DEFAULT_PAYLOAD_SIZE))
 
 
+def _get_default_mmap_buffers():
+    return int(os.environ.get('VISION_BONNET_SPICOMM_MMAP_BUFFERS',
+                              DEFAULT_MMAP_BUFFERS))
+
+
+def _get_default_small_payload_size():
+    return int(os.environ.get('VISION_BONNET_SPICOMM_SMALL_PAYLOAD_SIZE',
+                              DEFAULT_SMALL_PAYLOAD_SIZE))
+
+
+def _num_pages(length):
+    return (length + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+
+
 class SpicommError(IOError):
     """Base class for all Spicomm errors."""
     pass
@@ -64,6 +95,171 @@ class SpicommTimeoutError(SpicommError):
         self.timeout = timeout
 
 
+class SpicommLease:
+    """Response data borrowed from a transaction buffer.
+
+    The memoryview returned by `data` is valid until release() is called, after
+    that the underlying buffer can be reused by subsequent transactions. Use as
+    a context manager to get the memoryview and release it automatically::
+
+      with spicomm.transact_lease(request) as data:
+          response.ParseFromString(data)
+    """
+
+    def __init__(self, data, release=None):
+        self._data = data
+        self._release = release
+
+    @property
+    def data(self):
+        return self._data
+
+    def release(self):
+        if self._data is None:
+            return
+        self._data.release()
+        self._data = None
+        if self._release:
+            self._release()
+            self._release = None
+
+    def __enter__(self):
+        return self._data
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.release()
+
+
+def _size_class(size):
+    """Returns the smallest power of two not less than size, at least a page."""
+    return max(mmap.PAGESIZE, 1 << max(size - 1, 0).bit_length())
+
+
+class SizeHistogram:
+    """Histogram of sizes with power of two buckets."""
+
+    def __init__(self):
+        self._counts = [0] * 64
+
+    def add(self, size):
+        self._counts[max(size - 1, 0).bit_length()] += 1
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    def max(self):
+        """Returns upper bound of the highest non-empty bucket, 0 if empty."""
+        for i in reversed(range(len(self._counts))):
+            if self._counts[i]:
+                return 1 << i
+        return 0
+
+    def buckets(self):
+        """Returns dict of bucket upper bound to count of non-empty buckets."""
+        return {1 << i: count for i, count in enumerate(self._counts) if count}
+
+
+# transactions: int, number of transactions.
+# small_buffer_hits: int, transactions which used the small control buffer.
+# allocations: int, number of allocated or mapped large buffers.
+# overflows: int, transactions failed because response didn't fit.
+# resident_bytes: int, total size of buffers currently held.
+# request_sizes: SizeHistogram of request payload sizes.
+# response_sizes: SizeHistogram of response payload sizes.
+BufferStats = namedtuple('BufferStats',
+    ('transactions', 'small_buffer_hits', 'allocations', 'overflows', 'resident_bytes',
+     'request_sizes', 'response_sizes'))
+
+
+class _BufferPool:
+    """Transaction buffers sized from observed request and response sizes.
+
+    Requests whose responses are known to be small use one small buffer, others
+    use large buffers rounded up to a size class and reused for later requests.
+    Small requests, i.e. control messages, are keyed by their bytes and larger
+    ones by their size class. Until enough responses to requests with the same
+    key are observed, buffers are sized to hold a response of
+    default_payload_size.
+    """
+
+    def __init__(self, default_payload_size, small_payload_size):
+        self._default_payload_size = default_payload_size
+        self._small = bytearray(HEADER_SIZE + small_payload_size)
+        self._large = OrderedDict()  # Size class -> bytearray, in LRU order.
+        self._responses = {}  # Request key -> [count, max response size].
+        self._keyed_requests = 0
+        self._requests_hist = SizeHistogram()
+        self._responses_hist = SizeHistogram()
+        self._transactions = 0
+        self._small_hits = 0
+        self._allocations = 0
+        self._overflows = 0
+
+    @staticmethod
+    def _key(request):
+        if len(request) <= _MAX_KEYED_REQUEST_SIZE:
+            return bytes(request)
+        return _size_class(len(request))
+
+    def payload_size(self, request):
+        """Returns payload size expected to fit both request and response."""
+        request_size = len(request)
+        count, response_size = self._responses.get(self._key(request), (0, 0))
+        if count < _MIN_OBSERVATIONS:
+            response_size = max(self._default_payload_size, response_size)
+        else:
+            response_size *= 2  # Headroom for responses larger than observed.
+        return max(request_size, response_size)
+
+    def grow(self, size):
+        """Makes buffers for requests without enough observations hold size bytes."""
+        self._default_payload_size = max(self._default_payload_size, size)
+
+    def acquire(self, request):
+        """Returns bytearray buffer for transaction with given request."""
+        size = self.payload_size(request)
+        if size <= len(self._small) - HEADER_SIZE:
+            self._small_hits += 1
+            return self._small
+
+        size = _size_class(size)
+        buf = self._large.pop(size, None)
+        if buf is None:
+            self._allocations += 1
+            buf = bytearray(HEADER_SIZE + size)
+            while len(self._large) >= _MAX_LARGE_BUFFERS:
+                self._large.popitem(last=False)
+        self._large[size] = buf
+        return buf
+
+    def record(self, request, response_size, overflow=False):
+        """Records sizes of a finished transaction."""
+        self._transactions += 1
+        self._requests_hist.add(len(request))
+        self._responses_hist.add(response_size)
+        if overflow:
+            self._overflows += 1
+
+        key = self._key(request)
+        entry = self._responses.get(key)
+        if entry is None:
+            if isinstance(key, bytes):
+                # Unknown small requests beyond the limit keep the default size.
+                if self._keyed_requests >= _MAX_KEYED_REQUESTS:
+                    return
+                self._keyed_requests += 1
+            entry = self._responses[key] = [0, 0]
+        entry[0] += 1
+        entry[1] = max(entry[1], response_size)
+
+    def stats(self):
+        resident = len(self._small) + sum(len(buf) for buf in self._large.values())
+        return BufferStats(self._transactions, self._small_hits, self._allocations,
+                           self._overflows, resident, self._requests_hist,
+                           self._responses_hist)
+
+
 def _read_header(buf):
     """Returns (flags, timeout_ms, buffer_size, payload_size) tuple."""
     return struct.unpack('IIII', buf[0:HEADER_SIZE])
@@ -108,27 +304,36 @@ def _check_flags(flags, timeout_ms, payload_size):
         raise e
 
 
-def _async_loop(dev, pipe, default_payload_size):
+def _async_loop(dev, pipe, ring, slot_size, default_payload_size):
     # Essentially this process can only receive SIGKILL.
     signal.signal(signal.SIGINT, signal.SIG_IGN)
     signal.signal(signal.SIGTERM, signal.SIG_IGN)
 
-    allocated_buf = bytearray(HEADER_SIZE + default_payload_size)
+    slots = [memoryview(ring)[i:i + slot_size] for i in range(0, len(ring), slot_size)]
+    allocated_buf = None
     while True:
-        payload_size, timeout = pipe.recv()
-        use_allocated_buf = payload_size <= (len(allocated_buf) - HEADER_SIZE)
-
-        if use_allocated_buf:
-            buf = allocated_buf
-        else:
-            buf = bytearray(HEADER_SIZE + payload_size)
+        index, payload_size, timeout, response_size = pipe.recv()
+        try:
+            if index is not None:
+                # Request is already in the shared slot, response is left there.
+                fcntl.ioctl(dev, SPICOMM_IOCTL_TRANSACT, slots[index])
+                pipe.send(None)
+                continue
+
+            # Request didn't fit or all slots are leased: data goes through the pipe.
+            buffer_size = max(payload_size, response_size)
+            if buffer_size <= default_payload_size:
+                if allocated_buf is None:
+                    allocated_buf = bytearray(HEADER_SIZE + default_payload_size)
+                buf = allocated_buf
+            else:
+                buf = bytearray(HEADER_SIZE + buffer_size)
 
-        timeout_ms = _get_timeout_ms(timeout, payload_size)
+            timeout_ms = _get_timeout_ms(timeout, payload_size)
 
-        _write_header(buf, timeout_ms, payload_size)
-        pipe.recv_bytes_into(buf, HEADER_SIZE)
+            _write_header(buf, timeout_ms, payload_size)
+            pipe.recv_bytes_into(buf, HEADER_SIZE)
 
-        try:
             fcntl.ioctl(dev, SPICOMM_IOCTL_TRANSACT, buf)
             flags, _, _, payload_size = _read_header(buf)
             e = _get_exception(flags, timeout_ms, payload_size)
@@ -145,19 +350,44 @@ class AsyncSpicomm:
     Driver ioctl() calls are made inside separate process to allow other threads
     from the current process to work smoothly. Otherwise other threads are blocked
     because of global interpreter lock.
+
+    Requests and responses are exchanged through a ring of `num_buffers` slots
+    in shared memory, only small control messages go through the pipe. A request
+    is copied once into a free slot and the response is read directly from it,
+    transact_lease() returns a view into the slot without copying. Requests
+    larger than a slot, or sent while all slots are leased, fall back to copying
+    data through the pipe.
     """
 
-    def __init__(self, default_payload_size=None):
+    def __init__(self, default_payload_size=None, num_buffers=None):
+        if default_payload_size is None:
+            default_payload_size = _get_default_payload_size()
+        if num_buffers is None:
+            num_buffers = _get_default_mmap_buffers()
+        if num_buffers < 1:
+            raise ValueError('Number of buffers must be positive.')
+
+        # Anonymous mapping created before fork is shared with the child process.
+        slot_size = mmap.PAGESIZE * _num_pages(HEADER_SIZE + default_payload_size)
+        self._ring = mmap.mmap(-1, num_buffers * slot_size)
+        self._slots = [memoryview(self._ring)[i * slot_size:
+                                              i * slot_size + HEADER_SIZE + default_payload_size]
+                       for i in range(num_buffers)]
+        self._free = deque(range(num_buffers))
+        self._inflight = None
+        self._response_size = 0
+        self._transactions = 0
+        self._overflows = 0
+        self._requests_hist = SizeHistogram()
+        self._responses_hist = SizeHistogram()
+
         self._dev = os.open(SPICOMM_DEV, os.O_RDWR)
         self._pipe, pipe = mp.Pipe()
         self._lock = threading.Lock()
         ctx = mp.get_context('fork')
 
-        if default_payload_size is None:
-            default_payload_size = _get_default_payload_size()
-
         self._process = ctx.Process(target=_async_loop, daemon=True,
-            args=(self._dev, pipe, default_payload_size))
+            args=(self._dev, pipe, self._ring, slot_size, default_payload_size))
         self._process.start()
 
     def __enter__(self):
@@ -167,13 +397,39 @@ class AsyncSpicomm:
         self.close()
 
     def close(self):
+        """Stops the worker process.
+
+        All SpicommLease objects must be released before close() is called.
+        """
         os.kill(self._process.pid, signal.SIGKILL)
         self._process.join()
         os.close(self._dev)
+        for slot in self._slots:
+            slot.release()
+        self._ring.close()
 
     def reset(self):
         fcntl.ioctl(self._dev, SPICOMM_IOCTL_RESET)
 
+    def _transact(self, receive, request, timeout):
+        # Setup temporary SIGINT handler
+        with self._lock:
+            captured_args = None
+            def handler(*args):
+                nonlocal captured_args
+                captured_args = args
+            old_handler = signal.signal(signal.SIGINT, handler)
+
+            # Execute communication transaction without SIGINT interruptions
+            try:
+                self.send_request(request, timeout)
+                return receive()
+            finally:
+                # Setup old SIGINT handler or call it directly if SIGINT already happened
+                signal.signal(signal.SIGINT, old_handler)
+                if captured_args:
+                    old_handler(*captured_args)
+
     def transact(self, request, timeout=None):
         """Execute transaction in a separate process.
 
@@ -189,28 +445,93 @@ class AsyncSpicomm:
           SpicommTimeoutError: Transaction timed out.
           SpicommError: Transaction error.
         """
+        return self._transact(self.receive_response, request, timeout)
 
-        # Setup temporary SIGINT handler
-        with self._lock:
-            captured_args = None
-            def handler(*args):
-                nonlocal captured_args
-                captured_args = args
-            old_handler = signal.signal(signal.SIGINT, handler)
+    def transact_lease(self, request, timeout=None):
+        """Executes transaction and returns view of the response in the ring.
 
-            # Execute communication transaction without SIGINT interruptions
-            self._pipe.send((len(request), timeout))
-            self._pipe.send_bytes(request)
-            response = self._pipe.recv()
+        The returned SpicommLease must be released before the slot can be used
+        again and before close() is called.
+        """
+        return self._transact(self.receive_response_lease, request, timeout)
 
-            # Setup old SIGINT handler or call it directly if SIGINT already happened
-            signal.signal(signal.SIGINT, old_handler)
-            if captured_args:
-                old_handler(*captured_args)
+    def fileno(self):
+        """Returns file descriptor which becomes readable when response is ready.
 
+        Used with send_request() and receive_response() to wait for responses
+        without blocking, e.g. with asyncio loop.add_reader().
+        """
+        return self._pipe.fileno()
+
+    def _acquire(self, request):
+        size = len(self._slots[0]) - HEADER_SIZE
+        if len(request) <= size and self._response_size <= size:
+            try:
+                return self._free.popleft()
+            except IndexError:
+                pass  # All slots are leased.
+        return None
+
+    def send_request(self, request, timeout=None):
+        """Starts transaction in a separate process, does not wait for response.
+
+        Only one transaction may be in progress, receive_response() must be
+        called before the next send_request().
+        """
+        payload_size = len(request)
+        self._transactions += 1
+        self._requests_hist.add(payload_size)
+        index = self._acquire(request)
+        if index is None:
+            self._pipe.send((None, payload_size, timeout, self._response_size))
+            self._pipe.send_bytes(request)
+        else:
+            timeout_ms = _get_timeout_ms(timeout, payload_size)
+            _write_header(self._slots[index], timeout_ms, payload_size)
+            _write_payload(self._slots[index], request)
+            self._pipe.send((index, payload_size, timeout, 0))
+        self._inflight = index
+
+    def grow(self, size):
+        """Sends requests through the pipe if size doesn't fit ring slots."""
+        self._response_size = max(self._response_size, size)
+
+    def stats(self):
+        """Returns BufferStats of the shared memory ring."""
+        return BufferStats(self._transactions, 0, 0, self._overflows, len(self._ring),
+                           self._requests_hist, self._responses_hist)
+
+    def receive_response_lease(self):
+        """Same as receive_response() but returns response data as SpicommLease."""
+        index, self._inflight = self._inflight, None
+        try:
+            response = self._pipe.recv()
             if isinstance(response, Exception):
                 raise response
-            return response
+            if index is None:
+                self._responses_hist.add(len(response))
+                return SpicommLease(memoryview(response))
+
+            slot = self._slots[index]
+            flags, timeout_ms, _, payload_size = _read_header(slot)
+            _check_flags(flags, timeout_ms, payload_size)
+        except BaseException as e:
+            if isinstance(e, SpicommOverflowError):
+                self._overflows += 1
+            if index is not None:
+                self._free.append(index)
+            raise
+        self._responses_hist.add(payload_size)
+        return SpicommLease(slot[HEADER_SIZE:HEADER_SIZE + payload_size],
+                            lambda: self._free.append(index))
+
+    def receive_response(self):
+        """Returns response of the transaction started by send_request().
+
+        Blocks until response is ready. Raises the same exceptions as transact().
+        """
+        with self.receive_response_lease() as data:
+            return bytes(data)
 
 
 class SyncSpicommBase:
@@ -237,6 +558,26 @@ class SyncSpicommBase:
     def transact_impl(self, request, timeout):
         raise NotImplementedError
 
+    def stats(self):
+        """Returns BufferStats of transaction buffers."""
+        raise NotImplementedError
+
+    def grow(self, size):
+        """Makes following transactions use buffers for responses of size bytes.
+
+        Called after SpicommOverflowError with its size, so that retried
+        transaction doesn't overflow again.
+        """
+        raise NotImplementedError
+
+    def transact_lease(self, request, timeout=None):
+        """Same as transact() but returns response data as SpicommLease.
+
+        Subclasses may return a view into the transaction buffer without
+        copying the response.
+        """
+        return SpicommLease(memoryview(self.transact(request, timeout)))
+
 
 class SyncSpicomm(SyncSpicommBase):
     """Class for communication with VisionBonnet via kernel driver.
@@ -245,11 +586,14 @@ class SyncSpicomm(SyncSpicommBase):
     process are blocked while icotl() is running because of global interpreter lock.
     """
 
-    def __init__(self, default_payload_size=None):
+    def __init__(self, default_payload_size=None, small_payload_size=None):
         super().__init__()
         if default_payload_size is None:
             default_payload_size = _get_default_payload_size()
-        self._allocated_buf = bytearray(HEADER_SIZE + default_payload_size)
+        if small_payload_size is None:
+            small_payload_size = _get_default_small_payload_size()
+        self._pool = _BufferPool(default_payload_size,
+                                 min(small_payload_size, default_payload_size))
 
     def transact_impl(self, request, timeout):
         """Execute transaction in the current process.
@@ -266,30 +610,32 @@ class SyncSpicomm(SyncSpicommBase):
           SpicommTimeoutError: Transaction timed out.
           SpicommError: Transaction error.
         """
-        payload_size = len(request)
-        use_allocated_buf = payload_size <= (len(self._allocated_buf) - HEADER_SIZE)
+        request_size = len(request)
+        buf = self._pool.acquire(request)
+        timeout_ms = _get_timeout_ms(timeout, request_size)
 
-        if use_allocated_buf:
-            buf = self._allocated_buf
-        else:
-            buf = bytearray(HEADER_SIZE + payload_size)
-
-        timeout_ms = _get_timeout_ms(timeout, payload_size)
-
-        _write_header(buf, timeout_ms, payload_size)
+        _write_header(buf, timeout_ms, request_size)
         _write_payload(buf, request)
 
         fcntl.ioctl(self._dev, SPICOMM_IOCTL_TRANSACT, buf)
         flags, _, _, payload_size = _read_header(buf)
+        self._pool.record(request, payload_size,
+                          overflow=bool(flags & FLAG_ERROR and flags & FLAG_OVERFLOW))
         _check_flags(flags, timeout_ms, payload_size)
 
-        if use_allocated_buf:
-            return bytearray(_read_payload(buf, payload_size))
+        return bytearray(_read_payload(buf, payload_size))
+
+    def stats(self):
+        with self._lock:
+            return self._pool.stats()
 
-        return _read_payload(buf, payload_size)
+    def grow(self, size):
+        with self._lock:
+            self._pool.grow(size)
 
 
 def _transact_mmap(dev, mm, offset, request, timeout):
+    """Executes transaction using mapped buffer, returns response size."""
     payload_size = len(request)
     timeout_ms = _get_timeout_ms(timeout, payload_size)
     flags = 0
@@ -303,7 +649,7 @@ def _transact_mmap(dev, mm, offset, request, timeout):
     fcntl.ioctl(dev, SPICOMM_IOCTL_TRANSACT_MMAP, buf)
     flags, _, _, payload_size = _read_header(buf)
     _check_flags(flags, timeout_ms, payload_size)
-    return bytearray(mm[0:payload_size])
+    return payload_size
 
 
 class SyncSpicommMmap(SyncSpicommBase):
@@ -311,27 +657,139 @@ class SyncSpicommMmap(SyncSpicommBase):
 
     Driver ioctl() calls are made in the same process. All threads in the current
     process are *not* blocked while icotl() is running.
+
+    Transactions use one of `num_buffers` mapped buffers. Responses returned by
+    transact_lease() are views into these buffers, with two or more buffers a
+    response can be parsed while the next transaction runs in another buffer.
     """
 
-    def __init__(self, default_payload_size=None):
+    def __init__(self, default_payload_size=None, num_buffers=None):
         super().__init__()
         if default_payload_size is None:
             default_payload_size = _get_default_payload_size()
-        self._mm = mmap.mmap(self._dev, length=default_payload_size, offset=0)
+        if num_buffers is None:
+            num_buffers = _get_default_mmap_buffers()
+        if num_buffers < 1:
+            raise ValueError('Number of buffers must be positive.')
+
+        pages = _num_pages(default_payload_size)
+        self._buffers = []
+        self._temp = None
+        try:
+            for i in range(num_buffers):
+                self._buffers.append((i * pages, mmap.mmap(self._dev,
+                    length=default_payload_size, offset=mmap.PAGESIZE * i * pages)))
+        except Exception:
+            self.close()
+            raise
+        self._free = deque(range(num_buffers))
+        self._temp_offset = num_buffers * pages
+        self._temp_idle = 0
+        self._response_size = 0
+        self._requests_hist = SizeHistogram()
+        self._responses_hist = SizeHistogram()
+        self._transactions = 0
+        self._allocations = 0
+        self._overflows = 0
 
     def close(self):
-        self._mm.close()
+        for _, mm in self._buffers:
+            mm.close()
+        self._close_temp()
         super().close()
 
+    def _close_temp(self):
+        if self._temp:
+            self._temp.close()
+            self._temp = None
+
+    def _transact(self, mm, offset, request, timeout):
+        try:
+            payload_size = _transact_mmap(self._dev, mm, offset, request, timeout)
+        except SpicommOverflowError as e:
+            self._record(len(request), e.size, overflow=True)
+            raise
+        self._record(len(request), payload_size)
+        return payload_size
+
+    def _record(self, request_size, response_size, overflow=False):
+        self._transactions += 1
+        self._requests_hist.add(request_size)
+        self._responses_hist.add(response_size)
+        if overflow:
+            self._overflows += 1
+
+    def _transact_temp(self, request, timeout):
+        # Temporary buffer, placed after all default ones. It is kept mapped
+        # for following large requests until it is unused for a while.
+        length = mmap.PAGESIZE * _num_pages(
+            max(len(request), len(self._buffers[0][1]), self._response_size))
+        if self._temp is None or len(self._temp) < length:
+            self._close_temp()
+            self._allocations += 1
+            self._temp = mmap.mmap(self._dev, length=length,
+                                   offset=mmap.PAGESIZE * self._temp_offset)
+        self._temp_idle = 0
+        return self._temp[0:self._transact(self._temp, self._temp_offset, request, timeout)]
+
+    def _transact_default(self, index, request, timeout):
+        self._temp_idle += 1
+        if self._temp_idle > _MAX_TEMP_IDLE:
+            self._close_temp()
+        offset, mm = self._buffers[index]
+        return mm, self._transact(mm, offset, request, timeout)
+
+    def stats(self):
+        with self._lock:
+            resident = sum(len(mm) for _, mm in self._buffers)
+            if self._temp:
+                resident += len(self._temp)
+            return BufferStats(self._transactions, 0, self._allocations, self._overflows,
+                               resident, self._requests_hist, self._responses_hist)
+
+    def _acquire(self, request):
+        size = len(self._buffers[0][1])
+        if len(request) < size and self._response_size <= size:
+            try:
+                return self._free.popleft()
+            except IndexError:
+                pass  # All default buffers are leased.
+        return None
+
+    def grow(self, size):
+        """Uses the temporary mapping for all requests if size doesn't fit buffers."""
+        with self._lock:
+            self._response_size = max(self._response_size, size)
+
     def transact_impl(self, request, timeout=None):
-        if len(request) < len(self._mm):
-            # Default buffer
-            return _transact_mmap(self._dev, self._mm, 0, request, timeout)
-
-        # Temporary bigger buffer
-        offset = (len(self._mm) + (mmap.PAGESIZE - 1)) // mmap.PAGESIZE
-        with mmap.mmap(self._dev, length=len(request), offset=mmap.PAGESIZE * offset) as mm:
-            return _transact_mmap(self._dev, mm, offset, request, timeout)
+        index = self._acquire(request)
+        if index is None:
+            return self._transact_temp(request, timeout)
+
+        try:
+            mm, payload_size = self._transact_default(index, request, timeout)
+            return mm[0:payload_size]
+        finally:
+            self._free.append(index)
+
+    def transact_lease(self, request, timeout=None):
+        """Executes transaction and returns zero-copy view of the response.
+
+        The returned SpicommLease must be released before the buffer can be
+        used again and before close() is called.
+        """
+        with self._lock:
+            index = self._acquire(request)
+            if index is None:
+                return SpicommLease(memoryview(self._transact_temp(request, timeout)))
+
+            try:
+                mm, payload_size = self._transact_default(index, request, timeout)
+            except Exception:
+                self._free.append(index)
+                raise
+            return SpicommLease(memoryview(mm)[0:payload_size],
+                                lambda: self._free.append(index))
 
 
 # Scicomm class provides the ability to send and receive data as a transaction.
@@ -14,13 +14,20 @@
 
 """Transport to communicate with VisionBonnet board."""
 
+import asyncio
+import itertools
 import logging
 import os
 import socket
 import struct
+import threading
+
+from collections import deque
 
 from . import _spicomm
 
+logger = logging.getLogger(__name__)
+
 class _SpiTransport:
     """Communicate with VisionBonnet over SPI bus."""
 
@@ -30,51 +37,223 @@ class _SpiTransport:
     def send(self, request, timeout=None):
         return self._spicomm.transact(request, timeout=timeout)
 
+    def send_lease(self, request, timeout=None):
+        return self._spicomm.transact_lease(request, timeout=timeout)
+
+    def buffer_stats(self):
+        """Returns _spicomm.BufferStats of sync spicomm transaction buffers."""
+        return self._spicomm.stats()
+
+    def grow_buffers(self, size):
+        """Makes buffers hold responses of size bytes, see SpicommOverflowError."""
+        self._spicomm.grow(size)
+
     def close(self):
         self._spicomm.close()
 
 
-def _socket_recvall(s, size):
-    buf = b''
-    while size:
-        newbuf = s.recv(size)
-        if not newbuf:
-            return None
-        buf += newbuf
-        size -= len(newbuf)
-    return buf
+def _socket_recv_into(s, view):
+    """Fills the whole view, returns False if connection was closed."""
+    while view:
+        size = s.recv_into(view)
+        if not size:
+            return False
+        view = view[size:]
+    return True
 
 
-def _socket_receive_message(s):
-    buf = _socket_recvall(s, 4)  # 4 bytes
-    if not buf:
+def _socket_receive_message(s, header=None):
+    """Receives length-prefixed message into a buffer allocated to its size."""
+    header = header or bytearray(4)
+    if not _socket_recv_into(s, memoryview(header)):
         return None
-    size = struct.unpack('!I', buf)[0]
-    return _socket_recvall(s, size)
+    buf = bytearray(struct.unpack('!I', header)[0])
+    if not _socket_recv_into(s, memoryview(buf)):
+        return None
+    return buf
 
 
 def _socket_send_message(s, msg):
-    s.sendall(struct.pack('!I', len(msg)))  # 4 bytes
-    s.sendall(msg)  # len(msg) bytes
+    header = struct.pack('!I', len(msg))  # 4 bytes
+    # Single gathering send of header and len(msg) bytes, so that small
+    # messages are not delayed by Nagle's algorithm.
+    sent = s.sendmsg((header, msg))
+    if sent < len(header):
+        s.sendall(header[sent:])
+        sent = len(header)
+    if sent - len(header) < len(msg):
+        s.sendall(memoryview(msg)[sent - len(header):])
+
+
+class _PendingResponse:
+    """Response to a request sent over _SocketConnection."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self._event = threading.Event()
+        self._response = None
+        self._error = None
+
+    def _set(self, response, error=None):
+        self._response, self._error = response, error
+        self._event.set()
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Waits for the response and returns its bytes.
+
+        Raises:
+          socket.timeout: response did not arrive in time. It is still matched
+            with this request and discarded when it arrives.
+          ConnectionError: connection was closed.
+        """
+        if not self._event.wait(timeout):
+            raise socket.timeout('Request %d timed out.' % self.request_id)
+        if self._error:
+            raise self._error
+        return self._response
+
+
+class _SocketConnection:
+    """Persistent connection to the bonnet, shared by threads and transports.
+
+    Requests are pipelined: any number of them can be outstanding. The bonnet
+    handles requests of one connection in order, so every request is tagged
+    with a sequential id and matched with responses in arrival order by a
+    reader thread.
+    """
+
+    def __init__(self, address):
+        self._address = address
+        self._sock = socket.create_connection(address)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._send_lock = threading.Lock()
+        self._pending = deque()
+        self._ids = itertools.count()
+        self._error = None
+        self.refs = 0
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    @property
+    def address(self):
+        return self._address
+
+    def submit(self, request):
+        """Sends request without waiting for the response.
+
+        Returns:
+          _PendingResponse for the request.
+        """
+        with self._send_lock:
+            if self._error:
+                raise self._error
+            pending = _PendingResponse(next(self._ids))
+            self._pending.append(pending)
+            try:
+                _socket_send_message(self._sock, request)
+                return pending
+            except Exception as e:
+                self._pending.pop()
+                error = e
+        # A partially sent request desyncs the stream, responses can't be
+        # matched with requests anymore.
+        self._fail(ConnectionError('Sending to %s:%d failed: %s' % (self._address + (error,))))
+        raise error
+
+    def _read_loop(self):
+        header = bytearray(4)
+        error = ConnectionError('Connection to %s:%d closed.' % self._address)
+        try:
+            while True:
+                response = _socket_receive_message(self._sock, header)
+                if response is None:
+                    break
+                if not self._pending:
+                    raise RuntimeError('Unexpected response.')
+                self._pending.popleft()._set(response)
+        except Exception as e:
+            logger.debug('Connection to %s failed: %s', self._address, e)
+            error = ConnectionError('Connection to %s:%d failed: %s' % (self._address + (e,)))
+        self._fail(error)
+
+    def _fail(self, error):
+        """Fails all pending requests and shuts the connection down."""
+        with self._send_lock:
+            if self._error is None:
+                self._error = error
+            while self._pending:
+                self._pending.popleft()._set(None, self._error)
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._reader.join()
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def _acquire_connection(address):
+    with _connections_lock:
+        connection = _connections.get(address)
+        if connection is None or connection._error:
+            connection = _connections[address] = _SocketConnection(address)
+        connection.refs += 1
+        return connection
+
+
+def _release_connection(connection):
+    with _connections_lock:
+        connection.refs -= 1
+        if connection.refs:
+            return
+        if _connections.get(connection.address) is connection:
+            del _connections[connection.address]
+    connection.close()
+
+
+def _get_socket_address():
+    host = os.environ.get('VISION_BONNET_HOST', '172.28.28.10')
+    port = int(os.environ.get('VISION_BONNET_PORT', '35000'))
+    return host, port
 
 
 class _SocketTransport:
-    """Communicate with VisionBonnet over socket."""
+    """Communicate with VisionBonnet over socket.
+
+    All transports of the process connected to the same address share one
+    pipelined connection.
+    """
 
     def __init__(self):
         """Open connection to the bonnet."""
-        self._client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._connection = _acquire_connection(_get_socket_address())
 
-        host = os.environ.get('VISION_BONNET_HOST', '172.28.28.10')
-        port = int(os.environ.get('VISION_BONNET_PORT', '35000'))
-        self._client.connect((host, port))
+    def submit(self, request):
+        """Sends request and returns _PendingResponse without waiting."""
+        return self._connection.submit(request)
 
     def send(self, request, timeout=None):
-        _socket_send_message(self._client, request)
-        return _socket_receive_message(self._client)
+        return self.submit(request).result(timeout)
+
+    def send_lease(self, request, timeout=None):
+        return _spicomm.SpicommLease(memoryview(self.send(request, timeout)))
 
     def close(self):
-        self._client.close()
+        if self._connection:
+            _release_connection(self._connection)
+            self._connection = None
 
 
 def _is_arm():
@@ -85,3 +264,158 @@ def make_transport():
     if _is_arm():
         return _SpiTransport()
     return _SocketTransport()
+
+
+class _AsyncSpiTransport:
+    """Communicate with VisionBonnet over SPI bus from asyncio event loop.
+
+    Transactions run in AsyncSpicomm process, the loop waits on its pipe. The
+    driver handles one transaction at a time, so a request cancelled by the
+    caller still holds the bus until its response arrives and is discarded.
+    """
+
+    def __init__(self, loop=None):
+        self._loop = loop or asyncio.get_event_loop()
+        self._spicomm = _spicomm.AsyncSpicomm()
+        self._pending = deque()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._loop.add_reader(self._spicomm.fileno(), self._on_response)
+
+    def _on_response(self):
+        future = self._pending.popleft()
+        try:
+            response = self._spicomm.receive_response()
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(response)
+        self._idle.set()
+
+    async def send(self, request, timeout=None):
+        while not self._idle.is_set():
+            await self._idle.wait()
+        if self._spicomm is None:
+            raise ConnectionError('Transport is closed.')
+        self._idle.clear()
+        future = self._loop.create_future()
+        self._pending.append(future)
+        self._spicomm.send_request(request, timeout)
+        return await future
+
+    def grow_buffers(self, size):
+        """Makes buffers hold responses of size bytes, see SpicommOverflowError."""
+        if self._spicomm:
+            self._spicomm.grow(size)
+
+    async def close(self):
+        if self._spicomm:
+            self._loop.remove_reader(self._spicomm.fileno())
+            self._spicomm.close()
+            self._spicomm = None
+            while self._pending:
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionError('Transport is closed.'))
+            self._idle.set()
+
+
+class _AsyncSocketTransport:
+    """Communicate with VisionBonnet over socket from asyncio event loop.
+
+    Requests are pipelined like in _SocketConnection, a reader task matches
+    responses with requests in arrival order. Responses of cancelled requests
+    are discarded.
+    """
+
+    def __init__(self, loop=None):
+        self._loop = loop or asyncio.get_event_loop()
+        self._address = _get_socket_address()
+        self._lock = asyncio.Lock()
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._pending = deque()
+        self._error = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(*self._address)
+        sock = self._writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._read_task = self._loop.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        error = ConnectionError('Connection to %s:%d closed.' % self._address)
+        try:
+            while True:
+                header = await self._reader.readexactly(4)
+                size = struct.unpack('!I', header)[0]
+                response = await self._reader.readexactly(size)
+                if not self._pending:
+                    raise ConnectionError('Unexpected response.')
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(response)
+        except asyncio.IncompleteReadError:
+            pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug('Connection to %s failed: %s', self._address, e)
+            error = ConnectionError('Connection to %s:%d failed: %s' % (self._address + (e,)))
+        finally:
+            self._fail(error)
+
+    def _fail(self, error):
+        """Fails all pending requests and closes the connection."""
+        if self._error is None:
+            self._error = error
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(self._error)
+        if self._writer:
+            self._writer.close()
+
+    async def send(self, request, timeout=None):
+        """Sends request and returns response bytes.
+
+        Raises:
+          asyncio.TimeoutError: response did not arrive in time. It is still
+            matched with this request and discarded when it arrives.
+          ConnectionError: connection was closed.
+        """
+        async with self._lock:
+            if self._error:
+                raise self._error
+            if self._writer is None:
+                await self._connect()
+            future = self._loop.create_future()
+            self._pending.append(future)
+            # Whole message is buffered before any await, so cancellation
+            # can't leave a partial message on the stream.
+            self._writer.write(struct.pack('!I', len(request)))
+            self._writer.write(request)
+            await self._writer.drain()
+        return await asyncio.wait_for(future, timeout)
+
+    async def close(self):
+        if self._error is None:
+            self._fail(ConnectionError('Transport is closed.'))
+        if self._writer:
+            self._writer.close()
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+
+
+def make_async_transport(loop=None):
+    if _is_arm():
+        return _AsyncSpiTransport(loop)
+    return _AsyncSocketTransport(loop)
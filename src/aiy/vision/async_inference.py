@@ -0,0 +1,390 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Asyncio interface to VisionBonnet inference.
+
+AsyncInferenceEngine has the same methods as InferenceEngine, but they are
+coroutines which wait on the transport instead of blocking a thread::
+
+  async with AsyncCameraInference(face_detection.model()) as inference:
+      async for result in inference.run():
+          faces = face_detection.get_faces(result)
+
+Every method accepts timeout in seconds and raises asyncio.TimeoutError when
+the response does not arrive in time. Cancelled and timed out requests still
+occupy the bonnet until their responses arrive, which are then discarded.
+Idempotent requests which time out are retried according to the engine's
+RetryPolicy, like with InferenceEngine.
+"""
+
+import asyncio
+import itertools
+import logging
+import socket
+import time
+from collections import OrderedDict
+
+from . import metrics
+from ._spicomm import SpicommOverflowError, SpicommTimeoutError
+from ._transport import make_async_transport
+from .inference import (FirmwareVersion, FrameTiming, InferenceException, RecoveryStats,
+                        RetryPolicy, _IDEMPOTENT_REQUESTS, _REQ_CAMERA_INFERENCE,
+                        _REQ_GET_CAMERA_STATE, _REQ_GET_FIRMWARE_INFO, _REQ_GET_INFERENCE_STATE,
+                        _REQ_GET_SYSTEM_INFO, _REQ_RESET, _REQ_STOP_CAMERA_INFERENCE,
+                        _REQUEST_TYPES, _RequestTemplates, _TensorPacker, _check_firmware_info,
+                        _check_model_name, _load_model_request, _model_registry,
+                        _parse_response, _record_response, _start_camera_inference_request,
+                        _unload_model_request)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncInferenceEngine:
+    """Asyncio version of InferenceEngine.
+
+    Must be created and used from a single event loop. Requests of concurrent
+    coroutines are pipelined over socket and serialized over SPI.
+    """
+
+    def __init__(self, loop=None, retry_policy=None):
+        """Initialization.
+
+        Args:
+          loop: asyncio event loop, the current one by default.
+          retry_policy: RetryPolicy of idempotent requests, RetryPolicy() by
+            default.
+        """
+        self._transport = make_async_transport(loop)
+        self._packer = _TensorPacker()
+        self._templates = _RequestTemplates()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._models = OrderedDict()  # Model name -> descriptor of loaded models.
+        self._camera_session = None   # (model name, params, sparse configs).
+        self._recovering = False
+        self._recovery_stats = RecoveryStats(0, 0.0, 0.0)
+        logger.info('AsyncInferenceEngine transport: %s', self._transport.__class__.__name__)
+
+    async def close(self):
+        await self._transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb):
+        await self.close()
+
+    @property
+    def metrics(self):
+        """Request metrics of all engines, see aiy.vision.metrics."""
+        return metrics.get_metrics()
+
+    @property
+    def recovery_stats(self):
+        """RecoveryStats of recover() calls of this engine."""
+        return self._recovery_stats
+
+    async def _communicate(self, request, timeout=None):
+        start = time.monotonic()
+        request_bytes = request.SerializeToString()
+        return await self._communicate_bytes(request_bytes, timeout, request.WhichOneof('request'),
+                                             time.monotonic() - start)
+
+    async def _communicate_bytes(self, request_bytes, timeout=None, request_type=None,
+                                 serialize=None):
+        response, _ = await self._request(request_bytes, timeout, request_type, serialize)
+        return response
+
+    async def _request(self, request_bytes, timeout=None, request_type=None, serialize=None):
+        """Returns (response, time when response data was received)."""
+        request_type = request_type or _REQUEST_TYPES.get(request_bytes, 'unknown')
+        policy = self.retry_policy
+        retry = request_type in _IDEMPOTENT_REQUESTS and not self._recovering
+        attempt, recovered = 1, False
+        while True:
+            try:
+                return await self._transact(request_bytes, timeout, request_type, serialize)
+            except (asyncio.TimeoutError, SpicommTimeoutError, SpicommOverflowError,
+                    socket.timeout) as e:
+                if isinstance(e, SpicommOverflowError):
+                    grow_buffers = getattr(self._transport, 'grow_buffers', None)
+                    if grow_buffers:
+                        grow_buffers(e.size)
+                if not retry:
+                    raise
+                if attempt >= policy.attempts:
+                    if recovered or not policy.recover or isinstance(e, SpicommOverflowError):
+                        raise
+                    await self.recover()
+                    recovered = True
+                else:
+                    await asyncio.sleep(min(policy.max_backoff,
+                                            policy.backoff * policy.multiplier ** (attempt - 1)))
+                    attempt += 1
+                logger.warning('Retry %s request after error: %r', request_type, e)
+                if metrics.enabled():
+                    metrics.get_metrics().record_retry(request_type)
+
+    async def _transact(self, request_bytes, timeout, request_type, serialize):
+        send = asyncio.wait_for(self._transport.send(request_bytes, timeout), timeout)
+        if not metrics.enabled():
+            data = await send
+            received = time.monotonic()
+            return _parse_response(data), received
+
+        sent = time.monotonic()
+        try:
+            data = await send
+            received = time.monotonic()
+            response = _parse_response(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.get_metrics().record_error(request_type, len(request_bytes), e)
+            raise
+        _record_response(request_type, len(request_bytes), len(data), response,
+                         serialize, received - sent, time.monotonic() - received)
+        return response, received
+
+    async def recover(self, timeout=None):
+        """Resets the bonnet and restores models and camera inference of this engine.
+
+        Models in use through the model registry are restored for all engines,
+        models loaded directly by other engines are not.
+        """
+        start = time.monotonic()
+        self._recovering = True
+        try:
+            await self._communicate_bytes(_REQ_RESET, timeout)
+            models = OrderedDict(self._models)
+            for descriptor in _model_registry.recovered():
+                models.setdefault(descriptor.name, descriptor)
+            logger.warning('Recover VisionBonnet, restore %d model(s).', len(models))
+            for descriptor in models.values():
+                await self._communicate(_load_model_request(descriptor), timeout)
+            if self._camera_session:
+                await self._communicate(_start_camera_inference_request(*self._camera_session),
+                                        timeout)
+        finally:
+            self._recovering = False
+            duration = time.monotonic() - start
+            count, _, total = self._recovery_stats
+            self._recovery_stats = RecoveryStats(count + 1, duration, total + duration)
+        logger.warning('VisionBonnet recovered in %.3f seconds.', duration)
+
+    async def load_model(self, descriptor, timeout=None):
+        """Loads model on VisionBonnet, returns model identifier."""
+        _check_firmware_info(await self.get_firmware_info(timeout))
+        request = _load_model_request(descriptor)
+        try:
+            logger.info('Load model "%s".', descriptor.name)
+            await self._communicate(request, timeout)
+        except InferenceException as e:
+            logger.warning(str(e))
+
+        self._models[descriptor.name] = descriptor
+        return descriptor.name
+
+    async def unload_model(self, model_name, timeout=None):
+        """Deletes model on VisionBonnet."""
+        _check_model_name(model_name)
+
+        logger.info('Unload model "%s".', model_name)
+        self._models.pop(model_name, None)
+        await self._communicate(_unload_model_request(model_name), timeout)
+
+    async def start_camera_inference(self, model_name, params=None, sparse_configs=None,
+                                     timeout=None):
+        """Starts inference running on VisionBonnet."""
+        _check_model_name(model_name)
+
+        logger.info('Start camera inference on "%s".', model_name)
+        await self._communicate(
+            _start_camera_inference_request(model_name, params, sparse_configs), timeout)
+        self._camera_session = (model_name, params, sparse_configs)
+
+    async def camera_inference(self, timeout=None):
+        """Returns the latest inference result from VisionBonnet."""
+        return (await self._camera_inference(timeout))[0]
+
+    async def _camera_inference(self, timeout=None):
+        """Returns (inference result, time when it was received)."""
+        response, received = await self._request(_REQ_CAMERA_INFERENCE, timeout)
+        return response.inference_result, received
+
+    async def stop_camera_inference(self, timeout=None):
+        """Stops inference running on VisionBonnet."""
+        logger.info('Stop camera inference.')
+        await self._communicate_bytes(_REQ_STOP_CAMERA_INFERENCE, timeout)
+        self._camera_session = None
+
+    async def get_inference_state(self, timeout=None):
+        """Returns inference state."""
+        return (await self._communicate_bytes(_REQ_GET_INFERENCE_STATE, timeout)).inference_state
+
+    async def get_camera_state(self, timeout=None):
+        """Returns current camera state."""
+        return (await self._communicate_bytes(_REQ_GET_CAMERA_STATE, timeout)).camera_state
+
+    async def get_firmware_info(self, timeout=None):
+        """Returns firmware version as (major, minor) tuple."""
+        try:
+            response = await self._communicate_bytes(_REQ_GET_FIRMWARE_INFO, timeout)
+            info = response.firmware_info
+            return FirmwareVersion(info.major_version, info.minor_version)
+        except InferenceException:
+            return FirmwareVersion(1, 0)  # Request is not supported by firmware, default to 1.0
+
+    async def get_system_info(self, timeout=None):
+        """Returns system information: uptime, memory usage, temperature."""
+        return (await self._communicate_bytes(_REQ_GET_SYSTEM_INFO, timeout)).system_info
+
+    async def image_inference(self, model_name, image, params=None, sparse_configs=None,
+                              size=None, letterbox=False, timeout=None):
+        """Runs inference on image, see InferenceEngine.image_inference().
+
+        Image is packed on the event loop thread before the request is sent.
+        """
+        _check_model_name(model_name)
+
+        logger.info('Image inference on "%s".', model_name)
+        start = time.monotonic()
+        template = self._templates.get(model_name, params, sparse_configs)
+        request_bytes = template.render(*self._packer.pack_parts(image, size, letterbox))
+        response = await self._communicate_bytes(request_bytes, timeout, 'image_inference',
+                                                 time.monotonic() - start)
+        return response.inference_result
+
+    async def reset(self, timeout=None):
+        await self._communicate_bytes(_REQ_RESET, timeout)
+        self._models.clear()
+        self._camera_session = None
+        _model_registry.reset(self)
+
+
+class _CameraResults:
+    """Async iterator of AsyncCameraInference.run()."""
+
+    def __init__(self, inference, count, timeout):
+        self._inference = inference
+        self._counter = itertools.count() if count is None else iter(range(count))
+        self._timeout = timeout
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if next(self._counter, None) is None:
+            raise StopAsyncIteration
+        return await self._inference._next(self._timeout)
+
+
+class AsyncCameraInference:
+    """Asyncio version of CameraInference.
+
+    Model is acquired through the same model registry as CameraInference when
+    entering the context and released when leaving.
+    """
+
+    def __init__(self, descriptor, params=None, sparse_configs=None, engine=None):
+        """Initialization.
+
+        Args:
+          descriptor: ModelDescriptor of the model.
+          params: dict, inference params.
+          sparse_configs: dict, sparse configs of output tensors.
+          engine: AsyncInferenceEngine to use, a new one is created and closed
+            with this object if None.
+        """
+        self._descriptor = descriptor
+        self._params = params
+        self._sparse_configs = sparse_configs
+        self._engine = engine
+        self._own_engine = engine is None
+        self._model_name = None
+        self._started = False
+        self._rate = 0.0
+        self._count = 0
+        self._timing = None
+        self._before = None
+
+    async def start(self, timeout=None):
+        """Loads the model and starts camera inference."""
+        if self._engine is None:
+            self._engine = AsyncInferenceEngine()
+        try:
+            self._model_name = await _model_registry.acquire_async(
+                self._engine, self._descriptor, timeout)
+            await self._engine.start_camera_inference(self._model_name, self._params,
+                                                      self._sparse_configs, timeout)
+            self._started = True
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _next(self, timeout):
+        requested = time.monotonic()
+        result, received = await self._engine._camera_inference(timeout)
+        now = time.monotonic()
+        self._rate = 1.0 / (now - self._before) if self._before else 0.0
+        self._timing = FrameTiming(requested, received, now)
+        self._before = now
+        self._count += 1
+        return result
+
+    def run(self, count=None, timeout=None):
+        """Returns async iterator of camera inference results.
+
+        Args:
+          count: int, number of results to return, or None to run forever.
+          timeout: float, seconds to wait for every result.
+        """
+        return _CameraResults(self, count, timeout)
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def timing(self):
+        """FrameTiming of the last returned result."""
+        return self._timing
+
+    async def close(self):
+        if self._engine is None:
+            return
+        try:
+            if self._started:
+                self._started = False
+                await self._engine.stop_camera_inference()
+            if self._model_name:
+                model_name, self._model_name = self._model_name, None
+                await _model_registry.release_async(self._engine, model_name)
+        finally:
+            if self._own_engine:
+                await self._engine.close()
+                self._engine = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb):
+        await self.close()
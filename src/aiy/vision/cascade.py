@@ -0,0 +1,128 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Detect-then-classify cascade.
+
+Cascade classifies regions of an image, e.g. boxes returned by
+object_detection or face_detection, with a second model::
+
+  with Cascade(image_classification.model()) as cascade:
+      for box, result in cascade.run(image, objects):
+          classes = image_classification.get_classes(result, top_k=3)
+
+Regions are cropped and resized to the model input size on the host, so only
+input-sized tensors are uploaded. Requests are pipelined and the cascade stops
+as soon as the stop function returns True for a region.
+"""
+
+import contextlib
+
+from collections import namedtuple
+
+from .inference import InferenceEngine, _close_stack_silently, _model_registry
+from .models.detections import Detections
+
+# box: (x, y, width, height) region of the image.
+# result: InferenceResult of the region.
+RegionResult = namedtuple('RegionResult', ('box', 'result'))
+
+
+def _boxes(regions):
+    """Returns list of (x, y, width, height) from boxes or detection results."""
+    if isinstance(regions, Detections):
+        return regions.bounding_boxes()
+    return [getattr(region, 'bounding_box', region) for region in regions]
+
+
+def _clip(box, size):
+    """Returns box clipped to image size as PIL (left, upper, right, lower)."""
+    x, y, width, height = box
+    image_width, image_height = size
+    left, upper = max(0, int(x)), max(0, int(y))
+    right, lower = min(image_width, int(x + width)), min(image_height, int(y + height))
+    if right <= left or lower <= upper:
+        return None
+    return left, upper, right, lower
+
+
+class Cascade:
+    """Classifies image regions with a second model."""
+
+    def __init__(self, descriptor, params=None, sparse_configs=None, depth=4, resize=True):
+        """Initialization.
+
+        Args:
+          descriptor: ModelDescriptor of the classification model.
+          params: dict, inference params.
+          sparse_configs: dict, sparse configs of output tensors.
+          depth: int, max number of region requests in flight.
+          resize: bool, whether to resize regions to the model input size on
+            the host. Otherwise regions are uploaded in original size.
+        """
+        self._params = params
+        self._sparse_configs = sparse_configs
+        self._depth = depth
+        _, height, width, _ = descriptor.input_shape
+        self._input_size = (width, height) if resize and width and height else None
+        self._stack = contextlib.ExitStack()
+        self._engine = self._stack.enter_context(InferenceEngine())
+        try:
+            self._model_name = _model_registry.acquire(self._engine, descriptor)
+            self._stack.callback(_model_registry.release, self._engine, self._model_name)
+        except Exception:
+            _close_stack_silently(self._stack)
+            raise
+
+    def run(self, image, regions, stop=None):
+        """Returns list of RegionResult of classified regions.
+
+        Args:
+          image: PIL.Image, image the regions are from.
+          regions: Detections, objects with bounding_box attribute (e.g. Face
+            or Object) or (x, y, width, height) tuples. Regions outside of the
+            image are skipped.
+          stop: function(RegionResult) -> bool, regions after the first one
+            for which stop returns True are not classified.
+        """
+        boxes = []
+        for box in _boxes(regions):
+            clipped = _clip(box, image.size)
+            if clipped:
+                boxes.append((box, clipped))
+
+        crops = (image.crop(clipped) for _, clipped in boxes)
+        region_results = []
+        results = self._engine.image_inference_batch(
+            self._model_name, crops, self._params, self._sparse_configs, self._depth,
+            self._input_size)
+        try:
+            for (box, _), result in zip(boxes, results):
+                region_results.append(RegionResult(box, result))
+                if stop and stop(region_results[-1]):
+                    break
+        finally:
+            results.close()
+        return region_results
+
+    @property
+    def engine(self):
+        return self._engine
+
+    def close(self):
+        self._stack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
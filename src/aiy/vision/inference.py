@@ -23,12 +23,26 @@ how to use this API.
 """
 
 import contextlib
+import hashlib
+import io
 import itertools
+import json
 import logging
+import os
+import socket
+import tempfile
+import threading
 import time
-from collections import namedtuple
+from collections import Counter, OrderedDict, deque, namedtuple
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import metrics
 from .proto import protocol_pb2 as pb2
+from ._spicomm import SpicommOverflowError, SpicommTimeoutError
 from ._transport import make_transport
 
 logger = logging.getLogger(__name__)
@@ -39,8 +53,11 @@ logger = logging.getLogger(__name__)
 #     trained with. For example, if the model is trained with [-1, 1] input. To analyze an RGB image
 #     (input range 0-255), one needs to specify the input normalizer as (128.0, 128.0).
 # compute_graph: bytes, serialized model protobuf.
+# output_spec: optional description of output tensors used to decode inference
+#     results on the host, see aiy.vision.models.decoders.
 ModelDescriptor = namedtuple('ModelDescriptor',
-    ('name', 'input_shape', 'input_normalizer', 'compute_graph'))
+    ('name', 'input_shape', 'input_normalizer', 'compute_graph', 'output_spec'))
+ModelDescriptor.__new__.__defaults__ = (None,)
 
 ThresholdingConfig = namedtuple('ThresholdingConfig',
     ('logical_shape', 'threshold', 'top_k', 'to_ignore'))
@@ -48,6 +65,40 @@ ThresholdingConfig = namedtuple('ThresholdingConfig',
 FromSparseTensorConfig = namedtuple('FromSparseTensorConfig',
     ('logical_shape', 'tensor_name', 'squeeze_dims'))
 
+# Raw image pixels, e.g. unencoded picamera capture, usable without PIL.
+# data: bytes-like object with pixel data.
+# width: int, image width.
+# height: int, image height.
+# format: string, 'rgb' or 'bgr' (3 interleaved bytes per pixel), 'gray' (1 byte
+#     per pixel) or 'yuv' (YUV420 planar, picamera padding of width to 32 and
+#     height to 16 pixels is detected automatically).
+RawImage = namedtuple('RawImage', ('data', 'width', 'height', 'format'))
+
+
+class ImageTransform(namedtuple('ImageTransform',
+                                ('scale_x', 'scale_y', 'offset_x', 'offset_y'))):
+    """Maps inference result coordinates back to the original image.
+
+    Original coordinates are (x * scale_x + offset_x, y * scale_y + offset_y),
+    the same arguments as Detections.transform() takes.
+    """
+
+    def point(self, x, y):
+        return x * self.scale_x + self.offset_x, y * self.scale_y + self.offset_y
+
+    def box(self, bounding_box):
+        """Returns (x, y, width, height) box in original image coordinates."""
+        x, y, width, height = bounding_box
+        x, y = self.point(x, y)
+        return x, y, width * self.scale_x, height * self.scale_y
+
+ImageTransform.IDENTITY = ImageTransform(1.0, 1.0, 0.0, 0.0)
+
+# Estimated JPEG size relative to raw size, used to choose upload format.
+_JPEG_SIZE_RATIO = 0.1
+# Min estimated transfer saving to encode JPEG on the host.
+_JPEG_MIN_SAVING = 512 * 1024
+
 # major: int, major firmware version
 # minor: int, minor firmware version
 FirmwareVersion = namedtuple('FirmwareVersion', ('major', 'minor'))
@@ -56,6 +107,31 @@ FirmwareVersion.__str__ = lambda self: '%d.%d' % (self.major, self.minor)
 
 _SUPPORTED_FIRMWARE_VERSION = FirmwareVersion(1, 2)
 
+# Timing of a single camera inference result, all values are time.monotonic()
+# seconds.
+# requested: float, when camera_inference request was sent to the bonnet.
+# received: float, when inference result was received from the bonnet.
+# consumed: float, when inference result was handed over to the caller.
+FrameTiming = namedtuple('FrameTiming', ('requested', 'received', 'consumed'))
+FrameTiming.latency = property(lambda self: self.consumed - self.requested)
+
+# Retries of idempotent requests (camera_inference, image_inference and get_*)
+# failed with timeout or overflow.
+# attempts: int, max number of attempts, 1 to disable retries.
+# backoff: float, seconds to wait before the first retry.
+# max_backoff: float, max seconds to wait between retries.
+# multiplier: float, backoff multiplier for every next retry.
+# recover: bool, whether to recover() the bonnet and try once more when all
+#     attempts timed out.
+RetryPolicy = namedtuple('RetryPolicy',
+    ('attempts', 'backoff', 'max_backoff', 'multiplier', 'recover'))
+RetryPolicy.__new__.__defaults__ = (3, 0.05, 1.0, 2.0, True)
+
+# count: int, number of recoveries.
+# last: float, seconds the last recovery took.
+# total: float, seconds all recoveries took.
+RecoveryStats = namedtuple('RecoveryStats', ('count', 'last', 'total'))
+
 
 class FirmwareVersionException(Exception):
 
@@ -91,36 +167,386 @@ def _close_stack_silently(stack):
     except Exception:
         pass
 
+def _get_default_model_cache_size():
+    return int(os.environ.get('VISION_BONNET_MODEL_CACHE_SIZE', '0'))
+
+
+def _get_model_digests_path():
+    cache_dir = os.environ.get('VISION_BONNET_CACHE_PATH',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'aiy'))
+    return os.path.join(cache_dir, 'model_digests.json') if cache_dir else None
+
+
+def _read_model_digests():
+    """Returns dict of model name to hex digest of graphs loaded by registries."""
+    path = _get_model_digests_path()
+    if not path:
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            digests = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return digests if isinstance(digests, dict) else {}
+
+
+def _write_model_digest(name, digest):
+    """Atomically records digest of loaded model, failures are ignored."""
+    path = _get_model_digests_path()
+    if not path:
+        return
+    digests = _read_model_digests()
+    digests[name] = digest.hex()
+    try:
+        cache_dir = os.path.dirname(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(digests, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
+
+
+class _ModelRegistry:
+    """Tracks models resident on the bonnet by compute graph digest.
+
+    CameraInference and ImageInference acquire models through the registry, so
+    a model is uploaded only when no model with the same name and compute graph
+    is loaded yet, and a changed compute graph with the same name is reloaded.
+    Released models stay loaded while there are at most `capacity` resident
+    models, unused ones are unloaded in least recently used order to make room
+    for new models. With zero capacity (default) models are unloaded as soon as
+    they are released.
+
+    Models loaded outside of the registry (e.g. by another process) are used as
+    they are and never unloaded by the registry. Digests of loaded models are
+    recorded in VISION_BONNET_CACHE_PATH (~/.cache/aiy by default), so a model
+    left loaded by a registry of an earlier process is reloaded when its
+    compute graph has changed since.
+    """
+
+    def __init__(self, capacity):
+        # Reentrant, InferenceEngine.recover() may run during acquire().
+        self._lock = threading.RLock()
+        self._resident = OrderedDict()  # model name -> (digest, descriptor), LRU order.
+        self._users = Counter()         # model name -> number of users.
+        self._engine_users = Counter()  # (engine, model name) -> number of users.
+        self._digests = {}              # model name -> (compute_graph, digest).
+        self.capacity = capacity
+
+    def _add_user(self, engine, name):
+        self._users[name] += 1
+        self._engine_users[(engine, name)] += 1
+
+    def _remove_users(self, key, count):
+        engine, name = key
+        self._engine_users[key] -= count
+        if not self._engine_users[key]:
+            del self._engine_users[key]
+        self._users[name] -= count
+        if not self._users[name]:
+            del self._users[name]
+
+    def _digest(self, descriptor):
+        # Graphs from models.utils are cached bytes objects, hash them once.
+        graph, digest = self._digests.get(descriptor.name, (None, None))
+        if graph is not descriptor.compute_graph:
+            graph = descriptor.compute_graph
+            digest = hashlib.sha1(graph).digest()
+            self._digests[descriptor.name] = (graph, digest)
+        return digest
+
+    def _acquire(self, engine, descriptor):
+        """Steps of acquire(), see _run()."""
+        name = descriptor.name
+        digest = self._digest(descriptor)
+        state = yield 'get_inference_state', ()
+        loaded = set(state.loaded_models)
+        for resident in list(self._resident):
+            if resident not in loaded:  # Unloaded by somebody else.
+                del self._resident[resident]
+
+        if name in self._resident and self._resident[name][0] == digest:
+            self._resident.move_to_end(name)
+            self._add_user(engine, name)
+            return name
+
+        if self._users[name] and name in self._resident:
+            raise InferenceException(
+                'Model "%s" with different compute graph is in use.' % name)
+
+        if name in loaded:
+            if name in self._resident:
+                logger.info('Reload changed model "%s".', name)
+            elif _read_model_digests().get(name, digest.hex()) == digest.hex():
+                # Loaded outside of the registry, with the same or unknown graph.
+                logger.info('Using model "%s" loaded outside of the registry.', name)
+                return name
+            else:
+                logger.info('Reload model "%s" left loaded with a different graph.', name)
+            yield 'unload_model', (name,)
+            self._resident.pop(name, None)
+
+        yield from self._evict(self.capacity - 1)
+        yield 'load_model', (descriptor,)
+        _write_model_digest(name, digest)
+        self._resident[name] = (digest, descriptor)
+        self._add_user(engine, name)
+        return name
+
+    def _release(self, engine, model_name):
+        """Steps of release(), see _run()."""
+        key = (engine, model_name)
+        if not self._engine_users[key]:
+            return  # Not loaded by the registry or forgotten by reset().
+        self._remove_users(key, 1)
+        yield from self._evict(self.capacity)
+
+    def _evict(self, max_resident):
+        unused = [name for name in self._resident if not self._users[name]]
+        for name in unused[:max(0, len(self._resident) - max_resident)]:
+            logger.info('Evict model "%s".', name)
+            self._resident.pop(name, None)
+            yield 'unload_model', (name,)
+
+    def _run(self, engine, steps):
+        """Runs steps under the lock, returns their result.
+
+        Steps are generators which yield (engine method name, args) tuples and
+        receive results of the calls, so the same bookkeeping drives
+        InferenceEngine and AsyncInferenceEngine (see _run_async()).
+        """
+        with self._lock:
+            result = None
+            while True:
+                try:
+                    method, args = steps.send(result)
+                except StopIteration as e:
+                    return e.value
+                result = getattr(engine, method)(*args)
+
+    async def _run_async(self, engine, steps, timeout=None):
+        """Async version of _run().
+
+        The lock can't be held while the event loop waits, so it is held
+        between engine calls only.
+        """
+        result = None
+        while True:
+            with self._lock:
+                try:
+                    method, args = steps.send(result)
+                except StopIteration as e:
+                    return e.value
+            result = await getattr(engine, method)(*args, timeout=timeout)
+
+    def acquire(self, engine, descriptor):
+        """Makes sure the model is loaded, returns model name."""
+        return self._run(engine, self._acquire(engine, descriptor))
+
+    def release(self, engine, model_name):
+        """Releases model returned by acquire(), unloads it if needed."""
+        self._run(engine, self._release(engine, model_name))
+
+    async def acquire_async(self, engine, descriptor, timeout=None):
+        """acquire() with AsyncInferenceEngine."""
+        return await self._run_async(engine, self._acquire(engine, descriptor), timeout)
+
+    async def release_async(self, engine, model_name, timeout=None):
+        """release() with AsyncInferenceEngine."""
+        await self._run_async(engine, self._release(engine, model_name), timeout)
+
+    def reset(self, engine):
+        """Forgets resident models after engine reset the bonnet.
+
+        Users of the engine are forgotten too. Users of other engines are kept,
+        so their release() calls stay balanced, and their models are loaded
+        again on next acquire().
+        """
+        with self._lock:
+            self._resident.clear()
+            for key in [key for key in self._engine_users if key[0] is engine]:
+                self._remove_users(key, self._engine_users[key])
+
+    def recovered(self):
+        """Returns descriptors of models to load again after the bonnet was reset.
+
+        Models in use by any engine stay resident once loaded again, unused ones
+        are forgotten.
+        """
+        with self._lock:
+            for name in [name for name in self._resident if not self._users[name]]:
+                del self._resident[name]
+            return [descriptor for _, descriptor in self._resident.values()]
+
+    def clear(self):
+        """Forgets all resident models and users."""
+        with self._lock:
+            self._resident.clear()
+            self._users.clear()
+            self._engine_users.clear()
+
+
+_model_registry = _ModelRegistry(_get_default_model_cache_size())
+
+
+def set_model_cache_size(size):
+    """Sets max number of models kept loaded on the bonnet after use.
+
+    Defaults to VISION_BONNET_MODEL_CACHE_SIZE environment variable or 0, in
+    which case models are unloaded when CameraInference or ImageInference is
+    closed.
+    """
+    _model_registry.capacity = size
+
+
+class _CameraPrefetcher:
+    """Keeps camera_inference requests in flight on a background thread.
+
+    Results are stored in a bounded queue of `depth` elements. When the queue
+    is full the worker either waits for the caller or, if `drop_oldest` is set,
+    discards the oldest queued result to make room for the newest one.
+    """
+
+    def __init__(self, engine, depth, drop_oldest):
+        if depth < 1:
+            raise ValueError('Prefetch depth must be positive.')
+        self._engine = engine
+        self._depth = depth
+        self._drop_oldest = drop_oldest
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    def _put(self, item):
+        with self._cond:
+            while len(self._queue) >= self._depth and not self._stopped:
+                if self._drop_oldest:
+                    self._queue.popleft()
+                    self._dropped += 1
+                    break
+                self._cond.wait()
+            if self._stopped:
+                return False
+            self._queue.append(item)
+            self._cond.notify_all()
+            return True
+
+    def _run(self):
+        while not self._stopped:
+            requested = time.monotonic()
+            try:
+                result = self._engine.camera_inference()
+            except Exception as e:
+                self._put((None, e, requested, time.monotonic()))
+                return
+            if not self._put((result, None, requested, time.monotonic())):
+                return
+
+    def get(self):
+        """Returns (result, requested, received) tuple, raises worker errors."""
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            result, error, requested, received = self._queue.popleft()
+            self._cond.notify_all()
+        if error is not None:
+            raise error
+        return result, requested, received
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        # Waits for the transaction in flight (at most one frame).
+        self._thread.join()
+
+
 class CameraInference:
     """Helper class to run camera inference."""
 
     def __init__(self, descriptor, params=None, sparse_configs=None):
         self._rate = 0.0
         self._count = 0
+        self._dropped = 0
+        self._timing = None
+        self._prefetcher = None
         self._stack = contextlib.ExitStack()
         self._engine = self._stack.enter_context(InferenceEngine())
 
         try:
-            model_name = descriptor.name
-            if model_name not in self._engine.get_inference_state().loaded_models:
-                self._engine.load_model(descriptor)
-                self._stack.callback(lambda: self._engine.unload_model(model_name))
+            model_name = _model_registry.acquire(self._engine, descriptor)
+            self._stack.callback(_model_registry.release, self._engine, model_name)
 
             self._engine.start_camera_inference(model_name, params, sparse_configs)
             self._stack.callback(lambda: self._engine.stop_camera_inference())
+            self._stack.callback(self._stop_prefetcher)
         except Exception:
             _close_stack_silently(self._stack)
             raise
 
-    def run(self, count=None):
+    def _stop_prefetcher(self):
+        if self._prefetcher:
+            self._prefetcher.stop()
+            self._dropped += self._prefetcher.dropped
+            self._prefetcher = None
+
+    def _results(self, prefetch, drop_oldest):
+        if not prefetch:
+            while True:
+                requested = time.monotonic()
+                result = self._engine.camera_inference()
+                yield result, requested, time.monotonic()
+
+        if self._prefetcher:
+            raise RuntimeError('Camera inference is already running.')
+        self._prefetcher = _CameraPrefetcher(self._engine, prefetch, drop_oldest)
+        try:
+            while True:
+                yield self._prefetcher.get()
+        finally:
+            self._stop_prefetcher()
+
+    def run(self, count=None, prefetch=0, drop_oldest=False):
+        """Yields camera inference results.
+
+        Args:
+          count: int, number of results to return, or None to run forever.
+          prefetch: int, number of results requested ahead on a background
+            thread while the caller processes the current one. With 0 (default)
+            the next request is sent only after the caller asks for it.
+          drop_oldest: bool, whether to discard the oldest prefetched result
+            instead of waiting when the caller falls behind. Useful to always
+            get the most recent frame.
+
+        While prefetching is active the engine must not be used from other
+        threads.
+        """
         before = None
-        for _ in (itertools.count() if count is None else range(count)):
-            result = self._engine.camera_inference()
-            now = time.monotonic()
-            self._rate = 1.0 / (now - before) if before else 0.0
-            before = now
-            self._count += 1
-            yield result
+        results = self._results(prefetch, drop_oldest)
+        try:
+            for _ in (itertools.count() if count is None else range(count)):
+                result, requested, received = next(results)
+                now = time.monotonic()
+                self._rate = 1.0 / (now - before) if before else 0.0
+                self._timing = FrameTiming(requested, received, now)
+                before = now
+                self._count += 1
+                yield result
+        finally:
+            results.close()
 
     @property
     def engine(self):
@@ -134,6 +560,16 @@ class CameraInference:
     def count(self):
         return self._count
 
+    @property
+    def timing(self):
+        """FrameTiming of the last returned result."""
+        return self._timing
+
+    @property
+    def dropped(self):
+        """Number of prefetched results discarded because of drop_oldest."""
+        return self._dropped + (self._prefetcher.dropped if self._prefetcher else 0)
+
     def close(self):
         self._stack.close()
 
@@ -147,21 +583,96 @@ class CameraInference:
 class ImageInference:
     """Helper class to run image inference."""
 
-    def __init__(self, descriptor):
+    def __init__(self, descriptor, resize=False, letterbox=False, upload=None):
+        """Initialization.
+
+        Args:
+          descriptor: ModelDescriptor of the model.
+          resize: bool, whether to resize images to the model input size on
+            the host before transfer. Coordinates in results are then in input
+            size units, use transform to map them back to the original image.
+          letterbox: bool, whether to preserve aspect ratio when resizing, the
+            borders are filled with black.
+          upload: None, 'raw', 'jpeg' or 'auto'. With None (default) JPEG
+            images are sent as is and other images raw. With 'auto', JPEG
+            images are sent as is when they are smaller than the raw resized
+            image, and other images are JPEG encoded (lossy) when it is
+            estimated to save more than 512 KB of transfer.
+        """
+        if upload not in (None, 'auto', 'raw', 'jpeg'):
+            raise ValueError('Unsupported upload: %s.' % upload)
+        _, height, width, _ = descriptor.input_shape
+        self._size = (width, height) if resize and width and height else None
+        self._letterbox = letterbox
+        self._upload = upload
+        self._transform = None
         self._stack = contextlib.ExitStack()
         self._engine = self._stack.enter_context(InferenceEngine())
 
         try:
-            self._model_name = descriptor.name
-            if self._model_name not in self._engine.get_inference_state().loaded_models:
-                self._model_name = self._engine.load_model(descriptor)
-                self._stack.callback(lambda: self._engine.unload_model(self._model_name))
+            self._model_name = _model_registry.acquire(self._engine, descriptor)
+            self._stack.callback(_model_registry.release, self._engine, self._model_name)
         except Exception:
             _close_stack_silently(self._stack)
             raise
 
+    def _send_jpeg(self, jpeg):
+        if self._upload in (None, 'jpeg'):
+            return True
+        if self._upload == 'raw':
+            return False
+        return self._size is None or len(jpeg) <= 3 * self._size[0] * self._size[1]
+
+    def _encode_jpeg(self, image, size):
+        if self._upload in (None, 'raw') or isinstance(image, RawImage) or \
+                not hasattr(image, 'mode'):
+            return False  # Only PIL images are encoded.
+        if self._upload == 'jpeg':
+            return True
+        width, height = size
+        raw_size = width * height * len(image.getbands())
+        return raw_size * (1.0 - _JPEG_SIZE_RATIO) >= _JPEG_MIN_SAVING
+
     def run(self, image, params=None, sparse_configs=None):
-        return self._engine.image_inference(self._model_name, image, params, sparse_configs)
+        """Returns inference result of image.
+
+        Args:
+          image: PIL.Image, NumPy array, RawImage or JPEG bytes.
+          params: dict, additional parameters to run inference.
+          sparse_configs: dict, sparse configs of output tensors.
+        """
+        if isinstance(image, (bytes, bytearray)):
+            if self._send_jpeg(image):
+                # Decoded and scaled by the bonnet, result is in image coordinates.
+                self._transform = ImageTransform.IDENTITY
+                return self._engine.image_inference(self._model_name, image, params,
+                                                    sparse_configs)
+            from PIL import Image
+            image = Image.open(io.BytesIO(image))
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+        src_width, src_height = src_size = _image_size(image)
+        size = self._size or src_size
+        region = _fit(src_size, size, self._letterbox) if size != src_size else \
+            (0, 0, src_width, src_height)
+        x, y, width, height = region
+        scale_x, scale_y = src_width / width, src_height / height
+        self._transform = ImageTransform(scale_x, scale_y, -x * scale_x, -y * scale_y)
+
+        if self._encode_jpeg(image, size):
+            if size != src_size:
+                image = _resize_pil(image, size, region)
+            stream = io.BytesIO()
+            image.save(stream, format='jpeg', quality=90)
+            image = stream.getvalue()
+        return self._engine.image_inference(self._model_name, image, params, sparse_configs,
+                                            self._size, self._letterbox)
+
+    @property
+    def transform(self):
+        """ImageTransform from coordinates of the last result to its image."""
+        return self._transform
 
     @property
     def engine(self):
@@ -206,32 +717,337 @@ def _get_sparse_configs(configs):
     return None
 
 
-def _image_to_tensor(image):
-    if isinstance(image, (bytes, bytearray)):
-        # Only JPEG is supported on the bonnet side.
-        return pb2.ByteTensor(
-            shape=pb2.TensorShape(batch=1, height=0, width=0, depth=0),
-            data=image)
+def _resize_indices(src_size, dst_size):
+    """Returns source indices of nearest neighbour resize from src to dst size."""
+    return ((np.arange(dst_size) + 0.5) * (src_size / dst_size)).astype(np.intp)
+
+
+def _fit(src_size, dst_size, letterbox):
+    """Returns (x, y, width, height) region of dst_size the image is resized to.
+
+    Without letterbox the image is stretched to the whole dst_size, otherwise
+    it is scaled preserving aspect ratio and centered.
+    """
+    dst_width, dst_height = dst_size
+    if not letterbox:
+        return 0, 0, dst_width, dst_height
+    src_width, src_height = src_size
+    scale = min(dst_width / src_width, dst_height / src_height)
+    width = max(1, min(dst_width, int(round(src_width * scale))))
+    height = max(1, min(dst_height, int(round(src_height * scale))))
+    return (dst_width - width) // 2, (dst_height - height) // 2, width, height
+
+
+def _image_size(image):
+    """Returns (width, height) of PIL image, NumPy array or RawImage."""
+    if isinstance(image, RawImage):
+        return image.width, image.height
+    if np is not None and isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    return image.size
+
+
+def _resize_pil(image, size, region):
+    """Returns PIL image resized into region of size, borders are black."""
+    x, y, width, height = region
+    if image.size != (width, height):
+        image = image.resize((width, height), resample=2)  # PIL.Image.BILINEAR
+    if (width, height) != tuple(size):
+        from PIL import Image
+        canvas = Image.new(image.mode, size)
+        canvas.paste(image, (x, y))
+        image = canvas
+    return image
+
+
+class _TensorPacker:
+    """Converts images to planar ByteTensor.
+
+    Accepts JPEG bytes, PIL images, NumPy arrays and RawImage buffers. Arrays,
+    raw buffers and RGB PIL images are converted from interleaved to planar
+    order by one copy into a reused NumPy buffer. Without NumPy PIL image bands
+    are joined without intermediate concatenations. Optional resize is done by
+    PIL for PIL images, or by nearest neighbour sampling for arrays and raw
+    buffers.
+    """
+
+    _RAW_DEPTHS = {'rgb': 3, 'bgr': 3, 'gray': 1}
+
+    def __init__(self):
+        self._planar = None
+
+    def pack(self, image, size=None, letterbox=False):
+        """Returns ByteTensor of image.
 
-    width, height = image.size
-    if image.mode == 'RGB':
-        r, g, b = image.split()
-        return pb2.ByteTensor(
-            shape=pb2.TensorShape(batch=1, height=height, width=width, depth=3),
-            data=r.tobytes() + g.tobytes() + b.tobytes())
+        Args:
+          image: PIL.Image, NumPy array, RawImage or JPEG bytes.
+          size: (width, height) to resize image to, JPEG images are not
+            resized.
+          letterbox: bool, whether to preserve aspect ratio when resizing and
+            fill the borders with black.
+        """
+        width, height, depth, chunks = self.pack_parts(image, size, letterbox)
+        return _byte_tensor(width, height, depth, b''.join(chunks))
 
-    if image.mode == 'L':
-        return pb2.ByteTensor(
-            shape=pb2.TensorShape(batch=1, height=height, width=width, depth=1),
-            data=image.tobytes())
+    def pack_parts(self, image, size=None, letterbox=False):
+        """Same as pack() but returns (width, height, depth, chunks) tuple.
 
-    raise InferenceException('Unsupported image format: %s. Must be L or RGB.' % image.mode)
+        Tensor data is the concatenation of chunks, bytes-like objects which
+        are valid until the next call.
+        """
+        if isinstance(image, (bytes, bytearray)):
+            # Only JPEG is supported on the bonnet side, it is sent as is.
+            return 0, 0, 0, (image,)
+        src_size = _image_size(image)
+        if size and tuple(size) != tuple(src_size):
+            size = tuple(size)
+            region = _fit(src_size, size, letterbox)
+        else:
+            size, region = src_size, (0, 0) + tuple(src_size)
+        if isinstance(image, RawImage):
+            if image.format == 'yuv':
+                return self._pack_yuv(image, size, region)
+            return self._pack_raw(image, size, region)
+        if np is not None and isinstance(image, np.ndarray):
+            return self._pack_array(image, size, region)
+        return self._pack_pil(image, size, region)
+
+    def _planar_buffer(self, depth, size, region):
+        width, height = size
+        shape = (depth, height, width)
+        if self._planar is None or self._planar.shape != shape:
+            self._planar = np.empty(shape, dtype=np.uint8)
+        x, y, region_width, region_height = region
+        if (region_width, region_height) != size:
+            self._planar.fill(0)
+        return self._planar, self._planar[:, y:y + region_height, x:x + region_width]
+
+    def _pack_pil(self, image, size, region):
+        if image.mode not in ('RGB', 'L'):
+            raise InferenceException('Unsupported image format: %s. Must be L or RGB.' %
+                                     image.mode)
+        if image.size != size:
+            image = _resize_pil(image, size, region)
+        width, height = image.size
+        if image.mode == 'L':
+            return width, height, 1, (image.tobytes(),)
+        if np is not None:
+            return self._pack_array(np.asarray(image), image.size, (0, 0) + image.size)
+        # Bands are already planar, the caller joins them.
+        return width, height, 3, tuple(band.tobytes() for band in image.split())
+
+    def _pack_array(self, array, size, region):
+        if array.ndim == 2:
+            array = array[:, :, np.newaxis]
+        if array.dtype != np.uint8 or array.ndim != 3 or array.shape[2] not in (1, 3):
+            raise InferenceException('Unsupported array: %s %s. Must be uint8 HxW, HxWx1 '
+                                     'or HxWx3.' % (array.dtype, array.shape))
+        height, width, depth = array.shape
+        _, _, region_width, region_height = region
+        if (region_width, region_height) != (width, height):
+            array = array[_resize_indices(height, region_height)[:, np.newaxis],
+                          _resize_indices(width, region_width)]
+        planar, planar_region = self._planar_buffer(depth, size, region)
+        np.copyto(planar_region, array.transpose(2, 0, 1))
+        return size[0], size[1], depth, (planar.reshape(-1).data,)
+
+    def _pack_raw(self, image, size, region):
+        depth = self._RAW_DEPTHS.get(image.format)
+        if depth is None:
+            raise InferenceException('Unsupported raw image format: %s.' % image.format)
+        width, height = image.width, image.height
+        if np is not None:
+            array = np.frombuffer(image.data, dtype=np.uint8, count=width * height * depth)
+            array = array.reshape(height, width, depth)
+            if image.format == 'bgr':
+                array = array[:, :, ::-1]
+            return self._pack_array(array, size, region)
+
+        from PIL import Image
+        mode = 'L' if depth == 1 else 'RGB'
+        pil_image = Image.frombuffer(mode, (width, height), image.data, 'raw',
+                                     image.format.upper() if depth == 3 else 'L', 0, 1)
+        return self._pack_pil(pil_image, size, region)
+
+    def _pack_yuv(self, image, size, region):
+        if np is None:
+            raise InferenceException('YUV images require NumPy.')
+        width, height = image.width, image.height
+        if 3 * width * height // 2 == len(image.data):
+            frame_width, frame_height = width, height
+        else:
+            # picamera pads width to 32 and height to 16 pixels.
+            frame_width, frame_height = (width + 31) // 32 * 32, (height + 15) // 16 * 16
+        y_size = frame_width * frame_height
+        uv_size = y_size // 4
+        data = np.frombuffer(image.data, dtype=np.uint8, count=y_size + 2 * uv_size)
+        y = data[:y_size].reshape(frame_height, frame_width)
+        u = data[y_size:y_size + uv_size].reshape(frame_height // 2, frame_width // 2)
+        v = data[y_size + uv_size:].reshape(frame_height // 2, frame_width // 2)
+
+        # Sampling before conversion converts only the output pixels.
+        _, _, region_width, region_height = region
+        rows = _resize_indices(height, region_height)[:, np.newaxis]
+        cols = _resize_indices(width, region_width)
+        y = y[rows, cols].astype(np.float32)
+        u = u[rows // 2, cols // 2].astype(np.float32) - 128.0
+        v = v[rows // 2, cols // 2].astype(np.float32) - 128.0
+
+        # BT.601 full range, written directly in planar order.
+        planar, planar_region = self._planar_buffer(3, size, region)
+        planar_region[0] = np.clip(y + 1.402 * v, 0, 255)
+        planar_region[1] = np.clip(y - 0.344136 * u - 0.714136 * v, 0, 255)
+        planar_region[2] = np.clip(y + 1.772 * u, 0, 255)
+        return size[0], size[1], 3, (planar.reshape(-1).data,)
+
+
+def _byte_tensor(width, height, depth, data):
+    return pb2.ByteTensor(
+        shape=pb2.TensorShape(batch=1, height=height, width=width, depth=depth),
+        data=data)
+
+
+def _parse_response(data):
+    response = pb2.Response()
+    response.ParseFromString(data)
+    if response.status.code != pb2.Response.Status.OK:
+        raise InferenceException(response.status.message)
+    return response
 
 
 def _get_params(params):
     return {key: str(value) for key, value in (params or {}).items()}
 
 
+def _load_model_request(descriptor):
+    mean, stddev = descriptor.input_normalizer
+    batch, height, width, depth = descriptor.input_shape
+    if batch != 1:
+        raise ValueError('Unsupported batch value: %d. Must be 1.')
+
+    if depth != 3:
+        raise ValueError('Unsupported depth value: %d. Must be 3.')
+
+    return pb2.Request(
+        load_model=pb2.Request.LoadModel(
+            model_name=descriptor.name,
+            input_shape=pb2.TensorShape(
+                batch=batch,
+                height=height,
+                width=width,
+                depth=depth),
+            input_normalizer=pb2.TensorNormalizer(
+                mean=mean,
+                stddev=stddev),
+            compute_graph=descriptor.compute_graph))
+
+
+def _unload_model_request(model_name):
+    return pb2.Request(unload_model=pb2.Request.UnloadModel(model_name=model_name))
+
+
+def _start_camera_inference_request(model_name, params, sparse_configs):
+    return pb2.Request(
+        start_camera_inference=pb2.Request.StartCameraInference(
+            model_name=model_name,
+            params=_get_params(params),
+            sparse_configs=_get_sparse_configs(sparse_configs)))
+
+
+def _image_inference_request(model_name, tensor, params, sparse_configs):
+    return pb2.Request(
+        image_inference=pb2.Request.ImageInference(
+            model_name=model_name,
+            tensor=tensor,
+            params=_get_params(params),
+            sparse_configs=_get_sparse_configs(sparse_configs)))
+
+
+def _varint(value):
+    """Returns protobuf base 128 varint encoding of non-negative value."""
+    out = bytearray()
+    while value > 0x7f:
+        out.append(0x80 | (value & 0x7f))
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field_key(message_type, field_name):
+    """Returns key of length-delimited field (wire type 2)."""
+    return _varint(message_type.DESCRIPTOR.fields_by_name[field_name].number << 3 | 2)
+
+
+class _ImageInferenceTemplate:
+    """Serialized image_inference request for fixed model, params and sparse configs.
+
+    The nested ImageInference message is serialized once without the tensor.
+    Requests for images are built by splicing the serialized tensor after it,
+    so params and sparse configs are not converted again and tensor data is
+    copied only once, into the request bytes.
+    """
+
+    _REQUEST_KEY = _field_key(pb2.Request, 'image_inference')
+    _TENSOR_KEY = _field_key(pb2.Request.ImageInference, 'tensor')
+    _SHAPE_KEY = _field_key(pb2.ByteTensor, 'shape')
+    _DATA_KEY = _field_key(pb2.ByteTensor, 'data')
+
+    def __init__(self, model_name, params, sparse_configs):
+        self.model_name = model_name
+        self._prefix = _image_inference_request(
+            model_name, None, params, sparse_configs).image_inference.SerializeToString()
+        self._shapes = {}
+
+    def _shape(self, width, height, depth):
+        key = (width, height, depth)
+        shape = self._shapes.get(key)
+        if shape is None:
+            data = pb2.TensorShape(batch=1, height=height, width=width,
+                                   depth=depth).SerializeToString()
+            shape = self._shapes[key] = self._SHAPE_KEY + _varint(len(data)) + data
+        return shape
+
+    def render(self, width, height, depth, chunks):
+        """Returns request bytes for tensor from _TensorPacker.pack_parts()."""
+        shape = self._shape(width, height, depth)
+        data_size = sum(len(chunk) for chunk in chunks)
+        data_header = self._DATA_KEY + _varint(data_size)
+        tensor_size = len(shape) + len(data_header) + data_size
+        tensor_header = self._TENSOR_KEY + _varint(tensor_size)
+        message_size = len(self._prefix) + len(tensor_header) + tensor_size
+        return b''.join((self._REQUEST_KEY, _varint(message_size), self._prefix,
+                         tensor_header, shape, data_header) + tuple(chunks))
+
+
+def _freeze(value):
+    """Returns hashable equivalent of params or sparse configs."""
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        items = tuple(_freeze(item) for item in value)
+        # Config namedtuples of different types may have equal fields.
+        return (type(value), items) if hasattr(value, '_fields') else items
+    return value
+
+
+class _RequestTemplates:
+    """LRU cache of _ImageInferenceTemplate per (model, params, sparse configs)."""
+
+    def __init__(self, capacity=16):
+        self._templates = OrderedDict()
+        self._capacity = capacity
+
+    def get(self, model_name, params, sparse_configs):
+        key = (model_name, _freeze(params), _freeze(sparse_configs))
+        template = self._templates.pop(key, None)
+        if template is None:
+            template = _ImageInferenceTemplate(model_name, params, sparse_configs)
+            while len(self._templates) >= self._capacity:
+                self._templates.popitem(last=False)
+        self._templates[key] = template
+        return template
+
+
 def _check_model_name(model_name):
     if not model_name:
         raise ValueError('Model name must not be empty.')
@@ -249,6 +1065,32 @@ _REQ_GET_INFERENCE_STATE = _request_bytes(get_inference_state=pb2.Request.GetInf
 _REQ_GET_CAMERA_STATE = _request_bytes(get_camera_state=pb2.Request.GetCameraState())
 _REQ_RESET = _request_bytes(reset=pb2.Request.Reset())
 
+# Requests which can be safely repeated.
+_IDEMPOTENT_REQUESTS = frozenset(('camera_inference', 'image_inference', 'get_camera_state',
+                                  'get_firmware_info', 'get_system_info',
+                                  'get_inference_state'))
+
+# Request types of prebuilt requests, for metrics and retries.
+_REQUEST_TYPES = {
+    _REQ_GET_FIRMWARE_INFO: 'get_firmware_info',
+    _REQ_GET_SYSTEM_INFO: 'get_system_info',
+    _REQ_CAMERA_INFERENCE: 'camera_inference',
+    _REQ_STOP_CAMERA_INFERENCE: 'stop_camera_inference',
+    _REQ_GET_INFERENCE_STATE: 'get_inference_state',
+    _REQ_GET_CAMERA_STATE: 'get_camera_state',
+    _REQ_RESET: 'reset',
+}
+
+
+def _record_response(request_type, request_size, response_size, response,
+                     serialize, transport, parse):
+    if response.HasField('inference_result'):
+        bonnet = response.inference_result.duration_ms / 1000.0
+    else:
+        bonnet = None
+    metrics.get_metrics().record(request_type, request_size, response_size,
+                                 serialize, transport, bonnet, parse)
+
 class InferenceEngine:
     """Class to access InferenceEngine on VisionBonnet board.
 
@@ -271,8 +1113,21 @@ class InferenceEngine:
       }
     """
 
-    def __init__(self):
+    def __init__(self, retry_policy=None):
+        """Initialization.
+
+        Args:
+          retry_policy: RetryPolicy of idempotent requests, RetryPolicy() by
+            default.
+        """
         self._transport = make_transport()
+        self._packer = _TensorPacker()
+        self._templates = _RequestTemplates()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._models = OrderedDict()  # Model name -> descriptor of loaded models.
+        self._camera_session = None   # (model name, params, sparse configs).
+        self._recovering = False
+        self._recovery_stats = RecoveryStats(0, 0.0, 0.0)
         logger.info('InferenceEngine transport: %s', self._transport.__class__.__name__)
 
     def close(self):
@@ -284,16 +1139,97 @@ class InferenceEngine:
     def __exit__(self, exc_type, exc_value, exc_tb):
         self.close()
 
-    def _communicate(self, request, timeout=None):
-        return self._communicate_bytes(request.SerializeToString(), timeout=timeout)
+    @property
+    def metrics(self):
+        """Request metrics of all engines, see aiy.vision.metrics."""
+        return metrics.get_metrics()
 
-    def _communicate_bytes(self, request_bytes, timeout=None):
-        response = pb2.Response()
-        response.ParseFromString(self._transport.send(request_bytes, timeout=timeout))
-        if response.status.code != pb2.Response.Status.OK:
-            raise InferenceException(response.status.message)
+    @property
+    def recovery_stats(self):
+        """RecoveryStats of recover() calls of this engine."""
+        return self._recovery_stats
+
+    def _communicate(self, request, timeout=None):
+        request_type = request.WhichOneof('request')
+        if not metrics.enabled():
+            return self._communicate_bytes(request.SerializeToString(), timeout, request_type)
+        start = time.monotonic()
+        request_bytes = request.SerializeToString()
+        return self._communicate_bytes(request_bytes, timeout, request_type,
+                                       time.monotonic() - start)
+
+    def _communicate_bytes(self, request_bytes, timeout=None, request_type=None,
+                           serialize=None):
+        request_type = request_type or _REQUEST_TYPES.get(request_bytes, 'unknown')
+        policy = self.retry_policy
+        retry = request_type in _IDEMPOTENT_REQUESTS and not self._recovering
+        attempt, recovered = 1, False
+        while True:
+            try:
+                return self._transact(request_bytes, timeout, request_type, serialize)
+            except (SpicommTimeoutError, SpicommOverflowError, socket.timeout) as e:
+                if isinstance(e, SpicommOverflowError):
+                    grow_buffers = getattr(self._transport, 'grow_buffers', None)
+                    if grow_buffers:
+                        grow_buffers(e.size)
+                if not retry:
+                    raise
+                if attempt >= policy.attempts:
+                    if recovered or not policy.recover or isinstance(e, SpicommOverflowError):
+                        raise
+                    self.recover()
+                    recovered = True
+                else:
+                    time.sleep(min(policy.max_backoff,
+                                   policy.backoff * policy.multiplier ** (attempt - 1)))
+                    attempt += 1
+                logger.warning('Retry %s request after error: %r', request_type, e)
+                if metrics.enabled():
+                    metrics.get_metrics().record_retry(request_type)
+
+    def _transact(self, request_bytes, timeout, request_type, serialize):
+        if not metrics.enabled():
+            with self._transport.send_lease(request_bytes, timeout=timeout) as data:
+                return _parse_response(data)
+
+        sent = time.monotonic()
+        try:
+            with self._transport.send_lease(request_bytes, timeout=timeout) as data:
+                received = time.monotonic()
+                response_size = len(data)
+                response = _parse_response(data)
+        except Exception as e:
+            metrics.get_metrics().record_error(request_type, len(request_bytes), e)
+            raise
+        _record_response(request_type, len(request_bytes), response_size, response,
+                         serialize, received - sent, time.monotonic() - received)
         return response
 
+    def recover(self):
+        """Resets the bonnet and restores models and camera inference of this engine.
+
+        Models in use through the model registry are restored for all engines,
+        models loaded directly by other engines are not.
+        """
+        start = time.monotonic()
+        self._recovering = True
+        try:
+            self._communicate_bytes(_REQ_RESET)
+            models = OrderedDict(self._models)
+            for descriptor in _model_registry.recovered():
+                models.setdefault(descriptor.name, descriptor)
+            logger.warning('Recover VisionBonnet, restore %d model(s).', len(models))
+            for descriptor in models.values():
+                self._communicate(_load_model_request(descriptor))
+            if self._camera_session:
+                self._communicate(_start_camera_inference_request(*self._camera_session))
+        finally:
+            self._recovering = False
+            duration = time.monotonic() - start
+            count, _, total = self._recovery_stats
+            self._recovery_stats = RecoveryStats(count + 1, duration, total + duration)
+        logger.warning('VisionBonnet recovered in %.3f seconds.', duration)
+
     def load_model(self, descriptor):
         """Loads model on VisionBonnet.
 
@@ -304,31 +1240,14 @@ class InferenceEngine:
           Model identifier.
         """
         _check_firmware_info(self.get_firmware_info())
-        mean, stddev = descriptor.input_normalizer
-        batch, height, width, depth = descriptor.input_shape
-        if batch != 1:
-            raise ValueError('Unsupported batch value: %d. Must be 1.')
-
-        if depth != 3:
-            raise ValueError('Unsupported depth value: %d. Must be 3.')
-
+        request = _load_model_request(descriptor)
         try:
             logger.info('Load model "%s".', descriptor.name)
-            self._communicate(pb2.Request(
-                load_model=pb2.Request.LoadModel(
-                    model_name=descriptor.name,
-                    input_shape=pb2.TensorShape(
-                        batch=batch,
-                        height=height,
-                        width=width,
-                        depth=depth),
-                    input_normalizer=pb2.TensorNormalizer(
-                        mean=mean,
-                        stddev=stddev),
-                    compute_graph=descriptor.compute_graph)))
+            self._communicate(request)
         except InferenceException as e:
             logger.warning(str(e))
 
+        self._models[descriptor.name] = descriptor
         return descriptor.name
 
     def unload_model(self, model_name):
@@ -340,19 +1259,16 @@ class InferenceEngine:
         _check_model_name(model_name)
 
         logger.info('Unload model "%s".', model_name)
-        self._communicate(pb2.Request(
-            unload_model=pb2.Request.UnloadModel(model_name=model_name)))
+        self._models.pop(model_name, None)
+        self._communicate(_unload_model_request(model_name))
 
     def start_camera_inference(self, model_name, params=None, sparse_configs=None):
         """Starts inference running on VisionBonnet."""
         _check_model_name(model_name)
 
         logger.info('Start camera inference on "%s".', model_name)
-        self._communicate(pb2.Request(
-            start_camera_inference=pb2.Request.StartCameraInference(
-                model_name=model_name,
-                params=_get_params(params),
-                sparse_configs=_get_sparse_configs(sparse_configs))))
+        self._communicate(_start_camera_inference_request(model_name, params, sparse_configs))
+        self._camera_session = (model_name, params, sparse_configs)
 
     def camera_inference(self):
         """Returns the latest inference result from VisionBonnet."""
@@ -361,6 +1277,7 @@ class InferenceEngine:
     def stop_camera_inference(self):
         """Stops inference running on VisionBonnet."""
         logger.info('Stop camera inference.')
+        self._camera_session = None
         self._communicate_bytes(_REQ_STOP_CAMERA_INFERENCE)
 
     def get_inference_state(self):
@@ -383,13 +1300,18 @@ class InferenceEngine:
         """Returns system information: uptime, memory usage, temperature."""
         return self._communicate_bytes(_REQ_GET_SYSTEM_INFO).system_info
 
-    def image_inference(self, model_name, image, params=None, sparse_configs=None):
+    def image_inference(self, model_name, image, params=None, sparse_configs=None,
+                        size=None, letterbox=False):
         """Runs inference on image using model identified by model_name.
 
         Args:
           model_name: string, unique identifier used to refer a model.
-          image: PIL.Image,
+          image: PIL.Image, NumPy array, RawImage or JPEG bytes.
           params: dict, additional parameters to run inference
+          sparse_configs: dict, sparse configs of output tensors.
+          size: (width, height) to resize image to on the host before
+            transfer, e.g. model input size. JPEG images are not resized.
+          letterbox: bool, whether to preserve aspect ratio when resizing.
 
         Returns:
           pb2.Response.InferenceResult
@@ -397,12 +1319,69 @@ class InferenceEngine:
         _check_model_name(model_name)
 
         logger.info('Image inference on "%s".', model_name)
-        return self._communicate(pb2.Request(
-            image_inference=pb2.Request.ImageInference(
-                model_name=model_name,
-                tensor=_image_to_tensor(image),
-                params=_get_params(params),
-                sparse_configs=_get_sparse_configs(sparse_configs)))).inference_result
+        start = time.monotonic()
+        template = self._templates.get(model_name, params, sparse_configs)
+        request_bytes = template.render(*self._packer.pack_parts(image, size, letterbox))
+        return self._communicate_bytes(request_bytes, None, 'image_inference',
+                                       time.monotonic() - start).inference_result
+
+    def image_inference_batch(self, model_name, images, params=None, sparse_configs=None,
+                              depth=4, size=None):
+        """Yields inference results of images using model identified by model_name.
+
+        Requests are pipelined when the transport supports it: up to depth
+        requests are sent before waiting for the first response. images are
+        consumed lazily, so the caller can stop early by closing the generator.
+
+        Args:
+          model_name: string, unique identifier used to refer a model.
+          images: iterable of PIL.Image.
+          params: dict, additional parameters to run inference, same for all
+            images.
+          sparse_configs: dict, sparse configs, same for all images.
+          depth: int, max number of requests in flight.
+          size: (width, height) to resize images to, see image_inference().
+
+        Yields:
+          pb2.Response.InferenceResult
+        """
+        _check_model_name(model_name)
+
+        # Request template is reused, only the tensor is spliced for each image.
+        template = self._templates.get(model_name, params, sparse_configs)
+        submit = getattr(self._transport, 'submit', None)
+        pending = deque()
+        for image in images:
+            start = time.monotonic()
+            request_bytes = template.render(*self._packer.pack_parts(image, size))
+            sent = time.monotonic()
+            if submit is None:
+                yield self._communicate_bytes(request_bytes, None, 'image_inference',
+                                              sent - start).inference_result
+                continue
+            pending.append((submit(request_bytes), len(request_bytes), sent, sent - start))
+            if len(pending) >= depth:
+                yield self._pending_result(*pending.popleft()).inference_result
+        while pending:
+            yield self._pending_result(*pending.popleft()).inference_result
+
+    def _pending_result(self, pending, request_size, sent, serialize):
+        if not metrics.enabled():
+            return _parse_response(pending.result())
+
+        try:
+            data = pending.result()
+            received = time.monotonic()
+            response = _parse_response(data)
+        except Exception as e:
+            metrics.get_metrics().record_error('image_inference', request_size, e)
+            raise
+        _record_response('image_inference', request_size, len(data), response,
+                         serialize, received - sent, time.monotonic() - received)
+        return response
 
     def reset(self):
         self._communicate_bytes(_REQ_RESET)
+        self._models.clear()
+        self._camera_session = None
+        _model_registry.reset(self)
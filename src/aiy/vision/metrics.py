@@ -0,0 +1,290 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Request metrics of InferenceEngine and its transports.
+
+Every request to the VisionBonnet is counted by type together with its byte
+sizes, errors and latency of each phase:
+
+  serialize: building the request bytes on the host.
+  transport: sending the request and waiting for the response.
+  bonnet: inference duration reported by the bonnet (duration_ms).
+  parse: parsing the response on the host.
+
+Metrics are collected by default and can be disabled with
+VISION_BONNET_METRICS=0 or set_enabled(False)::
+
+  metrics.get_metrics().add_exporter(lambda snapshot: print(json.dumps(snapshot)))
+  ...
+  metrics.get_metrics().export()
+  print(metrics.get_metrics().to_prometheus())
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+
+from . import _spicomm
+
+PHASES = ('serialize', 'transport', 'bonnet', 'parse')
+
+# Quantiles reported by snapshots and Prometheus summaries.
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+_enabled = os.environ.get('VISION_BONNET_METRICS', '1') != '0'
+
+
+def set_enabled(enabled):
+    """Enables or disables metrics collection at runtime."""
+    global _enabled
+    _enabled = enabled
+
+
+def enabled():
+    """Returns whether metrics are collected."""
+    return _enabled
+
+
+# Histogram buckets: values below 2 * _SUB_BUCKETS are exact, larger values
+# keep _SUB_BITS significant bits, i.e. relative error is below 1 / _SUB_BUCKETS.
+_SUB_BITS = 5
+_SUB_BUCKETS = 1 << _SUB_BITS
+
+
+def _bucket_index(value):
+    if value < 2 * _SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - _SUB_BITS - 1
+    return 2 * _SUB_BUCKETS + (shift - 1) * _SUB_BUCKETS + (value >> shift) - _SUB_BUCKETS
+
+
+def _bucket_upper(index):
+    """Returns the highest value of the bucket."""
+    if index < 2 * _SUB_BUCKETS:
+        return index
+    shift, mantissa = divmod(index - 2 * _SUB_BUCKETS, _SUB_BUCKETS)
+    shift += 1
+    return ((mantissa + _SUB_BUCKETS + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """HDR-style histogram of latencies with microsecond resolution.
+
+    Buckets are log-linear with about 3% relative precision and stored
+    sparsely, so recording is a few integer operations and a dict update.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._count = 0
+        self._sum = 0
+        self._min = None
+        self._max = 0
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1e6))
+        index = _bucket_index(value)
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self._count += 1
+        self._sum += value
+        if self._min is None or value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        """Sum of recorded latencies in seconds."""
+        return self._sum / 1e6
+
+    @property
+    def min(self):
+        return (self._min or 0) / 1e6
+
+    @property
+    def max(self):
+        return self._max / 1e6
+
+    def percentile(self, q):
+        """Returns latency in seconds below which q (0.0 - 1.0) of values are."""
+        if not self._count:
+            return 0.0
+        rank = max(1, int(q * self._count + 0.5))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(_bucket_upper(index), self._max) / 1e6
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self._count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'quantiles': {str(q): self.percentile(q) for q in QUANTILES},
+        }
+
+
+def _error_kind(error):
+    if isinstance(error, (socket.timeout, asyncio.TimeoutError, _spicomm.SpicommTimeoutError)):
+        return 'timeout'
+    if isinstance(error, _spicomm.SpicommOverflowError):
+        return 'overflow'
+    return 'error'
+
+
+class _RequestMetrics:
+
+    def __init__(self):
+        self.count = 0
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.errors = {'error': 0, 'timeout': 0, 'overflow': 0}
+        self.latency = {phase: LatencyHistogram() for phase in PHASES}
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'retries': self.retries,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'errors': dict(self.errors),
+            'latency': {phase: histogram.snapshot()
+                        for phase, histogram in self.latency.items() if histogram.count},
+        }
+
+
+class Metrics:
+    """Thread-safe collection of per request type metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._exporters = []
+
+    def _get(self, request_type):
+        metrics = self._requests.get(request_type)
+        if metrics is None:
+            metrics = self._requests[request_type] = _RequestMetrics()
+        return metrics
+
+    def record(self, request_type, request_size, response_size,
+               serialize=None, transport=None, bonnet=None, parse=None):
+        """Records a successful request, phase durations are in seconds."""
+        with self._lock:
+            metrics = self._get(request_type)
+            metrics.count += 1
+            metrics.request_bytes += request_size
+            metrics.response_bytes += response_size
+            for phase, seconds in zip(PHASES, (serialize, transport, bonnet, parse)):
+                if seconds is not None:
+                    metrics.latency[phase].record(seconds)
+
+    def record_error(self, request_type, request_size, error):
+        """Records a failed request, error is the raised exception."""
+        with self._lock:
+            metrics = self._get(request_type)
+            metrics.count += 1
+            metrics.request_bytes += request_size
+            metrics.errors[_error_kind(error)] += 1
+
+    def record_retry(self, request_type):
+        """Records a retry of a failed request."""
+        with self._lock:
+            self._get(request_type).retries += 1
+
+    def histogram(self, request_type, phase):
+        """Returns LatencyHistogram of the phase of request type, None if unseen."""
+        with self._lock:
+            metrics = self._requests.get(request_type)
+            return metrics.latency[phase] if metrics else None
+
+    def snapshot(self):
+        """Returns dict of request type to its metrics."""
+        with self._lock:
+            return {request_type: metrics.snapshot()
+                    for request_type, metrics in self._requests.items()}
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+
+    def add_exporter(self, exporter):
+        """Adds function called with snapshot() dict on every export()."""
+        self._exporters.append(exporter)
+
+    def remove_exporter(self, exporter):
+        self._exporters.remove(exporter)
+
+    def export(self):
+        """Passes current snapshot to all exporters."""
+        snapshot = self.snapshot()
+        for exporter in list(self._exporters):
+            exporter(snapshot)
+
+    def to_json(self, **kwargs):
+        """Returns snapshot as JSON string, kwargs are passed to json.dumps()."""
+        return json.dumps(self.snapshot(), sort_keys=True, **kwargs)
+
+    def to_prometheus(self, prefix='aiy_vision'):
+        """Returns metrics in Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def add(name, kind, values):
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for labels, value in values:
+                label_text = ','.join('%s="%s"' % label for label in labels)
+                lines.append('%s_%s{%s} %s' % (prefix, name, label_text, repr(value)))
+
+        types = sorted(snapshot)
+        add('requests_total', 'counter',
+            [((('type', t),), snapshot[t]['count']) for t in types])
+        add('retries_total', 'counter',
+            [((('type', t),), snapshot[t]['retries']) for t in types])
+        add('request_bytes_total', 'counter',
+            [((('type', t),), snapshot[t]['request_bytes']) for t in types])
+        add('response_bytes_total', 'counter',
+            [((('type', t),), snapshot[t]['response_bytes']) for t in types])
+        add('errors_total', 'counter',
+            [((('type', t), ('kind', kind)), count)
+             for t in types for kind, count in sorted(snapshot[t]['errors'].items())])
+
+        lines.append('# TYPE %s_latency_seconds summary' % prefix)
+        for t in types:
+            for phase, histogram in sorted(snapshot[t]['latency'].items()):
+                labels = 'type="%s",phase="%s"' % (t, phase)
+                for q, value in sorted(histogram['quantiles'].items()):
+                    lines.append('%s_latency_seconds{%s,quantile="%s"} %r' %
+                                 (prefix, labels, q, value))
+                lines.append('%s_latency_seconds_sum{%s} %r' % (prefix, labels, histogram['sum']))
+                lines.append('%s_latency_seconds_count{%s} %d' %
+                             (prefix, labels, histogram['count']))
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Returns Metrics shared by all inference engines of the process."""
+    return _metrics
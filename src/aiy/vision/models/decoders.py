@@ -0,0 +1,504 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Generic decoders of model outputs, selected by declarative output specs.
+
+ModelDescriptor.output_spec describes the output tensors of a model, e.g.
+ClassificationSpec or SsdSpec, so custom MobileNet classifiers and SSD
+detectors are decoded without any model specific code::
+
+  descriptor = ModelDescriptor(
+      name='my_ssd', input_shape=(1, 300, 300, 3), input_normalizer=(128.0, 128.0),
+      compute_graph=utils.load_compute_graph('my_ssd.binaryproto'),
+      output_spec=SsdSpec(score_tensor='scores', box_tensor='boxes',
+                          anchors='my_ssd_anchors.txt', num_classes=91))
+  with CameraInference(descriptor, sparse_configs=decoders.sparse_configs(descriptor)) \\
+          as inference:
+      for result in inference.run():
+          objects = decoders.decode(result, descriptor)
+
+Decoders are created once per spec and reused, decoding of dense and sparse
+results uses the same NumPy and non-maximum suppression paths as the built-in
+models. New spec types can be added with register_decoder().
+"""
+
+import functools
+import math
+import sys
+import threading
+
+from array import array
+from collections import namedtuple
+
+from aiy.vision.inference import FromSparseTensorConfig, ThresholdingConfig
+from aiy.vision.models import nms
+from aiy.vision.models import utils
+from aiy.vision.models.detections import Detections
+
+_MACHINE_EPS = sys.float_info.epsilon
+
+# Classification model with one tensor of class probabilities.
+# tensor_name: string, name of the output tensor.
+# labels: labels file name (see utils.load_labels) or tuple of label strings.
+ClassificationSpec = namedtuple('ClassificationSpec', ('tensor_name', 'labels'))
+
+# SSD detection model with per-anchor class logits and box encodings.
+# score_tensor: string, name of the tensor with num_classes logits per anchor,
+#     class 0 is background.
+# box_tensor: string, name of the tensor with 4 box encodings per anchor.
+# anchors: anchors file name (see utils.load_ssd_anchors) or tuple of
+#     (ymin, xmin, ymax, xmax) tuples.
+# num_classes: int, number of classes including background.
+# box_scales: (y, x, height, width) scales of box encodings.
+# make_item: function (detections, index) -> item of returned Detections, see
+#     Detections. Default items are (bounding_box, kind, score) tuples.
+SsdSpec = namedtuple('SsdSpec', ('score_tensor', 'box_tensor', 'anchors', 'num_classes',
+                                 'box_scales', 'make_item'))
+SsdSpec.__new__.__defaults__ = ((10.0, 10.0, 5.0, 5.0), None)
+
+
+def _logit(x):
+    return math.log(x / (1.0 - x))
+
+def _logistic(x):
+    return 1.0 / (1.0 + math.exp(-x))
+
+def _clamp(value):
+    """Clamps value to range [0.0, 1.0]."""
+    return min(max(0.0, value), 1.0)
+
+
+# Number of precomputed geometry values per anchor, see _compile_anchors().
+_GEOMETRY_SIZE = 6
+
+# Anchor geometry compiled from a loaded anchors object (source).
+# values: flat array('d') of _GEOMETRY_SIZE values per anchor.
+# array: the same values as (num_anchors, _GEOMETRY_SIZE) NumPy array, or None.
+_AnchorGeometry = namedtuple('_AnchorGeometry', ('source', 'values', 'array'))
+
+
+def _compile_anchors(anchors, box_scales):
+    """Precomputes anchor geometry used by box decoding.
+
+    Args:
+      anchors: flat sequence of (ymin, xmin, ymax, xmax) values or sequence of
+        such tuples.
+      box_scales: (y, x, height, width) scales of box encodings.
+    Returns:
+      Flat array('d') of (ycenter, xcenter, y_step, x_step, half_height,
+      half_width) per anchor, where y_step and x_step are anchor height and
+      width divided by y and x scales.
+    """
+    if anchors and not isinstance(anchors[0], float):
+        anchors = [value for anchor in anchors for value in anchor]
+    y_scale, x_scale, _, _ = box_scales
+    geometry = array('d')
+    for i in range(0, len(anchors), 4):
+        ymin, xmin, ymax, xmax = anchors[i:i + 4]
+        height = ymax - ymin
+        width = xmax - xmin
+        geometry.extend(((ymax + ymin) / 2, (xmax + xmin) / 2,
+                         height / y_scale, width / x_scale, height / 2, width / 2))
+    return geometry
+
+
+class ClassificationResultDecoder:
+    """Decodes results of ClassificationSpec models to (label, probability) pairs."""
+
+    def __init__(self, spec):
+        self._spec = spec
+
+    @property
+    def spec(self):
+        return self._spec
+
+    @property
+    def labels_decoder(self):
+        """utils.ClassificationDecoder of model labels, loaded on first use."""
+        labels = self._spec.labels
+        if isinstance(labels, str):
+            return utils.load_classification_decoder(labels)
+        return _classification_decoder(labels)
+
+    def sparse_configs(self, top_k=None, threshold=0.0):
+        """Returns sparse configs, top_k=None means all classes."""
+        num_classes = len(self.labels_decoder)
+        return {
+            self._spec.tensor_name: ThresholdingConfig(
+                logical_shape=[num_classes],
+                threshold=threshold,
+                top_k=num_classes if top_k is None else top_k,
+                to_ignore=[])
+        }
+
+    def decode(self, result, top_k=None, threshold=0.0):
+        """Returns (label, probability) pairs ordered by probability.
+
+        Dense and sparse (see sparse_configs()) results are supported.
+        """
+        decoder = self.labels_decoder
+        tensor = result.tensors[self._spec.tensor_name]
+        if tensor.indices:
+            sparse = utils.sparse_tensor(tensor)
+            pairs = [pair for pair in decoder.get_classes_sparse(sparse.column(0), sparse.values)
+                     if pair[1] > threshold]
+            return pairs if top_k is None else pairs[:max(top_k, 0)]
+        assert len(tensor.data) == len(decoder)
+        return decoder.get_classes(tensor.data, top_k, threshold)
+
+
+@functools.lru_cache(maxsize=None)
+def _classification_decoder(labels):
+    return utils.ClassificationDecoder(labels)
+
+
+class SsdResultDecoder:
+    """Decodes results of SsdSpec models to Detections.
+
+    Anchors are loaded and compiled to center and size arrays on first use.
+    Boxes are decoded only for anchors with an object score above threshold and
+    then reduced by non-maximum suppression.
+    """
+
+    def __init__(self, spec):
+        self._spec = spec
+        self._height_factor = 1.0 / spec.box_scales[2]
+        self._width_factor = 1.0 / spec.box_scales[3]
+        self._geometry_cache = _AnchorGeometry(None, None, None)
+
+    @property
+    def spec(self):
+        return self._spec
+
+    @property
+    def anchors(self):
+        """Tuple of (ymin, xmin, ymax, xmax) anchor tuples."""
+        anchors = self._spec.anchors
+        if isinstance(anchors, str):
+            return utils.load_ssd_anchors(anchors)
+        return anchors
+
+    def _geometry(self):
+        """Returns _AnchorGeometry, compiled once per loaded anchors."""
+        anchors = self._spec.anchors
+        if isinstance(anchors, str):
+            anchors = utils.load_ssd_anchors_array(anchors)
+        geometry = self._geometry_cache
+        if geometry.source is not anchors:
+            values = _compile_anchors(anchors, self._spec.box_scales)
+            values_array = None
+            if utils.np is not None:
+                values_array = utils.np.frombuffer(values).reshape(-1, _GEOMETRY_SIZE)
+            geometry = self._geometry_cache = _AnchorGeometry(anchors, values, values_array)
+        return geometry
+
+    def _num_anchors(self):
+        return len(self._geometry().values) // _GEOMETRY_SIZE
+
+    def sparse_configs(self, threshold=0.3):
+        """Returns sparse configs of objects with score above threshold."""
+        if threshold < 0 or threshold > 1.0:
+            raise ValueError('Threshold must be in [0.0, 1.0]')
+
+        num_anchors = self._num_anchors()
+        return {
+            self._spec.score_tensor: ThresholdingConfig(
+                logical_shape=[num_anchors, self._spec.num_classes],
+                threshold=_logit(max(threshold, _MACHINE_EPS)),
+                top_k=num_anchors,
+                to_ignore=[(1, 0)]),
+            self._spec.box_tensor: FromSparseTensorConfig(
+                logical_shape=[num_anchors],
+                tensor_name=self._spec.score_tensor,
+                squeeze_dims=[1])
+        }
+
+    def _detections(self, boxes, scores, kinds):
+        return Detections(boxes, scores, kinds, make_item=self._spec.make_item, box_typecode='i')
+
+    def _decode_dense(self, logit_scores, box_encodings, threshold, image_size, image_offset):
+        geometry = self._geometry().values
+        num_anchors = len(geometry) // _GEOMETRY_SIZE
+        num_classes = self._spec.num_classes
+        assert len(logit_scores) == num_classes * num_anchors
+        assert len(box_encodings) == 4 * num_anchors
+
+        logit_threshold = _logit(max(threshold, _MACHINE_EPS))
+        boxes, scores, kinds = array('i'), array('d'), array('i')
+
+        for i in range(num_anchors):
+            logits = logit_scores[num_classes * i: num_classes * (i + 1)]
+            max_logit = max(logits)
+            max_logit_index = logits.index(max_logit)
+            if max_logit_index == 0 or max_logit <= logit_threshold:
+                continue  # Skip 'background' and below threshold.
+
+            boxes.extend(self._decode_bbox(box_encodings[4 * i: 4 * (i + 1)],
+                                           geometry[_GEOMETRY_SIZE * i: _GEOMETRY_SIZE * (i + 1)],
+                                           image_size, image_offset))
+            scores.append(_logistic(max_logit))
+            kinds.append(max_logit_index)
+
+        return self._detections(boxes, scores, kinds)
+
+    def _decode_dense_numpy(self, logit_scores, box_encodings, threshold,
+                            image_size, image_offset):
+        """NumPy version of _decode_dense, returns the same objects."""
+        np = utils.np
+        logits = np.array(logit_scores, dtype=np.float64).reshape(-1, self._spec.num_classes)
+        encodings = np.array(box_encodings, dtype=np.float64).reshape(-1, 4)
+        geometry = self._geometry().array
+        assert len(logits) == len(geometry)
+        assert len(encodings) == len(geometry)
+
+        logit_threshold = _logit(max(threshold, _MACHINE_EPS))
+        kinds = logits.argmax(axis=1)
+        max_logits = logits.max(axis=1)
+        # Skip 'background' and below threshold.
+        indices = np.flatnonzero((kinds != 0) & (max_logits > logit_threshold))
+
+        bboxes = self._decode_bboxes_numpy(encodings[indices], geometry[indices],
+                                           image_size, image_offset)
+        scores = [_logistic(max_logit) for max_logit in max_logits[indices].tolist()]
+        return self._detections(bboxes, scores, kinds[indices])
+
+    def _decode_sparse(self, logit_scores, box_encodings, image_size, image_offset):
+        """Decodes utils.SparseTensor pair of logit scores and box encodings."""
+        assert len(logit_scores) == len(logit_scores.values)
+        assert 4 * len(box_encodings) == len(box_encodings.values)
+
+        geometry = self._geometry().values
+        num_classes = self._spec.num_classes
+        # Logits of all anchors, missing ones (including 'background') are 0.0.
+        logits = array('d', bytes(8 * num_classes * (len(geometry) // _GEOMETRY_SIZE)))
+        for i, logit_index, logit_score in zip(logit_scores.column(0), logit_scores.column(1),
+                                               logit_scores.values):
+            logits[num_classes * i + logit_index] = logit_score
+
+        boxes, scores, kinds = array('i'), array('d'), array('i')
+        encodings = box_encodings.values
+        for j, i in enumerate(box_encodings.indices):
+            anchor_logits = logits[num_classes * i: num_classes * (i + 1)]
+            max_logit = max(anchor_logits)
+            max_logit_index = anchor_logits.index(max_logit)
+
+            boxes.extend(self._decode_bbox(encodings[4 * j: 4 * (j + 1)],
+                                           geometry[_GEOMETRY_SIZE * i: _GEOMETRY_SIZE * (i + 1)],
+                                           image_size, image_offset))
+            scores.append(_logistic(max_logit))
+            kinds.append(max_logit_index)
+
+        return self._detections(boxes, scores, kinds)
+
+    def _decode_sparse_numpy(self, logit_scores, box_encodings, image_size, image_offset):
+        """NumPy version of _decode_sparse, returns the same objects."""
+        np = utils.np
+        geometry = self._geometry().array
+        logit_indices = np.frombuffer(logit_scores.indices, dtype=np.intc).reshape(-1, 2)
+        logits = np.zeros((len(geometry), self._spec.num_classes))
+        logits[logit_indices[:, 0], logit_indices[:, 1]] = np.frombuffer(logit_scores.values)
+
+        indices = np.frombuffer(box_encodings.indices, dtype=np.intc)
+        encodings = np.frombuffer(box_encodings.values).reshape(-1, 4)
+        assert len(encodings) == len(indices)
+        logits = logits[indices]
+
+        bboxes = self._decode_bboxes_numpy(encodings, geometry[indices], image_size, image_offset)
+        scores = [_logistic(max_logit) for max_logit in logits.max(axis=1).tolist()]
+        return self._detections(bboxes, scores, logits.argmax(axis=1))
+
+    def _decode_bbox(self, box_encoding, anchor_geometry, image_size, image_offset):
+        x0, y0 = image_offset
+        width, height = image_size
+        xmin, ymin, xmax, ymax = self._decode_box_encoding(box_encoding, anchor_geometry)
+        x = int(x0 + xmin * width)
+        y = int(y0 + ymin * height)
+        w = int((xmax - xmin) * width)
+        h = int((ymax - ymin) * height)
+        return x, y, w, h
+
+    def _decode_bboxes_numpy(self, box_encodings, geometry, image_size, image_offset):
+        """Vectorized _decode_bbox, returns (n, 4) int array of (x, y, w, h)."""
+        x0, y0 = image_offset
+        width, height = image_size
+        xmin, ymin, xmax, ymax = self._decode_box_encodings_numpy(box_encodings, geometry)
+        x = x0 + xmin * width
+        y = y0 + ymin * height
+        w = (xmax - xmin) * width
+        h = (ymax - ymin) * height
+        # astype(int) truncates toward zero like int().
+        return utils.np.stack((x, y, w, h), axis=1).astype(int)
+
+    def _decode_box_encodings_numpy(self, box_encodings, geometry):
+        """Vectorized _decode_box_encoding over (n, 4) encodings and (n, 6) geometry.
+
+        Returns:
+          A tuple of 4 arrays (xmin, ymin, xmax, ymax), each has range [0.0, 1.0].
+        """
+        np = utils.np
+        ycenter, xcenter, y_step, x_step, half_height, half_width = geometry.T
+
+        ycenter = ycenter + box_encodings[:, 0] * y_step
+        xcenter = xcenter + box_encodings[:, 1] * x_step
+        half_height = half_height * np.exp(box_encodings[:, 2] * self._height_factor)
+        half_width = half_width * np.exp(box_encodings[:, 3] * self._width_factor)
+
+        xmin = np.clip(xcenter - half_width, 0.0, 1.0)
+        ymin = np.clip(ycenter - half_height, 0.0, 1.0)
+        xmax = np.clip(xcenter + half_width, 0.0, 1.0)
+        ymax = np.clip(ycenter + half_height, 0.0, 1.0)
+
+        return xmin, ymin, xmax, ymax
+
+    def _decode_box_encoding(self, box_encoding, anchor_geometry):
+        """Decodes bounding box encoding.
+
+        Args:
+          box_encoding: a tuple of 4 floats.
+          anchor_geometry: a tuple of 6 floats, see _compile_anchors().
+        Returns:
+          A tuple of 4 floats (xmin, ymin, xmax, ymax), each has range [0.0, 1.0].
+        """
+        assert len(box_encoding) == 4
+        assert len(anchor_geometry) == _GEOMETRY_SIZE
+        ycenter, xcenter, y_step, x_step, half_height, half_width = anchor_geometry
+        y_translation, x_translation, height_dilation, width_dilation = box_encoding
+
+        ycenter += y_translation * y_step
+        xcenter += x_translation * x_step
+        half_height *= math.exp(height_dilation * self._height_factor)
+        half_width *= math.exp(width_dilation * self._width_factor)
+
+        # Clamp value to [0.0, 1.0] range, otherwise, part of the bounding box may
+        # fall outside of the image.
+        xmin = _clamp(xcenter - half_width)
+        ymin = _clamp(ycenter - half_height)
+        xmax = _clamp(xcenter + half_width)
+        ymax = _clamp(ycenter + half_height)
+
+        return xmin, ymin, xmax, ymax
+
+    @staticmethod
+    def _non_maximum_suppression(objs, overlap_threshold, per_class, soft_nms_sigma, top_k):
+        indices, scores = nms.non_maximum_suppression(
+            objs.bounding_boxes(), objs.scores,
+            overlap_threshold=overlap_threshold,
+            kinds=objs.kinds if per_class else None,
+            soft_sigma=soft_nms_sigma, top_k=top_k)
+        return objs.select(indices, scores)
+
+    def decode_dense(self, result, threshold=0.3, offset=(0, 0), overlap_threshold=0.5,
+                     per_class=False, soft_nms_sigma=None, top_k=None):
+        """Returns Detections decoded from the dense inference result.
+
+        Args:
+          result: dense inference result.
+          threshold: float, min object score.
+          offset: (x, y) offset added to bounding boxes.
+          overlap_threshold: float, non-maximum suppression overlap threshold.
+          per_class: bool, whether only objects of the same kind suppress each other.
+          soft_nms_sigma: float, enables soft non-maximum suppression.
+          top_k: int, max number of objects to return.
+        """
+        if threshold < 0 or threshold > 1.0:
+            raise ValueError('Threshold must be in [0.0, 1.0]')
+
+        size = (result.window.width, result.window.height)
+        logit_scores = result.tensors[self._spec.score_tensor].data
+        box_encodings = result.tensors[self._spec.box_tensor].data
+        if utils.numpy_enabled():
+            objs = self._decode_dense_numpy(logit_scores, box_encodings, threshold, size, offset)
+        else:
+            objs = self._decode_dense(tuple(logit_scores), tuple(box_encodings), threshold,
+                                      size, offset)
+        return self._non_maximum_suppression(objs, overlap_threshold, per_class,
+                                             soft_nms_sigma, top_k)
+
+    def decode_sparse(self, result, offset=(0, 0), overlap_threshold=0.5, per_class=False,
+                      soft_nms_sigma=None, top_k=None):
+        """Returns Detections decoded from the sparse inference result.
+
+        Threshold is applied on the bonnet, see sparse_configs(). See
+        decode_dense() for arguments.
+        """
+        logit_scores = utils.sparse_tensor(result.tensors[self._spec.score_tensor])
+        box_encodings = utils.sparse_tensor(result.tensors[self._spec.box_tensor])
+
+        size = (result.window.width, result.window.height)
+        if utils.numpy_enabled():
+            objs = self._decode_sparse_numpy(logit_scores, box_encodings, size, offset)
+        else:
+            objs = self._decode_sparse(logit_scores, box_encodings, size, offset)
+        return self._non_maximum_suppression(objs, overlap_threshold, per_class,
+                                             soft_nms_sigma, top_k)
+
+    def decode(self, result, threshold=0.3, **kwargs):
+        """Returns Detections of dense or sparse result, see decode_dense()."""
+        tensor = result.tensors[self._spec.score_tensor]
+        if tensor.indices or not tensor.data:
+            return self.decode_sparse(result, **kwargs)
+        return self.decode_dense(result, threshold, **kwargs)
+
+
+_lock = threading.Lock()
+_decoder_types = {
+    ClassificationSpec: ClassificationResultDecoder,
+    SsdSpec: SsdResultDecoder,
+}
+_decoders = {}
+
+
+def register_decoder(spec_type, decoder_type):
+    """Registers decoder for a new type of output spec.
+
+    Args:
+      spec_type: type of output specs, must be hashable.
+      decoder_type: function (spec) -> decoder, the decoder must have
+        decode(result, **kwargs) method and optionally sparse_configs(**kwargs).
+    """
+    with _lock:
+        _decoder_types[spec_type] = decoder_type
+
+
+def _output_spec(model):
+    spec = getattr(model, 'output_spec', model)
+    if spec is None:
+        raise ValueError('Model "%s" has no output spec.' % model.name)
+    return spec
+
+
+def get_decoder(model):
+    """Returns decoder of ModelDescriptor or output spec, created once per spec."""
+    spec = _output_spec(model)
+    with _lock:
+        decoder = _decoders.get(spec)
+        if decoder is None:
+            decoder_type = _decoder_types.get(type(spec))
+            if decoder_type is None:
+                raise ValueError('No decoder registered for %s.' % type(spec).__name__)
+            decoder = _decoders[spec] = decoder_type(spec)
+        return decoder
+
+
+def decode(result, model, **kwargs):
+    """Decodes inference result of ModelDescriptor or output spec.
+
+    Keyword arguments are passed to the decoder, e.g. top_k and threshold for
+    classification models.
+    """
+    return get_decoder(model).decode(result, **kwargs)
+
+
+def sparse_configs(model, **kwargs):
+    """Returns sparse configs of ModelDescriptor or output spec."""
+    return get_decoder(model).sparse_configs(**kwargs)
@@ -0,0 +1,152 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact container for detection results.
+
+Detections stores bounding boxes, scores and kinds of all detected items in
+typed arrays instead of one Python object per item. It behaves like a read-only
+list: items (e.g. object_detection.Object or face_detection.Face) are created
+on access only. Filtering, slicing and scaling return new Detections without
+creating per-item objects.
+"""
+
+from array import array
+from collections.abc import Sequence
+
+from aiy.vision.models import utils
+
+
+def _typed(typecode, values):
+    """Returns array of given typecode from any sequence or NumPy array."""
+    if isinstance(values, array) and values.typecode == typecode:
+        return values
+    if utils.np is not None and isinstance(values, utils.np.ndarray):
+        # NumPy type codes of C types match array type codes.
+        a = array(typecode)
+        a.frombytes(values.astype(typecode).tobytes())
+        return a
+    return array(typecode, values)
+
+
+def _subset(values, indices):
+    if isinstance(values, array):
+        return array(values.typecode, (values[i] for i in indices))
+    return [values[i] for i in indices]
+
+
+class Detections(Sequence):
+    """Columnar detection results.
+
+    Attributes:
+      boxes: array of 4 * len(self) values, (x, y, width, height) per item.
+      scores: array of len(self) floats.
+      kinds: array of len(self) ints, or None if kinds are not known.
+      columns: dict of additional per-item sequences, e.g. 'joy_scores'.
+    """
+
+    __slots__ = ('boxes', 'scores', 'kinds', 'columns', '_make_item')
+
+    def __init__(self, boxes, scores, kinds=None, columns=None, make_item=None,
+                 box_typecode='d'):
+        """Initialization.
+
+        Args:
+          boxes: flat sequence of 4 * n box values, (x, y, width, height) order.
+          scores: sequence of n floats.
+          kinds: optional sequence of n ints.
+          columns: optional dict of additional sequences of n values.
+          make_item: function (detections, index) -> item, used to create
+            items on access. Default returns (bounding_box, kind, score) tuples.
+          box_typecode: array typecode of box values, 'i' for pixel boxes.
+        """
+        self.boxes = _typed(box_typecode, boxes)
+        self.scores = _typed('d', scores)
+        self.kinds = None if kinds is None else _typed('i', kinds)
+        self.columns = columns or {}
+        self._make_item = make_item or Detections._default_item
+        if len(self.boxes) != 4 * len(self.scores):
+            raise ValueError('Number of boxes and scores must be equal.')
+        if self.kinds is not None and len(self.kinds) != len(self.scores):
+            raise ValueError('Number of kinds and scores must be equal.')
+
+    @staticmethod
+    def _default_item(detections, i):
+        return detections.bounding_box(i), detections.kind(i), detections.scores[i]
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.select(range(*key.indices(len(self))))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('Detections index out of range')
+        return self._make_item(self, key)
+
+    def __repr__(self):
+        return 'Detections(%s)' % list(self)
+
+    def bounding_box(self, i):
+        """Returns (x, y, width, height) tuple of the i-th item."""
+        return tuple(self.boxes[4 * i:4 * i + 4])
+
+    def bounding_boxes(self):
+        """Returns list of (x, y, width, height) tuples."""
+        return [tuple(self.boxes[i:i + 4]) for i in range(0, len(self.boxes), 4)]
+
+    def kind(self, i):
+        return None if self.kinds is None else self.kinds[i]
+
+    def select(self, indices, scores=None):
+        """Returns Detections with items at given indices.
+
+        Args:
+          indices: sequence of item indices.
+          scores: optional sequence of new scores for selected items.
+        """
+        boxes = array(self.boxes.typecode)
+        for i in indices:
+            boxes.extend(self.boxes[4 * i:4 * i + 4])
+        return Detections(
+            boxes,
+            _subset(self.scores, indices) if scores is None else scores,
+            None if self.kinds is None else _subset(self.kinds, indices),
+            {name: _subset(values, indices) for name, values in self.columns.items()},
+            self._make_item, self.boxes.typecode)
+
+    def filter(self, min_score=None, kinds=None):
+        """Returns Detections with score >= min_score and kind in kinds."""
+        indices = [i for i, score in enumerate(self.scores)
+                   if (min_score is None or score >= min_score) and
+                   (kinds is None or self.kinds[i] in kinds)]
+        return self.select(indices)
+
+    def transform(self, scale_x=1.0, scale_y=1.0, offset_x=0, offset_y=0):
+        """Returns Detections with boxes scaled and then moved by offset.
+
+        Integer boxes are truncated toward zero, like int().
+        """
+        convert = int if self.boxes.typecode in 'bBhHiIlLqQ' else float
+        boxes = array(self.boxes.typecode)
+        for i in range(0, len(self.boxes), 4):
+            x, y, width, height = self.boxes[i:i + 4]
+            boxes.extend((convert(offset_x + x * scale_x), convert(offset_y + y * scale_y),
+                          convert(width * scale_x), convert(height * scale_y)))
+        return Detections(boxes, self.scores, self.kinds, self.columns,
+                          self._make_item, self.boxes.typecode)
+
+    def scale(self, scale_x, scale_y=None):
+        """Returns Detections with boxes scaled by (scale_x, scale_y)."""
+        return self.transform(scale_x, scale_x if scale_y is None else scale_y)
@@ -14,24 +14,32 @@
 """API for Dish Classification."""
 
 from aiy.vision.inference import ModelDescriptor
+from aiy.vision.models import decoders
 from aiy.vision.models import utils
 
 _COMPUTE_GRAPH_NAME = 'mobilenet_v1_192res_1.0_seefood.binaryproto'
-_CLASSES = utils.load_labels('mobilenet_v1_192res_1.0_seefood_labels.txt')
+_LABELS_FILE = 'mobilenet_v1_192res_1.0_seefood_labels.txt'
+_OUTPUT_TENSOR_NAME = 'MobilenetV1/Predictions/Softmax'
+
+
+def _decoder():
+    return utils.load_classification_decoder(_LABELS_FILE)
+
 
 def model():
     return ModelDescriptor(
         name='dish_classification',
         input_shape=(1, 192, 192, 3),
         input_normalizer=(128.0, 128.0),
-        compute_graph=utils.load_compute_graph(_COMPUTE_GRAPH_NAME))
+        compute_graph=utils.load_compute_graph(_COMPUTE_GRAPH_NAME),
+        output_spec=decoders.ClassificationSpec(_OUTPUT_TENSOR_NAME, _LABELS_FILE))
 
 
 def _get_probs(result):
     assert len(result.tensors) == 1
-    tensor = result.tensors['MobilenetV1/Predictions/Softmax']
+    tensor = result.tensors[_OUTPUT_TENSOR_NAME]
     assert utils.shape_tuple(tensor.shape) == (1, 1, 1, 2024)
-    return tuple(tensor.data)
+    return tensor.data
 
 
 def get_classes(result, top_k=None, threshold=0.0):
@@ -51,8 +59,4 @@ def get_classes(result, top_k=None, threshold=0.0):
       [('Ramen', 0.981934)
        ('Yaka mein, 0.005497)]
     """
-    probs = _get_probs(result)
-    pairs = [pair for pair in enumerate(probs) if pair[1] > threshold]
-    pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
-    pairs = pairs[0:top_k]
-    return [('/'.join(_CLASSES[index]), prob) for index, prob in pairs]
+    return _decoder().get_classes(_get_probs(result), top_k, threshold)
@@ -17,10 +17,11 @@ from collections import namedtuple
 
 from aiy.vision.inference import ModelDescriptor
 from aiy.vision.models import utils
+from aiy.vision.models.detections import Detections
 
 
 _COMPUTE_GRAPH_NAME = 'dish_detection.binaryproto'
-_CLASSES = utils.load_labels('mobilenet_v1_192res_1.0_seefood_labels.txt')
+_LABELS_FILE = 'mobilenet_v1_192res_1.0_seefood_labels.txt'
 
 # sorted_scores: sorted list of (label, score) tuples.
 # bounding_box: (x, y, width, height) tuple.
@@ -35,18 +36,21 @@ def model():
         compute_graph=utils.load_compute_graph(_COMPUTE_GRAPH_NAME))
 
 
-def _get_sorted_scores(scores, top_k, threshold):
-    pairs = [('/'.join(_CLASSES[i]), prob) for i, prob in enumerate(scores) if prob > threshold]
-    pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
-    return pairs[0:top_k]
-
-
 def get_dishes(result, top_k=3, threshold=0.1):
-    """Returns list of Dish objects decoded from the inference result."""
+    """Returns Detections of Dish objects decoded from the inference result.
+
+    Detections scores and kinds are the top class probability and index of each
+    dish, Dish.sorted_scores are computed on item access.
+    """
     assert len(result.tensors) == 2
-    bboxes = utils.reshape(result.tensors['bounding_boxes'].data, 4)
-    dish_scores = utils.reshape(result.tensors['dish_scores'].data, len(_CLASSES))
-    assert len(bboxes) == len(dish_scores)
+    decoder = utils.load_classification_decoder(_LABELS_FILE)
+    dish_scores = utils.reshape(result.tensors['dish_scores'].data, len(decoder))
+    kinds = [max(range(len(scores)), key=scores.__getitem__) for scores in dish_scores]
+
+    def make_dish(detections, i):
+        return Dish(decoder.get_classes(detections.columns['dish_scores'][i], top_k, threshold),
+                    detections.bounding_box(i))
 
-    return [Dish(_get_sorted_scores(scores, top_k, threshold), tuple(bbox))
-        for scores, bbox in zip(dish_scores, bboxes)]
+    return Detections(result.tensors['bounding_boxes'].data,
+                      [scores[kind] for scores, kind in zip(dish_scores, kinds)],
+                      kinds, columns={'dish_scores': dish_scores}, make_item=make_dish)
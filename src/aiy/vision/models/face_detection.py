@@ -13,10 +13,12 @@
 # limitations under the License.
 """API for Face Detection."""
 
+from array import array
 from collections import namedtuple
 
 from aiy.vision.inference import ModelDescriptor
 from aiy.vision.models import utils
+from aiy.vision.models.detections import Detections
 
 
 _COMPUTE_GRAPH_NAME = 'face_detection.binaryproto'
@@ -37,16 +39,18 @@ def model():
         compute_graph=utils.load_compute_graph(_COMPUTE_GRAPH_NAME))
 
 
+def _make_face(detections, i):
+    return Face(detections.scores[i], detections.columns['joy_scores'][i],
+                detections.bounding_box(i))
+
+
 def get_faces(result):
-    """Returns list of Face objects decoded from the inference result."""
+    """Returns Detections of Face objects decoded from the inference result."""
     assert len(result.tensors) == 3
     # TODO(dkovalev): check tensor shapes
-    bboxes = utils.reshape(result.tensors['bounding_boxes'].data, 4)
-    face_scores = tuple(result.tensors['face_scores'].data)
-    joy_scores = tuple(result.tensors['joy_scores'].data)
-    assert len(bboxes) == len(joy_scores)
-    assert len(bboxes) == len(face_scores)
-    return [
-        Face(face_score, joy_score, tuple(bbox))
-        for face_score, joy_score, bbox in zip(face_scores, joy_scores, bboxes)
-    ]
+    faces = Detections(result.tensors['bounding_boxes'].data,
+                       result.tensors['face_scores'].data,
+                       columns={'joy_scores': array('d', result.tensors['joy_scores'].data)},
+                       make_item=_make_face)
+    assert len(faces.columns['joy_scores']) == len(faces)
+    return faces
@@ -14,6 +14,7 @@
 """API for Image Classification tasks."""
 
 from aiy.vision.inference import ModelDescriptor, ThresholdingConfig
+from aiy.vision.models import decoders
 from aiy.vision.models import utils
 
 # There are two models in our repository that can do image classification. One
@@ -35,14 +36,21 @@ _OUTPUT_TENSOR_NAME_MAP = {
     SQUEEZENET: 'Prediction',
 }
 
-_CLASSES = utils.load_labels('mobilenet_v1_160res_0.5_imagenet_labels.txt')
+_LABELS_FILE = 'mobilenet_v1_160res_0.5_imagenet_labels.txt'
 
-def sparse_configs(top_k=len(_CLASSES), threshold=0.0, model_type=MOBILENET):
+
+def _decoder():
+    return utils.load_classification_decoder(_LABELS_FILE)
+
+
+def sparse_configs(top_k=None, threshold=0.0, model_type=MOBILENET):
+    """Returns sparse configs, top_k=None means all classes."""
     name = _OUTPUT_TENSOR_NAME_MAP[model_type]
+    num_classes = len(_decoder())
     return {
-        name: ThresholdingConfig(logical_shape=[len(_CLASSES)],
+        name: ThresholdingConfig(logical_shape=[num_classes],
                                  threshold=threshold,
-                                 top_k=top_k,
+                                 top_k=num_classes if top_k is None else top_k,
                                  to_ignore=[])
     }
 
@@ -51,14 +59,15 @@ def model(model_type=MOBILENET):
         name=model_type,
         input_shape=(1, 160, 160, 3),
         input_normalizer=(128.0, 128.0),
-        compute_graph=utils.load_compute_graph(_COMPUTE_GRAPH_NAME_MAP[model_type]))
+        compute_graph=utils.load_compute_graph(_COMPUTE_GRAPH_NAME_MAP[model_type]),
+        output_spec=decoders.ClassificationSpec(_OUTPUT_TENSOR_NAME_MAP[model_type], _LABELS_FILE))
 
 
 def _get_probs(result):
     assert len(result.tensors) == 1
     tensor = result.tensors[_OUTPUT_TENSOR_NAME_MAP[result.model_name]]
-    assert utils.shape_tuple(tensor.shape) == (1, 1, 1, len(_CLASSES))
-    return tuple(tensor.data)
+    assert utils.shape_tuple(tensor.shape) == (1, 1, 1, len(_decoder()))
+    return tensor.data
 
 
 def get_classes(result, top_k=None, threshold=0.0):
@@ -79,19 +88,7 @@ def get_classes(result, top_k=None, threshold=0.0):
        ('tiger cat, 0.163574)
        ('lynx/catamount', 0.039795)]
     """
-    probs = _get_probs(result)
-    pairs = [pair for pair in enumerate(probs) if pair[1] > threshold]
-    pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
-    pairs = pairs[0:top_k]
-    return [('/'.join(_CLASSES[index]), prob) for index, prob in pairs]
-
-
-def _get_pairs(result):
-    assert len(result.tensors) == 1
-    tensor = result.tensors[_OUTPUT_TENSOR_NAME_MAP[result.model_name]]
-    indices = tuple(tensor.indices)
-    data = tuple(tensor.data)
-    return [(index.values[0], prob) for index, prob in zip(indices, data)]
+    return _decoder().get_classes(_get_probs(result), top_k, threshold)
 
 
 def get_classes_sparse(result):
@@ -108,6 +105,7 @@ def get_classes_sparse(result):
       [('Egyptian cat', 0.767578)
        ('tiger cat, 0.163574)
     """
-    pairs = _get_pairs(result)
-    pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
-    return [('/'.join(_CLASSES[index]), prob) for index, prob in pairs]
+    assert len(result.tensors) == 1
+    tensor = result.tensors[_OUTPUT_TENSOR_NAME_MAP[result.model_name]]
+    sparse = utils.sparse_tensor(tensor)
+    return _decoder().get_classes_sparse(sparse.column(0), sparse.values)
@@ -19,13 +19,14 @@ API for detecting plants, insects, and birds from the iNaturalist dataset.
 from collections import namedtuple
 
 from aiy.vision.inference import ModelDescriptor, ThresholdingConfig
+from aiy.vision.models import decoders
 from aiy.vision.models import utils
 
 PLANTS  = 'inaturalist_plants'
 INSECTS = 'inaturalist_insects'
 BIRDS   = 'inaturalist_birds'
 
-class Model(namedtuple('Model', ('labels',
+class Model(namedtuple('Model', ('labels_file',
                                  'compute_graph_file',
                                  'input_shape',
                                  'input_normalizer',
@@ -33,18 +34,25 @@ class Model(namedtuple('Model', ('labels',
     def compute_graph(self):
         return utils.load_compute_graph(self.compute_graph_file)
 
+    def decoder(self):
+        return utils.load_classification_decoder(self.labels_file)
+
+    @property
+    def labels(self):
+        return utils.load_labels(self.labels_file)
+
 _MODELS = {
-   PLANTS:  Model(labels=utils.load_labels('mobilenet_v2_192res_1.0_inat_plant_labels.txt'),
+   PLANTS:  Model(labels_file='mobilenet_v2_192res_1.0_inat_plant_labels.txt',
                   compute_graph_file='mobilenet_v2_192res_1.0_inat_plant.binaryproto',
                   input_shape=(1, 192, 192, 3),
                   input_normalizer=(128.0, 128.0),
                   output_name='prediction'),
-   INSECTS: Model(labels=utils.load_labels('mobilenet_v2_192res_1.0_inat_insect_labels.txt'),
+   INSECTS: Model(labels_file='mobilenet_v2_192res_1.0_inat_insect_labels.txt',
                   compute_graph_file='mobilenet_v2_192res_1.0_inat_insect.binaryproto',
                   input_shape=(1, 192, 192, 3),
                   input_normalizer=(128.0, 128.0),
                   output_name='prediction'),
-   BIRDS:   Model(labels=utils.load_labels('mobilenet_v2_192res_1.0_inat_bird_labels.txt'),
+   BIRDS:   Model(labels_file='mobilenet_v2_192res_1.0_inat_bird_labels.txt',
                   compute_graph_file='mobilenet_v2_192res_1.0_inat_bird.binaryproto',
                   input_shape=(1, 192, 192, 3),
                   input_normalizer=(128.0, 128.0),
@@ -68,32 +76,26 @@ def model(model_type):
     return ModelDescriptor(name=model_type,
                            input_shape=this_model.input_shape,
                            input_normalizer=this_model.input_normalizer,
-                           compute_graph=this_model.compute_graph())
+                           compute_graph=this_model.compute_graph(),
+                           output_spec=decoders.ClassificationSpec(this_model.output_name,
+                                                                   this_model.labels_file))
 
 
 def get_classes(result, top_k=None, threshold=0.0):
     assert len(result.tensors) == 1
 
     this_model = _MODELS[result.model_name]
-    labels = this_model.labels
 
     tensor = result.tensors[this_model.output_name]
-    probs, shape = tensor.data, tensor.shape
-    assert shape.depth == len(labels)
-    pairs = [pair for pair in enumerate(probs) if pair[1] > threshold]
-    pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
-    pairs = pairs[0:top_k]
-    return [('/'.join(labels[index]), prob) for index, prob in pairs]
+    assert tensor.shape.depth == len(this_model.labels)
+    return this_model.decoder().get_classes(tensor.data, top_k, threshold)
 
 
 def get_classes_sparse(result):
     assert len(result.tensors) == 1
 
     this_model = _MODELS[result.model_name]
-    labels = this_model.labels
 
     tensor = result.tensors[this_model.output_name]
-    indices, probs = tuple(tensor.indices), tuple(tensor.data)
-    pairs = [(index.values[0], prob) for index, prob in zip(indices, probs)]
-    pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
-    return [('/'.join(labels[index]), prob) for index, prob in pairs]
+    sparse = utils.sparse_tensor(tensor)
+    return this_model.decoder().get_classes_sparse(sparse.column(0), sparse.values)
@@ -0,0 +1,154 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Non-maximum suppression for detection results.
+
+Boxes are (x, y, width, height) tuples. Hard NMS removes any box that overlaps
+a higher scoring box by more than the overlap threshold, soft NMS decays scores
+of overlapping boxes instead. Both optionally run per class, i.e. only boxes of
+the same kind suppress each other.
+
+NumPy is used when available (see utils.numpy_enabled), otherwise the same
+algorithm runs in pure Python. Inputs are never modified.
+"""
+import math
+
+from aiy.vision.models import utils
+
+
+def iou(box1, box2):
+    """Returns intersection over union of two (x, y, width, height) boxes."""
+    x1, y1, width1, height1 = box1
+    x2, y2, width2, height2 = box2
+    width = min(x1 + width1, x2 + width2) - max(x1, x2)
+    height = min(y1 + height1, y2 + height2) - max(y1, y2)
+    intersection = max(width, 0) * max(height, 0)
+    union = width1 * height1 + width2 * height2 - intersection
+    if union > 0:
+        return float(intersection) / float(union)
+    return 1.0
+
+
+def _iou_matrix(boxes):
+    """Returns (n, n) matrix of overlap ratios of (n, 4) boxes array."""
+    np = utils.np
+    x, y, width, height = boxes.T
+    right, bottom = x + width, y + height
+    inter_width = np.minimum(right[:, None], right[None, :]) - np.maximum(x[:, None], x[None, :])
+    inter_height = np.minimum(bottom[:, None], bottom[None, :]) - np.maximum(y[:, None], y[None, :])
+    intersection = np.maximum(inter_width, 0) * np.maximum(inter_height, 0)
+    area = width * height
+    union = area[:, None] + area[None, :] - intersection
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(union > 0, intersection / union, 1.0)
+
+
+def _nms_numpy(boxes, scores, kinds, overlap_threshold, soft_sigma,
+               score_threshold, top_k):
+    np = utils.np
+    boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.array(scores, dtype=np.float64)
+    order = np.argsort(-scores, kind='stable')
+    overlaps = _iou_matrix(boxes[order])
+    if kinds is not None:
+        kinds = np.array(kinds)[order]
+        overlaps[kinds[:, None] != kinds[None, :]] = 0.0
+
+    kept, kept_scores = [], []
+    if soft_sigma is None:
+        alive = np.ones(len(order), dtype=bool)
+        for i in range(len(order)):
+            if not alive[i]:
+                continue
+            kept.append(i)
+            kept_scores.append(scores[order[i]])
+            if len(kept) == top_k:
+                break
+            alive &= overlaps[i] <= overlap_threshold
+    else:
+        current = scores[order]
+        alive = current >= score_threshold
+        while alive.any() and len(kept) != top_k:
+            i = int(np.argmax(np.where(alive, current, -np.inf)))
+            kept.append(i)
+            kept_scores.append(current[i])
+            alive[i] = False
+            current = current * np.exp(-(overlaps[i] * overlaps[i]) / soft_sigma)
+            alive &= current >= score_threshold
+
+    return order[kept].tolist(), np.array(kept_scores).tolist()
+
+
+def _nms_python(boxes, scores, kinds, overlap_threshold, soft_sigma,
+                score_threshold, top_k):
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+
+    def overlap(i, j):
+        if kinds is not None and kinds[i] != kinds[j]:
+            return 0.0
+        return iou(boxes[i], boxes[j])
+
+    kept, kept_scores = [], []
+    if soft_sigma is None:
+        remaining = order
+        while remaining and len(kept) != top_k:
+            i = remaining[0]
+            kept.append(i)
+            kept_scores.append(scores[i])
+            remaining = [j for j in remaining[1:] if overlap(i, j) <= overlap_threshold]
+    else:
+        current = {i: scores[i] for i in order if scores[i] >= score_threshold}
+        while current and len(kept) != top_k:
+            i = max(order, key=lambda j: current.get(j, -math.inf))
+            kept.append(i)
+            kept_scores.append(current.pop(i))
+            for j in list(current):
+                current[j] *= math.exp(-overlap(i, j) ** 2 / soft_sigma)
+                if current[j] < score_threshold:
+                    del current[j]
+
+    return kept, kept_scores
+
+
+def non_maximum_suppression(boxes, scores, overlap_threshold=0.5, kinds=None,
+                            soft_sigma=None, score_threshold=0.0, top_k=None):
+    """Runs Non Maximum Suppression.
+
+    Args:
+      boxes: sequence of (x, y, width, height) boxes.
+      scores: sequence of floats, one score per box.
+      overlap_threshold: float, boxes overlapping a kept box by more than this
+        ratio are suppressed (hard NMS only).
+      kinds: optional sequence of ints, one kind per box. If set, only boxes of
+        the same kind suppress each other (per-class NMS).
+      soft_sigma: float, enables Gaussian soft NMS with the given sigma. Instead
+        of removing overlapping boxes their scores are multiplied by
+        exp(-overlap^2 / soft_sigma).
+      score_threshold: float, soft NMS drops boxes whose decayed score falls
+        below this value.
+      top_k: int, max number of boxes to return, None for no limit.
+
+    Returns:
+      (indices, scores) tuple of lists: indices of kept boxes ordered by score
+      from highest to lowest, and their (possibly decayed) scores.
+    """
+    if len(boxes) != len(scores):
+        raise ValueError('Number of boxes and scores must be equal.')
+    if kinds is not None and len(kinds) != len(scores):
+        raise ValueError('Number of kinds and scores must be equal.')
+    if not scores or top_k == 0:
+        return [], []
+
+    impl = _nms_numpy if utils.numpy_enabled() else _nms_python
+    return impl(boxes, scores, kinds, overlap_threshold, soft_sigma,
+                score_threshold, top_k)
@@ -0,0 +1,314 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Multi-object tracking of detection results.
+
+Tracker assigns stable ids to detected items (e.g. faces or objects) across
+frames:
+
+  association: detections are matched to predicted track boxes maximizing total
+    IoU (Hungarian algorithm). Pairs overlapping less than min_iou, or of
+    different kinds, are never matched.
+  smoothing: every track has a constant velocity Kalman filter of its box
+    center and size, reported boxes are filtered estimates.
+  birth: an unmatched detection starts a tentative track, which is confirmed
+    after min_hits consecutive matches. Only confirmed tracks are reported.
+  death: a tentative track is dropped on its first miss, a confirmed track
+    after more than max_age consecutive misses. Until then it keeps moving by
+    its estimated velocity, so short detection drop-outs don't change ids.
+
+Detection doesn't need to run on every frame: tracks can be extrapolated to any
+time between updates with predict()::
+
+  tracker = tracking.Tracker()
+  for result in inference.run():
+      for track in tracker.update(face_detection.get_faces(result)):
+          print(track.track_id, track.bounding_box, track.item.joy_score)
+"""
+
+import itertools
+import math
+
+from collections import namedtuple
+
+from aiy.vision.models.nms import iou
+
+# track_id: int, unique id of the track within Tracker.
+# bounding_box: (x, y, width, height) tuple of floats, filtered box.
+# kind: int, kind of the last matched detection or None.
+# score: float, score of the last matched detection.
+# hits: int, number of matched updates.
+# misses: int, number of consecutive updates without match, 0 if the track was
+#     matched in the last update.
+# velocity: (vx, vy) tuple, estimated velocity of box center per time unit.
+# item: the last matched detection item, e.g. Face or Object.
+Track = namedtuple('Track', ('track_id', 'bounding_box', 'kind', 'score', 'hits', 'misses',
+                             'velocity', 'item'))
+
+
+def linear_assignment(cost):
+    """Solves the linear assignment problem with the Hungarian algorithm.
+
+    Args:
+      cost: list of rows of equal length, cost of assigning row i to column j.
+
+    Returns:
+      List of (row, column) pairs with minimal total cost, every row or every
+      column (whichever is fewer) is assigned exactly once.
+    """
+    if not cost or not cost[0]:
+        return []
+    rows, cols = len(cost), len(cost[0])
+    if rows > cols:
+        transposed = [[cost[i][j] for i in range(rows)] for j in range(cols)]
+        return sorted((i, j) for j, i in linear_assignment(transposed))
+
+    # Shortest augmenting path with row and column potentials, O(rows^2 * cols).
+    # Indices are 1-based, column 0 is a virtual start column.
+    u = [0.0] * (rows + 1)
+    v = [0.0] * (cols + 1)
+    row_of = [0] * (cols + 1)
+    way = [0] * (cols + 1)
+    for i in range(1, rows + 1):
+        row_of[0] = i
+        j0 = 0
+        min_slack = [math.inf] * (cols + 1)
+        used = [False] * (cols + 1)
+        while row_of[j0]:
+            used[j0] = True
+            i0 = row_of[j0]
+            row = cost[i0 - 1]
+            delta, j1 = math.inf, 0
+            for j in range(1, cols + 1):
+                if used[j]:
+                    continue
+                slack = row[j - 1] - u[i0] - v[j]
+                if slack < min_slack[j]:
+                    min_slack[j], way[j] = slack, j0
+                if min_slack[j] < delta:
+                    delta, j1 = min_slack[j], j
+            for j in range(cols + 1):
+                if used[j]:
+                    u[row_of[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            j0 = j1
+        while j0:
+            j1 = way[j0]
+            row_of[j0] = row_of[j1]
+            j0 = j1
+    return sorted((row_of[j] - 1, j - 1) for j in range(1, cols + 1) if row_of[j])
+
+
+class _BoxFilter:
+    """Kalman filter of (center x, center y, width, height) of a box.
+
+    Every coordinate is an independent constant velocity model with state
+    (position, velocity) and 2x2 covariance [[a, b], [b, c]]. Noise standard
+    deviations are proportional to box size.
+    """
+
+    __slots__ = ('pos', 'vel', 'a', 'b', 'c', '_process_noise', '_measurement_noise')
+
+    def __init__(self, box, process_noise, measurement_noise):
+        self._process_noise = process_noise
+        self._measurement_noise = measurement_noise
+        self.pos = list(_center(box))
+        self.vel = [0.0] * 4
+        r = self._variance(measurement_noise)
+        self.a = [r] * 4
+        self.b = [0.0] * 4
+        self.c = [100 * r] * 4  # Velocity is unknown.
+
+    def _variance(self, noise):
+        scale = max(self.pos[2], self.pos[3], 1.0)
+        return (noise * scale) ** 2
+
+    def predicted(self, dt):
+        """Returns (cx, cy, width, height) extrapolated by dt."""
+        return [p + v * dt for p, v in zip(self.pos, self.vel)]
+
+    def predict(self, dt):
+        q = self._variance(self._process_noise)
+        # White noise acceleration.
+        qa, qb, qc = q * dt ** 3 / 3, q * dt ** 2 / 2, q * dt
+        for k in range(4):
+            a, b, c = self.a[k], self.b[k], self.c[k]
+            self.pos[k] += self.vel[k] * dt
+            self.a[k] = a + 2 * dt * b + dt * dt * c + qa
+            self.b[k] = b + dt * c + qb
+            self.c[k] = c + qc
+
+    def update(self, box):
+        r = self._variance(self._measurement_noise)
+        for k, z in enumerate(_center(box)):
+            a, b, c = self.a[k], self.b[k], self.c[k]
+            s = a + r
+            gain_pos, gain_vel = a / s, b / s
+            residual = z - self.pos[k]
+            self.pos[k] += gain_pos * residual
+            self.vel[k] += gain_vel * residual
+            self.a[k] = (1 - gain_pos) * a
+            self.b[k] = (1 - gain_pos) * b
+            self.c[k] = c - gain_vel * b
+
+
+def _center(box):
+    x, y, width, height = box
+    return x + width / 2, y + height / 2, width, height
+
+
+def _box(center):
+    cx, cy, width, height = center
+    width, height = max(width, 0.0), max(height, 0.0)
+    return cx - width / 2, cy - height / 2, width, height
+
+
+class _Track:
+
+    __slots__ = ('track_id', 'filter', 'kind', 'score', 'hits', 'misses', 'item')
+
+    def __init__(self, track_id, box, kind, score, item, process_noise, measurement_noise):
+        self.track_id = track_id
+        self.filter = _BoxFilter(box, process_noise, measurement_noise)
+        self.kind = kind
+        self.score = score
+        self.hits = 1
+        self.misses = 0
+        self.item = item
+
+    def snapshot(self, dt=0.0):
+        return Track(self.track_id, _box(self.filter.predicted(dt)), self.kind, self.score,
+                     self.hits, self.misses, tuple(self.filter.vel[:2]), self.item)
+
+
+class Tracker:
+    """Assigns stable ids to detections across frames, see module docstring."""
+
+    def __init__(self, min_iou=0.3, min_hits=3, max_age=5, per_class=True,
+                 process_noise=0.05, measurement_noise=0.05):
+        """Initialization.
+
+        Args:
+          min_iou: float, min overlap of detection and predicted track box to
+            match them.
+          min_hits: int, number of matches after which a track is confirmed.
+          max_age: int, number of consecutive updates without match after which
+            a confirmed track is dropped.
+          per_class: bool, whether detections only match tracks of the same kind.
+          process_noise: float, std of box motion noise relative to box size.
+          measurement_noise: float, std of detection noise relative to box size.
+        """
+        self._min_iou = min_iou
+        self._min_hits = min_hits
+        self._max_age = max_age
+        self._per_class = per_class
+        self._process_noise = process_noise
+        self._measurement_noise = measurement_noise
+        self._ids = itertools.count(1)
+        self._tracks = []
+        self._time = None
+
+    def reset(self):
+        """Drops all tracks, ids are not reused."""
+        self._tracks = []
+        self._time = None
+
+    @property
+    def time(self):
+        """Timestamp of the last update, None before the first one."""
+        return self._time
+
+    @property
+    def tracks(self):
+        """Returns list of confirmed Track at the time of the last update."""
+        return [track.snapshot() for track in self._tracks if track.hits >= self._min_hits]
+
+    def _matches(self, tracks, boxes, kinds):
+        cost = []
+        for track in tracks:
+            predicted = _box(track.filter.pos)
+            row = []
+            for box, kind in zip(boxes, kinds):
+                if (self._per_class and kind is not None and track.kind is not None and
+                        kind != track.kind):
+                    row.append(1.0)
+                    continue
+                overlap = iou(predicted, box)
+                row.append(1.0 - overlap if overlap >= self._min_iou else 1.0)
+            cost.append(row)
+        return [(i, j) for i, j in linear_assignment(cost) if cost[i][j] < 1.0]
+
+    def update(self, detections, timestamp=None):
+        """Updates tracks with detections of a new frame.
+
+        Args:
+          detections: Detections of the frame, may be empty.
+          timestamp: float, time of the frame in any unit, velocities are per
+            this unit. Default is previous timestamp + 1, i.e. frame numbers.
+
+        Returns:
+          List of confirmed Track.
+        """
+        if timestamp is None:
+            timestamp = 0.0 if self._time is None else self._time + 1.0
+        dt = 0.0 if self._time is None else timestamp - self._time
+        if dt < 0:
+            raise ValueError('Timestamps must not decrease.')
+        self._time = timestamp
+
+        for track in self._tracks:
+            track.filter.predict(dt)
+
+        boxes = [detections.bounding_box(i) for i in range(len(detections))]
+        kinds = [detections.kind(i) for i in range(len(detections))]
+        matched_tracks, matched_boxes = set(), set()
+        for i, j in self._matches(self._tracks, boxes, kinds):
+            track = self._tracks[i]
+            track.filter.update(boxes[j])
+            track.kind = kinds[j]
+            track.score = detections.scores[j]
+            track.item = detections[j]
+            track.hits += 1
+            track.misses = 0
+            matched_tracks.add(i)
+            matched_boxes.add(j)
+
+        tracks = []
+        for i, track in enumerate(self._tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+                confirmed = track.hits >= self._min_hits
+                if not confirmed or track.misses > self._max_age:
+                    continue
+            tracks.append(track)
+
+        for j, box in enumerate(boxes):
+            if j not in matched_boxes:
+                tracks.append(_Track(next(self._ids), box, kinds[j], detections.scores[j],
+                                     detections[j], self._process_noise,
+                                     self._measurement_noise))
+        self._tracks = tracks
+        return self.tracks
+
+    def predict(self, timestamp):
+        """Returns list of confirmed Track extrapolated to timestamp.
+
+        Tracks are not changed, e.g. to interpolate boxes of frames on which
+        detection doesn't run.
+        """
+        if self._time is None:
+            return []
+        dt = timestamp - self._time
+        return [track.snapshot(dt) for track in self._tracks if track.hits >= self._min_hits]
@@ -1,6 +1,50 @@
-"""Set of reusable utilities to work with AIY models."""
+"""Set of reusable utilities to work with AIY models.
 
+Model files are loaded lazily on first use and memoized process-wide: label
+and anchor files by path, compute graphs in a LRU cache bounded by total size
+(VISION_BONNET_GRAPH_CACHE_SIZE environment variable, 64 MB by default).
+Compute graphs are read into bytes (protobuf requests need bytes) and are
+reloaded only when the file on disk changes.
+
+Parsed anchor files are also cached on disk in binary form, so the text file
+is parsed only once per change. The cache directory is set by
+VISION_BONNET_CACHE_PATH environment variable (~/.cache/aiy by default), an
+empty value disables the disk cache.
+"""
+
+import collections
+import functools
+import hashlib
+import heapq
+import itertools
 import os
+import struct
+import tempfile
+import threading
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_use_numpy = os.environ.get('VISION_BONNET_USE_NUMPY', '1') != '0'
+
+
+def use_numpy(enabled):
+    """Enables or disables NumPy-based decoders at runtime.
+
+    NumPy-based decoders are used by default when NumPy is installed, they can
+    also be disabled by setting VISION_BONNET_USE_NUMPY=0 environment variable.
+    """
+    global _use_numpy
+    _use_numpy = enabled
+
+
+def numpy_enabled():
+    """Returns whether NumPy-based decoders should be used."""
+    return _use_numpy and np is not None
 
 
 def _path(filename):
@@ -8,23 +52,189 @@ def _path(filename):
     return os.path.join(path, filename)
 
 
-def load_compute_graph(filename):
-    with open(_path(filename), 'rb') as f:
+DEFAULT_GRAPH_CACHE_SIZE = 64 * 1024 * 1024
+
+
+def _get_default_graph_cache_size():
+    return int(os.environ.get('VISION_BONNET_GRAPH_CACHE_SIZE', DEFAULT_GRAPH_CACHE_SIZE))
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
         return f.read()
 
-def load_labels(filename):
+
+class _GraphCache:
+    """LRU cache of compute graph bytes, bounded by total size."""
+
+    def __init__(self, max_size):
+        self._lock = threading.Lock()
+        self._graphs = collections.OrderedDict()  # path -> (stat key, bytes)
+        self._size = 0
+        self.max_size = max_size
+
+    @property
+    def size(self):
+        return self._size
+
+    def get(self, path):
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._graphs.get(path)
+            if entry and entry[0] == key:
+                self._graphs.move_to_end(path)
+                return entry[1]
+
+        graph = _read_file(path)
+        with self._lock:
+            self._remove(path)
+            if len(graph) <= self.max_size:
+                self._graphs[path] = (key, graph)
+                self._size += len(graph)
+                while self._size > self.max_size:
+                    self._remove(next(iter(self._graphs)))
+        return graph
+
+    def _remove(self, path):
+        entry = self._graphs.pop(path, None)
+        if entry:
+            self._size -= len(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._graphs.clear()
+            self._size = 0
+
+
+_graph_cache = _GraphCache(_get_default_graph_cache_size())
+
+
+def load_compute_graph(filename):
+    """Returns compute graph bytes, memoized in the process-wide LRU cache."""
+    return _graph_cache.get(_path(filename))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_labels(path):
     def split(line):
         return tuple(word.strip() for word in line.split(','))
 
-    with open(_path(filename), encoding='utf-8') as f:
+    with open(path, encoding='utf-8') as f:
         return tuple(split(line) for line in f)
 
+
+def load_labels(filename):
+    """Returns memoized tuple of label synonym tuples."""
+    return _load_labels(_path(filename))
+
+
+# Magic, source file mtime (ns) and size, followed by native doubles.
+_ANCHORS_CACHE_HEADER = struct.Struct('<8sqq')
+_ANCHORS_CACHE_MAGIC = b'AIYANC\x01\x00'
+
+
+def _cache_path(path, prefix):
+    cache_dir = os.environ.get('VISION_BONNET_CACHE_PATH',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'aiy'))
+    if not cache_dir:
+        return None
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '%s-%s.bin' % (prefix, digest))
+
+
+def _parse_ssd_anchors(path):
+    anchors = array('d')
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            anchors.extend(float(word.strip()) for word in line.split(' '))
+    if len(anchors) % 4:
+        raise ValueError('Anchors file "%s" must have 4 values per line.' % path)
+    return anchors
+
+
+def _read_anchors_cache(cache_path, key):
+    try:
+        with open(cache_path, 'rb') as f:
+            header = f.read(_ANCHORS_CACHE_HEADER.size)
+            if (len(header) != _ANCHORS_CACHE_HEADER.size or
+                    _ANCHORS_CACHE_HEADER.unpack(header) != (_ANCHORS_CACHE_MAGIC,) + key):
+                return None
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) % (4 * array('d').itemsize):
+        return None
+    return array('d', data)
+
+
+def _write_anchors_cache(cache_path, key, anchors):
+    """Atomically writes anchors cache, failures are ignored (e.g. read-only home)."""
+    try:
+        cache_dir = os.path.dirname(cache_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_ANCHORS_CACHE_HEADER.pack(_ANCHORS_CACHE_MAGIC, *key))
+                anchors.tofile(f)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
+
+
+@functools.lru_cache(maxsize=None)
+def _load_ssd_anchors_array(path):
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cache_path = _cache_path(path, 'anchors')
+    anchors = _read_anchors_cache(cache_path, key) if cache_path else None
+    if anchors is None:
+        anchors = _parse_ssd_anchors(path)
+        if cache_path:
+            _write_anchors_cache(cache_path, key, anchors)
+    return anchors
+
+
+@functools.lru_cache(maxsize=None)
+def _load_ssd_anchors(path):
+    anchors = _load_ssd_anchors_array(path)
+    return tuple(tuple(anchors[i:i + 4]) for i in range(0, len(anchors), 4))
+
+
+def load_ssd_anchors_array(filename):
+    """Returns memoized flat array('d') of ymin, xmin, ymax, xmax anchor values.
+
+    The array is shared, it must not be modified.
+    """
+    return _load_ssd_anchors_array(_path(filename))
+
+
 def load_ssd_anchors(filename):
-    def split(line):
-        return tuple(float(word.strip()) for word in line.split(' '))
+    """Returns memoized tuple of (ymin, xmin, ymax, xmax) anchor tuples."""
+    return _load_ssd_anchors(_path(filename))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_classification_decoder(path):
+    return ClassificationDecoder(_load_labels(path))
+
+
+def load_classification_decoder(filename):
+    """Returns memoized ClassificationDecoder for the labels file."""
+    return _load_classification_decoder(_path(filename))
 
-    with open(_path(filename), encoding='utf-8') as f:
-        return tuple(split(line) for line in f)
+
+def clear_caches():
+    """Drops all memoized model files, they are reloaded on next use."""
+    _graph_cache.clear()
+    _load_labels.cache_clear()
+    _load_ssd_anchors.cache_clear()
+    _load_ssd_anchors_array.cache_clear()
+    _load_classification_decoder.cache_clear()
 
 
 def shape_tuple(shape):
@@ -34,3 +244,123 @@ def reshape(array, width):
     assert len(array) % width == 0
     height = len(array) // width
     return [array[i * width:(i + 1) * width] for i in range(height)]
+
+
+class SparseTensor(collections.namedtuple('SparseTensor', ('rank', 'indices', 'values'))):
+    """Sparse output tensor as flat typed arrays.
+
+    Attributes:
+      rank: int, number of dimensions of every index, 0 if tensor is empty.
+      indices: array('i') of len(self) * rank ints, j-th index is
+        indices[j * rank:(j + 1) * rank].
+      values: array('d') of tensor values, the same number for every index
+        (more than one if not all dimensions are sparse).
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        """Returns number of indices."""
+        return len(self.indices) // self.rank if self.rank else 0
+
+    def column(self, dim):
+        """Returns array('i') of dimension dim of every index."""
+        if not self.rank:
+            return array('i')
+        return self.indices[dim::self.rank]
+
+
+def _elements(container):
+    """Returns elements of a repeated protobuf field as a sequence.
+
+    The pure-Python protobuf implementation keeps them in a list, which is
+    much faster to iterate than the container itself.
+    """
+    return getattr(container, '_values', container)
+
+
+def sparse_tensor(tensor):
+    """Returns SparseTensor of FloatTensor returned with sparse configs.
+
+    Index values of all indices are chained into one array in a single pass,
+    reading element lists of the repeated fields directly when the protobuf
+    implementation exposes them. The parser still creates a message per index,
+    other implementations also create a wrapper per index while iterating.
+    Arrays can be wrapped by NumPy without copying, e.g.
+    np.frombuffer(indices, dtype=np.intc).
+    """
+    index_values = [_elements(index.values) for index in _elements(tensor.indices)]
+    indices = array('i', itertools.chain.from_iterable(index_values))
+    rank = len(index_values[0]) if indices else 0
+    return SparseTensor(rank, indices, array('d', _elements(tensor.data)))
+
+
+class ClassificationDecoder:
+    """Converts classification model output to (label, probability) pairs.
+
+    Joined label strings are computed once per label set, so a decoder should be
+    created once per model and reused for every inference result. Top-k pairs
+    are selected without sorting all probabilities: with NumPy by partitioning,
+    otherwise with a heap. Results are the same as sorting all pairs by
+    probability (ties are ordered by label index).
+    """
+
+    def __init__(self, labels):
+        """Initialization.
+
+        Args:
+          labels: sequence of label strings or tuples of label synonyms as
+            returned by load_labels(), synonyms are joined with '/'.
+        """
+        self._names = tuple(label if isinstance(label, str) else '/'.join(label)
+                            for label in labels)
+
+    @property
+    def names(self):
+        return self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def _top_indices_numpy(self, probs, top_k, threshold):
+        probs = np.array(probs, dtype=np.float64)
+        indices = np.flatnonzero(probs > threshold)
+        values = probs[indices]
+        if top_k is not None and top_k < len(indices):
+            if top_k <= 0:
+                return [], probs
+            kth = np.partition(values, len(values) - top_k)[len(values) - top_k]
+            above = indices[values > kth]
+            equal = indices[values == kth][:top_k - len(above)]
+            indices = np.sort(np.concatenate((above, equal)))
+            values = probs[indices]
+        return indices[np.argsort(-values, kind='stable')].tolist(), probs
+
+    def get_classes(self, probs, top_k=None, threshold=0.0):
+        """Returns (label, probability) pairs ordered by probability.
+
+        Args:
+          probs: sequence of probabilities, one per label.
+          top_k: int; max number of pairs to return.
+          threshold: float; min probability of each returned pair.
+        """
+        assert len(probs) == len(self._names)
+        if numpy_enabled():
+            indices, values = self._top_indices_numpy(probs, top_k, threshold)
+            return [(self._names[i], float(values[i])) for i in indices]
+
+        pairs = [pair for pair in enumerate(probs) if pair[1] > threshold]
+        if top_k is None or top_k >= len(pairs):
+            pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
+        else:
+            pairs = heapq.nlargest(max(top_k, 0), pairs, key=lambda pair: pair[1])
+        return [(self._names[index], prob) for index, prob in pairs]
+
+    def get_classes_sparse(self, indices, probs):
+        """Returns (label, probability) pairs ordered by probability.
+
+        Args:
+          indices: sequence of label indices.
+          probs: sequence of probabilities, one per index.
+        """
+        pairs = sorted(zip(indices, probs), key=lambda pair: pair[1], reverse=True)
+        return [(self._names[index], prob) for index, prob in pairs]
@@ -0,0 +1,332 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Streaming operators for per-frame values of inference results.
+
+Every operator takes one value per frame with update(value, timestamp) in O(1)
+time and returns its output, or None when there is nothing to report (e.g. no
+event). Timestamps are in seconds and default to time.monotonic(), so
+operators that depend on time work the same whatever the frame rate is and
+inference loops never need to sleep::
+
+  joy = operators.Pipeline(operators.WindowAverage(10),
+                           operators.Hysteresis(low=0.1, high=0.85))
+  for result in inference.run():
+      event = joy.update(average_joy_score(face_detection.get_faces(result)))
+      if event == 'high':
+          ...
+
+Operators are not thread-safe.
+"""
+
+import collections
+import math
+import time
+
+
+class Operator:
+    """Base class of streaming operators."""
+
+    def update(self, value, timestamp=None):
+        """Processes value of a new frame, returns output or None."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Forgets all previous values."""
+        raise NotImplementedError
+
+    def __call__(self, value, timestamp=None):
+        return self.update(value, timestamp)
+
+
+def _now(timestamp):
+    return time.monotonic() if timestamp is None else timestamp
+
+
+class ExponentialAverage(Operator):
+    """Exponential moving average.
+
+    With alpha every value has the same weight regardless of time between
+    frames. With half_life (seconds) weight of a value depends on time since the
+    previous one, so dropped or skipped frames don't change the smoothing.
+    """
+
+    def __init__(self, alpha=None, half_life=None):
+        if (alpha is None) == (half_life is None):
+            raise ValueError('Exactly one of alpha and half_life must be set.')
+        if alpha is not None and not 0.0 < alpha <= 1.0:
+            raise ValueError('Alpha must be in (0.0, 1.0].')
+        if half_life is not None and half_life <= 0:
+            raise ValueError('Half life must be positive.')
+        self._alpha = alpha
+        self._half_life = half_life
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._timestamp = None
+
+    @property
+    def value(self):
+        """Current average, None before the first update."""
+        return self._value
+
+    def update(self, value, timestamp=None):
+        """Returns average including value."""
+        alpha = self._alpha
+        if self._half_life is not None:
+            timestamp = _now(timestamp)
+            if self._timestamp is not None:
+                dt = max(timestamp - self._timestamp, 0.0)
+                alpha = 1.0 - math.pow(0.5, dt / self._half_life)
+            self._timestamp = timestamp
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += alpha * (value - self._value)
+        return self._value
+
+
+class WindowAverage(Operator):
+    """Average of the last size values."""
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError('Window size must be positive.')
+        self._size = size
+        self.reset()
+
+    def reset(self):
+        self._window = collections.deque(maxlen=self._size)
+        self._sum = 0.0
+        self._updates = 0
+
+    @property
+    def value(self):
+        """Current average, None before the first update."""
+        return self._sum / len(self._window) if self._window else None
+
+    def update(self, value, timestamp=None):
+        """Returns average of the window including value."""
+        if len(self._window) == self._size:
+            self._sum -= self._window[0]
+        self._window.append(value)
+        self._sum += value
+        self._updates += 1
+        if self._updates % self._size == 0:
+            self._sum = math.fsum(self._window)  # Drop accumulated rounding errors.
+        return self._sum / len(self._window)
+
+
+class Hysteresis(Operator):
+    """Converts values to 'high' and 'low' events with hysteresis.
+
+    State changes to 'high' when a value is above high threshold and to 'low'
+    when it is below low threshold. Values between thresholds keep the state,
+    so values oscillating around a threshold don't produce a burst of events.
+    """
+
+    def __init__(self, low, high, initial='low'):
+        """Initialization.
+
+        Args:
+          low: float, low threshold.
+          high: float, high threshold, must be greater than low.
+          initial: 'low', 'high' or None, initial state. No event is reported
+            for the initial state, with None the first value out of range
+            (low, high) produces an event.
+        """
+        if not low < high:
+            raise ValueError('Low threshold must be less than high threshold.')
+        if initial not in ('low', 'high', None):
+            raise ValueError('Initial state must be "low", "high" or None.')
+        self._low = low
+        self._high = high
+        self._initial = initial
+        self.reset()
+
+    def reset(self):
+        self._state = self._initial
+
+    @property
+    def state(self):
+        return self._state
+
+    def update(self, value, timestamp=None):
+        """Returns 'high' or 'low' when state changes, otherwise None."""
+        if value > self._high:
+            state = 'high'
+        elif value < self._low:
+            state = 'low'
+        else:
+            return None
+        if state == self._state:
+            return None
+        self._state = state
+        return state
+
+
+class ChangeDetector(Operator):
+    """Reports values which differ from the last reported one.
+
+    Without min_delta values are compared for equality, e.g. to detect changes
+    of labels or booleans. With min_delta only numbers which differ by at least
+    min_delta from the last reported one are reported.
+    """
+
+    def __init__(self, min_delta=None, report_first=True):
+        """Initialization.
+
+        Args:
+          min_delta: float, min difference of numbers to report.
+          report_first: bool, whether the first value is reported.
+        """
+        self._min_delta = min_delta
+        self._report_first = report_first
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._seen = False
+
+    @property
+    def value(self):
+        """The last reported (or first) value."""
+        return self._value
+
+    def update(self, value, timestamp=None):
+        """Returns value if it changed, otherwise None."""
+        if not self._seen:
+            self._seen = True
+            self._value = value
+            return value if self._report_first else None
+        if self._min_delta is None:
+            changed = value != self._value
+        else:
+            changed = abs(value - self._value) >= self._min_delta
+        if not changed:
+            return None
+        self._value = value
+        return value
+
+
+class Debounce(Operator):
+    """Reports a value once it is stable.
+
+    A new value is reported when it was received in at least count consecutive
+    frames spanning at least duration seconds. Each stable value is reported
+    once, i.e. this is also a change detector of stable values.
+    """
+
+    def __init__(self, count=1, duration=0.0):
+        if count < 1:
+            raise ValueError('Count must be positive.')
+        self._count = count
+        self._duration = duration
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._stable = False
+        self._candidate = None
+        self._candidate_count = 0
+        self._candidate_since = None
+
+    @property
+    def value(self):
+        """The last reported value, None if nothing was reported yet."""
+        return self._value
+
+    def update(self, value, timestamp=None):
+        """Returns value when it becomes stable, otherwise None."""
+        timestamp = _now(timestamp)
+        if self._candidate_count and value == self._candidate:
+            self._candidate_count += 1
+        else:
+            self._candidate = value
+            self._candidate_count = 1
+            self._candidate_since = timestamp
+
+        if self._stable and value == self._value:
+            return None
+        if (self._candidate_count >= self._count and
+                timestamp - self._candidate_since >= self._duration):
+            self._value = value
+            self._stable = True
+            return value
+        return None
+
+
+class RateLimiter(Operator):
+    """Passes at most one value per interval seconds."""
+
+    def __init__(self, interval):
+        if interval < 0:
+            raise ValueError('Interval must not be negative.')
+        self._interval = interval
+        self.reset()
+
+    def reset(self):
+        self._last = None
+
+    def ready(self, timestamp=None):
+        """Returns whether the next update would pass."""
+        return self._last is None or _now(timestamp) - self._last >= self._interval
+
+    def update(self, value, timestamp=None):
+        """Returns value if interval passed since the last passed value, otherwise None."""
+        timestamp = _now(timestamp)
+        if self._last is not None and timestamp - self._last < self._interval:
+            return None
+        self._last = timestamp
+        return value
+
+
+class Pipeline(Operator):
+    """Chain of operators, output of each one is the input of the next one.
+
+    Returns None as soon as any operator returns None, so operators after a
+    filter (e.g. Hysteresis or RateLimiter) only see values which passed it.
+    """
+
+    def __init__(self, *operators):
+        self._operators = operators
+
+    @property
+    def operators(self):
+        return self._operators
+
+    def reset(self):
+        for operator in self._operators:
+            operator.reset()
+
+    def update(self, value, timestamp=None):
+        timestamp = _now(timestamp)
+        for operator in self._operators:
+            value = operator.update(value, timestamp)
+            if value is None:
+                return None
+        return value
+
+    def map(self, values, key=None):
+        """Yields non-None outputs of values, e.g. of CameraInference.run().
+
+        Args:
+          values: iterable of values.
+          key: function returning operator input of each value, e.g. a score
+            of an inference result. Identity by default.
+        """
+        for value in values:
+            output = self.update(value if key is None else key(value))
+            if output is not None:
+                yield output
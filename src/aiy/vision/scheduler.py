@@ -0,0 +1,199 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Time-sliced camera inference of several models.
+
+The VisionBonnet runs camera inference of a single model at a time.
+InferenceScheduler keeps several models loaded and switches camera inference
+between them, so that each model gets results at its own target rate::
+
+  with InferenceScheduler([ScheduledModel(face_detection.model(), rate=10),
+                           ScheduledModel(object_detection.model(), rate=3)]) as scheduler:
+      for model_name, result in scheduler.run():
+          ...
+
+Models with a crop run image inference on a region of a frame returned by
+frame_source (e.g. a PiCamera capture) instead of camera inference.
+"""
+
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+
+from collections import namedtuple
+
+from .inference import InferenceEngine, _close_stack_silently, _model_registry
+
+logger = logging.getLogger(__name__)
+
+# descriptor: ModelDescriptor of the model.
+# rate: float, target number of results per second, None to run as often as
+#     possible.
+# params: dict, inference params.
+# sparse_configs: dict, sparse configs of output tensors.
+# crop: (x, y, width, height) region of frame_source() image to run image
+#     inference on, (0, 0, 0, 0) for the whole image. None (default) to run
+#     camera inference.
+ScheduledModel = namedtuple('ScheduledModel',
+    ('descriptor', 'rate', 'params', 'sparse_configs', 'crop'))
+ScheduledModel.__new__.__defaults__ = (None, None, None, None)
+
+# model_name: string, name of the model.
+# result: InferenceResult.
+ScheduledResult = namedtuple('ScheduledResult', ('model_name', 'result'))
+
+# count: int, number of returned results.
+# dropped: int, number of scheduled slots missed because other models or the
+#     caller took too long.
+# latency: float, seconds of the last inference request.
+# mean_latency: float, mean seconds of all inference requests.
+ModelStats = namedtuple('ModelStats', ('count', 'dropped', 'latency', 'mean_latency'))
+
+
+class _ModelState:
+
+    def __init__(self, model, order):
+        self.model = model
+        self.name = model.descriptor.name
+        self.period = 1.0 / model.rate if model.rate else 0.0
+        self.order = order
+        self.due = 0.0
+        self.count = 0
+        self.dropped = 0
+        self.latency = 0.0
+        self.total_latency = 0.0
+
+    def __lt__(self, other):
+        return (self.due, self.order) < (other.due, other.order)
+
+    def schedule(self, now):
+        """Moves due time to the next slot, counts missed slots."""
+        if not self.period:
+            self.due = now
+            return
+        self.due += self.period
+        if self.due < now:
+            missed = int((now - self.due) / self.period)
+            self.dropped += missed
+            self.due += missed * self.period
+
+    def stats(self):
+        return ModelStats(self.count, self.dropped, self.latency,
+                          self.total_latency / self.count if self.count else 0.0)
+
+
+class InferenceScheduler:
+    """Runs several models over the camera stream at their own rates."""
+
+    def __init__(self, models, frame_source=None):
+        """Initialization.
+
+        Args:
+          models: list of ScheduledModel, model names must be unique.
+          frame_source: function returning PIL image of the current camera
+            frame, required for models with crop.
+        """
+        names = [model.descriptor.name for model in models]
+        if len(set(names)) != len(names):
+            raise ValueError('Model names must be unique.')
+        if frame_source is None and any(model.crop is not None for model in models):
+            raise ValueError('frame_source is required for models with crop.')
+
+        self._states = [_ModelState(model, i) for i, model in enumerate(models)]
+        self._frame_source = frame_source
+        self._camera_model = None
+        self._stack = contextlib.ExitStack()
+        self._engine = self._stack.enter_context(InferenceEngine())
+        try:
+            for model in models:
+                name = _model_registry.acquire(self._engine, model.descriptor)
+                self._stack.callback(_model_registry.release, self._engine, name)
+            self._stack.callback(self._stop_camera_inference)
+        except Exception:
+            _close_stack_silently(self._stack)
+            raise
+
+    def _stop_camera_inference(self):
+        if self._camera_model:
+            self._engine.stop_camera_inference()
+            self._camera_model = None
+
+    def _camera_inference(self, model):
+        if self._camera_model != model.descriptor.name:
+            self._stop_camera_inference()
+            logger.debug('Switch camera inference to "%s".', model.descriptor.name)
+            self._engine.start_camera_inference(model.descriptor.name, model.params,
+                                                model.sparse_configs)
+            self._camera_model = model.descriptor.name
+        return self._engine.camera_inference()
+
+    def _image_inference(self, model):
+        image = self._frame_source()
+        x, y, width, height = model.crop
+        if width and height:
+            image = image.crop((x, y, x + width, y + height))
+        return self._engine.image_inference(model.descriptor.name, image, model.params,
+                                            model.sparse_configs)
+
+    def run(self, count=None):
+        """Yields ScheduledResult of all models in order of their due time.
+
+        Args:
+          count: int, total number of results to return, or None to run
+            forever.
+        """
+        now = time.monotonic()
+        queue = list(self._states)
+        for state in queue:
+            state.due = now
+        heapq.heapify(queue)
+
+        for _ in (itertools.count() if count is None else range(count)):
+            state = heapq.heappop(queue)
+            delay = state.due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            start = time.monotonic()
+            if state.model.crop is None:
+                result = self._camera_inference(state.model)
+            else:
+                result = self._image_inference(state.model)
+            end = time.monotonic()
+
+            state.count += 1
+            state.latency = end - start
+            state.total_latency += state.latency
+            state.schedule(end)
+            heapq.heappush(queue, state)
+            yield ScheduledResult(state.name, result)
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def stats(self):
+        """Dict of model name to ModelStats."""
+        return {state.name: state.stats() for state in self._states}
+
+    def close(self):
+        self._stack.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
@@ -0,0 +1,463 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Software VisionBonnet simulator.
+
+Speaks the same length-prefixed protocol_pb2 Request/Response framing as the
+bonnet socket server and implements all requests: model load/unload, camera
+and image inference with sparse configs, and get_*_state/info requests.
+Inference results contain synthetic output tensors configured per model with
+SimulatedModel, and report latency configured with LatencyProfile. So the
+host side (InferenceEngine, CameraInference, ImageInference and decoders) can
+be tested and benchmarked without hardware::
+
+  with simulated_bonnet() as simulator:
+      with InferenceEngine() as engine:
+          ...
+
+It can also be started from the command line::
+
+  python3 -m aiy.vision.simulator --port 35000
+"""
+
+import argparse
+import contextlib
+import heapq
+import io
+import itertools
+import logging
+import os
+import random
+import socket
+import socketserver
+import threading
+import time
+
+from collections import namedtuple
+from functools import reduce
+from operator import mul
+
+from .proto import protocol_pb2 as pb2
+from ._transport import _socket_receive_message, _socket_send_message
+
+logger = logging.getLogger(__name__)
+
+_FIRMWARE_VERSION = (1, 2)
+
+# inference_ms: float, mean inference duration reported as duration_ms.
+# jitter_ms: float, max random deviation from inference_ms.
+# transfer_ms_per_mb: float, additional delay per MB of request data when
+#     simulator runs in realtime mode.
+LatencyProfile = namedtuple('LatencyProfile',
+    ('inference_ms', 'jitter_ms', 'transfer_ms_per_mb'))
+LatencyProfile.__new__.__defaults__ = (0.0, 0.0, 0.0)
+
+# tensors: dict, output tensor name to (batch, height, width, depth) shape.
+# latency: LatencyProfile of inference.
+# generator: function (tensor_name, shape, random.Random) -> list of floats
+#     returning data of output tensor. Uniform values from [0, 1) by default.
+SimulatedModel = namedtuple('SimulatedModel', ('tensors', 'latency', 'generator'))
+SimulatedModel.__new__.__defaults__ = (LatencyProfile(), None)
+
+DEFAULT_MODEL = SimulatedModel(tensors={'output': (1, 1, 1, 10)})
+
+
+def _uniform(tensor_name, shape, rand):
+    return [rand.random() for _ in range(reduce(mul, shape, 1))]
+
+
+def _unravel(index, shape):
+    """Returns multi-dimensional index tuple of flat index in shape."""
+    values = []
+    for size in reversed(shape):
+        index, value = divmod(index, size)
+        values.append(value)
+    return tuple(reversed(values))
+
+
+def _threshold(data, config):
+    """Applies SparseConfig.Thresholding, returns (indices, values) lists."""
+    shape = tuple(config.logical_shape.values)
+    to_ignore = {(item.dim, item.label) for item in config.thresholding.to_ignore}
+    threshold = config.thresholding.threshold
+    candidates = []
+    for i, value in enumerate(data):
+        if value < threshold:
+            continue
+        index = _unravel(i, shape)
+        if any((dim, label) in to_ignore for dim, label in enumerate(index)):
+            continue
+        candidates.append((value, index))
+    top = heapq.nlargest(config.thresholding.top_k, candidates, key=lambda c: c[0])
+    return [index for _, index in top], [value for value, _ in top]
+
+
+def _from_sparse_tensor(data, config, sparse_indices):
+    """Applies SparseConfig.FromSparseTensor, returns (indices, values) lists."""
+    shape = tuple(config.logical_shape.values)
+    squeeze_dims = set(config.from_sparse_tensor.squeeze_dims)
+    element_size = len(data) // reduce(mul, shape, 1)
+    indices, values, seen = [], [], set()
+    for index in sparse_indices:
+        index = tuple(v for dim, v in enumerate(index) if dim not in squeeze_dims)
+        if index in seen:
+            continue
+        seen.add(index)
+        flat = 0
+        for size, value in zip(shape, index):
+            flat = flat * size + value
+        indices.append(index)
+        values.extend(data[flat * element_size:(flat + 1) * element_size])
+    return indices, values
+
+
+def _image_size(tensor):
+    """Returns (width, height) of ByteTensor, JPEG is decoded if PIL exists."""
+    if tensor.shape.width or tensor.shape.height:
+        return tensor.shape.width, tensor.shape.height
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(tensor.data)) as image:
+            return image.size
+    except Exception:
+        return 0, 0
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections.add(self.request)
+
+    def handle(self):
+        header = bytearray(4)
+        try:
+            while True:
+                request_bytes = _socket_receive_message(self.request, header)
+                if request_bytes is None:
+                    return
+                _socket_send_message(self.request,
+                                     self.server.simulator.transact(request_bytes))
+        except OSError:
+            pass  # Connection closed by simulator.close().
+
+    def finish(self):
+        self.server.connections.discard(self.request)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = set()
+
+    def close_connections(self):
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class BonnetSimulator:
+    """Software VisionBonnet serving protocol_pb2 requests over TCP.
+
+    Args:
+      host: string, address to listen on.
+      port: int, port to listen on, 0 to pick any free port.
+      models: dict, model name to SimulatedModel. Models not listed here use
+        default_model.
+      default_model: SimulatedModel for all other models.
+      realtime: bool, whether to actually wait for simulated latency and
+        camera frames. Otherwise latency is only reported in duration_ms and
+        results are returned as fast as possible.
+      camera_size: (width, height) of simulated camera frames.
+      frame_rate: float, simulated camera frame rate in realtime mode.
+      seed: int, seed for synthetic tensor data and latency jitter.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, models=None, default_model=DEFAULT_MODEL,
+                 realtime=False, camera_size=(1640, 1232), frame_rate=30.0, seed=0):
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+        self._models = dict(models or {})
+        self._default_model = default_model
+        self._realtime = realtime
+        self._camera_size = camera_size
+        self._frame_period = 1.0 / frame_rate
+        self._random = random.Random(seed)
+        self._loaded_models = {}
+        self._camera_model = None
+        self._camera_request = None
+        self._camera_start = 0.0
+        self._frame_index = itertools.count()
+        self._requests = 0
+        self._model_loads = 0
+        self._server = _Server((host, port), _Handler)
+        self._server.simulator = self
+        self._thread = None
+
+    @property
+    def requests(self):
+        """Number of handled requests."""
+        return self._requests
+
+    @property
+    def model_loads(self):
+        """Number of successful load_model requests."""
+        return self._model_loads
+
+    def set_model(self, name, model):
+        """Sets SimulatedModel used for model with given name."""
+        with self._lock:
+            self._models[name] = model
+
+    @property
+    def address(self):
+        """(host, port) tuple the simulator listens on."""
+        return self._server.server_address
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.close_connections()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def transact(self, request_bytes):
+        """Handles serialized request, returns serialized response."""
+        request = pb2.Request()
+        response = pb2.Response()
+        try:
+            request.ParseFromString(bytes(request_bytes))
+            if self._realtime:
+                self._sleep(self._transfer_ms(len(request_bytes)) / 1000.0)
+            frame = None
+            with self._lock:
+                self._requests += 1
+                if self._realtime and request.WhichOneof('request') == 'camera_inference':
+                    frame = self._next_frame()
+                else:
+                    self._handle(request, response)
+            if frame is not None:
+                index, due = frame
+                # Wait for the camera frame without blocking other requests.
+                self._sleep(due - time.monotonic())
+                with self._lock:
+                    self._frame_result(response, index)
+            if response.HasField('inference_result') and self._realtime:
+                self._sleep(response.inference_result.duration_ms / 1000.0)
+        except Exception as e:
+            response.Clear()
+            response.status.code = pb2.Response.Status.ERROR
+            response.status.message = str(e)
+        return response.SerializeToString()
+
+    @staticmethod
+    def _sleep(seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _transfer_ms(self, size):
+        # Latency profile of the busiest loaded model is used for transfers.
+        rates = [self._simulated_model(name).latency.transfer_ms_per_mb
+                 for name in self._loaded_models] or [0.0]
+        return max(rates) * size / 1024 / 1024
+
+    def _simulated_model(self, model_name):
+        return self._models.get(model_name, self._default_model)
+
+    def _handle(self, request, response):
+        which = request.WhichOneof('request')
+        if which is None:
+            raise ValueError('Empty request.')
+        getattr(self, '_' + which)(getattr(request, which), response)
+
+    def _check_loaded(self, model_name):
+        if model_name not in self._loaded_models:
+            raise ValueError('Model "%s" is not loaded.' % model_name)
+
+    def _inference(self, result, model_name, width, height, sparse_configs):
+        model = self._simulated_model(model_name)
+        latency = model.latency
+        generator = model.generator or _uniform
+
+        result.model_name = model_name
+        result.width = result.window.width = width
+        result.height = result.window.height = height
+        result.duration_ms = max(0, int(round(latency.inference_ms +
+            self._random.uniform(-latency.jitter_ms, latency.jitter_ms))))
+
+        data = {name: generator(name, shape, self._random)
+                for name, shape in model.tensors.items()}
+        indices = {}
+        # Thresholding first, from_sparse_tensor configs refer to its indices.
+        for name, config in sorted(sparse_configs.items(),
+                                   key=lambda item: item[1].HasField('from_sparse_tensor')):
+            if name not in data:
+                raise ValueError('Unknown tensor "%s".' % name)
+            if config.HasField('thresholding'):
+                indices[name], data[name] = _threshold(data[name], config)
+            else:
+                source = config.from_sparse_tensor.tensor_name
+                if source not in indices:
+                    raise ValueError('Tensor "%s" is not sparse.' % source)
+                indices[name], data[name] = _from_sparse_tensor(
+                    data[name], config, indices[source])
+
+        for name, shape in model.tensors.items():
+            tensor = result.tensors[name]
+            tensor.shape.batch, tensor.shape.height, tensor.shape.width, tensor.shape.depth = shape
+            tensor.data.extend(data[name])
+            for index in indices.get(name, ()):
+                tensor.indices.add().values.extend(index)
+
+    def _load_model(self, request, response):
+        if request.model_name in self._loaded_models:
+            raise ValueError('Model "%s" is already loaded.' % request.model_name)
+        self._loaded_models[request.model_name] = len(request.compute_graph)
+        self._model_loads += 1
+
+    def _unload_model(self, request, response):
+        self._check_loaded(request.model_name)
+        if self._camera_model == request.model_name:
+            self._camera_model = None
+        del self._loaded_models[request.model_name]
+
+    def _start_camera_inference(self, request, response):
+        self._check_loaded(request.model_name)
+        if self._camera_model is not None:
+            raise ValueError('Camera inference is already running.')
+        self._camera_model = request.model_name
+        self._camera_request = request
+        self._camera_start = time.monotonic()
+        self._frame_index = itertools.count()
+
+    def _stop_camera_inference(self, request, response):
+        self._camera_model = None
+        self._camera_request = None
+
+    def _check_camera(self):
+        if self._camera_model is None:
+            raise ValueError('Camera inference is not running.')
+
+    def _next_frame(self):
+        """Returns (index, capture time) of the next camera frame."""
+        self._check_camera()
+        index = next(self._frame_index)
+        return index, self._camera_start + index * self._frame_period
+
+    def _camera_inference(self, request, response):
+        index, _ = self._next_frame()
+        self._frame_result(response, index)
+
+    def _frame_result(self, response, index):
+        self._check_camera()  # Could be stopped while waiting for the frame.
+        result = response.inference_result
+        self._inference(result, self._camera_model, *self._camera_size,
+                        sparse_configs=self._camera_request.sparse_configs)
+        result.frame.index = index
+        result.frame.timestamp_us = int(1000000 * (time.monotonic() - self._start_time))
+
+    def _image_inference(self, request, response):
+        self._check_loaded(request.model_name)
+        self._inference(response.inference_result, request.model_name,
+                        *_image_size(request.tensor), sparse_configs=request.sparse_configs)
+
+    def _get_camera_state(self, request, response):
+        response.camera_state.running = self._camera_model is not None
+        if response.camera_state.running:
+            response.camera_state.width, response.camera_state.height = self._camera_size
+
+    def _get_firmware_info(self, request, response):
+        response.firmware_info.major_version, response.firmware_info.minor_version = \
+            _FIRMWARE_VERSION
+
+    def _get_system_info(self, request, response):
+        response.system_info.uptime_seconds = int(time.monotonic() - self._start_time)
+        response.system_info.temperature_celsius = 40.0
+
+    def _get_inference_state(self, request, response):
+        response.inference_state.loaded_models.extend(self._loaded_models)
+        if self._camera_model:
+            response.inference_state.processing_models.append(self._camera_model)
+
+    def _reset(self, request, response):
+        self._loaded_models.clear()
+        self._camera_model = None
+        self._camera_request = None
+
+
+@contextlib.contextmanager
+def simulated_bonnet(**kwargs):
+    """Runs BonnetSimulator and points VISION_BONNET_HOST/PORT to it.
+
+    Args:
+      **kwargs: BonnetSimulator arguments.
+    """
+    keys = ('VISION_BONNET_HOST', 'VISION_BONNET_PORT')
+    with BonnetSimulator(**kwargs) as simulator:
+        old = {key: os.environ.get(key) for key in keys}
+        host, port = simulator.address
+        os.environ.update(zip(keys, (host, str(port))))
+        try:
+            yield simulator
+        finally:
+            for key, value in old.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VisionBonnet simulator.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=35000)
+    parser.add_argument('--realtime', action='store_true', default=False,
+        help='Wait for simulated inference latency and camera frames.')
+    parser.add_argument('--inference_ms', type=float, default=30.0,
+        help='Simulated inference duration.')
+    parser.add_argument('--frame_rate', type=float, default=30.0,
+        help='Simulated camera frame rate.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = BonnetSimulator(args.host, args.port, realtime=args.realtime,
+        frame_rate=args.frame_rate,
+        default_model=DEFAULT_MODEL._replace(latency=LatencyProfile(args.inference_ms)))
+    logger.info('Listening on %s:%d', *simulator.address)
+    try:
+        simulator._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.close()
+
+
+if __name__ == '__main__':
+    main()
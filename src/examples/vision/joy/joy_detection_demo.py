@@ -14,7 +14,6 @@
 # limitations under the License.
 """Joy detection demo."""
 import argparse
-import collections
 import contextlib
 import io
 import logging
@@ -34,6 +33,7 @@ from aiy.leds import Color, Leds, Pattern, PrivacyLed
 from aiy.toneplayer import TonePlayer
 from aiy.vision.inference import CameraInference
 from aiy.vision.models import face_detection
+from aiy.vision.operators import Hysteresis, WindowAverage
 from aiy.vision.streaming.server import StreamingServer
 from aiy.vision.streaming import svg
 
@@ -73,30 +73,6 @@ def run_inference(num_frames, on_loaded):
             yield face_detection.get_faces(result), (result.width, result.height)
 
 
-def threshold_detector(low_threshold, high_threshold):
-    """Yields 'low', 'high', and None events."""
-    assert low_threshold < high_threshold
-
-    event = None
-    prev_score = 0.0
-    while True:
-        score = (yield event)
-        if score > high_threshold > prev_score:
-            event = 'high'
-        elif score < low_threshold < prev_score:
-            event = 'low'
-        else:
-            event = None
-        prev_score = score
-
-
-def moving_average(size):
-    window = collections.deque(maxlen=size)
-    window.append((yield 0.0))
-    while True:
-        window.append((yield sum(window) / len(window)))
-
-
 def average_joy_score(faces):
     if faces:
         return sum(face.joy_score for face in faces) / len(faces)
@@ -313,15 +289,13 @@ def joy_detector(num_frames, preview_alpha, image_format, image_folder,
 
         board.button.when_pressed = take_photo
 
-        joy_moving_average = moving_average(10)
-        joy_moving_average.send(None)  # Initialize.
-        joy_threshold_detector = threshold_detector(JOY_SCORE_LOW, JOY_SCORE_HIGH)
-        joy_threshold_detector.send(None)  # Initialize.
+        joy_moving_average = WindowAverage(10)
+        joy_threshold_detector = Hysteresis(JOY_SCORE_LOW, JOY_SCORE_HIGH)
         for faces, frame_size in run_inference(num_frames, model_loaded):
             photographer.update_faces((faces, frame_size))
-            joy_score = joy_moving_average.send(average_joy_score(faces))
+            joy_score = joy_moving_average.update(average_joy_score(faces))
             animator.update_joy_score(joy_score)
-            event = joy_threshold_detector.send(joy_score)
+            event = joy_threshold_detector.update(joy_score)
             if event == 'high':
                 logger.info('High joy detected.')
                 player.play(JOY_SOUND)
@@ -19,12 +19,13 @@ import argparse
 from picamera import PiCamera, Color
 
 from aiy.vision import inference
+from aiy.vision.models import decoders
 from aiy.vision.models import utils
 
 
 def read_labels(label_path):
     with open(label_path) as label_file:
-        return [label.strip() for label in label_file.readlines()]
+        return tuple(label.strip() for label in label_file.readlines())
 
 
 def get_message(result, threshold, top_k):
@@ -34,17 +35,14 @@ def get_message(result, threshold, top_k):
     return 'Nothing detected when threshold=%.2f, top_k=%d' % (threshold, top_k)
 
 
-def process(result, labels, tensor_name, threshold, top_k):
+def process(result, model, threshold, top_k):
     """Processes inference result and returns labels sorted by confidence."""
     # MobileNet based classification model returns one result vector.
     assert len(result.tensors) == 1
-    tensor = result.tensors[tensor_name]
-    probs, shape = tensor.data, tensor.shape
-    assert shape.depth == len(labels)
-    pairs = [pair for pair in enumerate(probs) if pair[1] > threshold]
-    pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
-    pairs = pairs[0:top_k]
-    return [' %s (%.2f)' % (labels[index], prob) for index, prob in pairs]
+    spec = model.output_spec
+    assert result.tensors[spec.tensor_name].shape.depth == len(spec.labels)
+    pairs = decoders.decode(result, model, top_k=top_k, threshold=threshold)
+    return [' %s (%.2f)' % pair for pair in pairs]
 
 
 def main():
@@ -75,8 +73,9 @@ def main():
         name='mobilenet_based_classifier',
         input_shape=(1, args.input_height, args.input_width, args.input_depth),
         input_normalizer=(args.input_mean, args.input_std),
-        compute_graph=utils.load_compute_graph(args.model_path))
-    labels = read_labels(args.label_path)
+        compute_graph=utils.load_compute_graph(args.model_path),
+        output_spec=decoders.ClassificationSpec(args.output_layer,
+                                                read_labels(args.label_path)))
 
     with PiCamera(sensor_mode=4, resolution=(1640, 1232), framerate=30) as camera:
         if args.preview:
@@ -84,8 +83,7 @@ def main():
 
         with inference.CameraInference(model) as camera_inference:
             for result in camera_inference.run(args.num_frames):
-                processed_result = process(result, labels, args.output_layer,
-                                           args.threshold, args.top_k)
+                processed_result = process(result, model, args.threshold, args.top_k)
                 message = get_message(processed_result, args.threshold, args.top_k)
                 if args.show_fps:
                     message += '\nWith %.1f FPS.' % camera_inference.rate
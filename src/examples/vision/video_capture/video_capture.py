@@ -48,7 +48,7 @@ import sys
 import time
 from PIL import Image
 
-from aiy.vision.inference import ImageInference
+from aiy.vision.cascade import Cascade
 from aiy.vision.models import image_classification
 
 
@@ -95,7 +95,7 @@ def debug_output(image, debug_data, out_dir, filename=None):
         pickle.dump(debug_data, f, protocol=0)
 
 
-def detect_object(inference, camera, classes, threshold, out_dir, range_x=[0, 1], range_y=[0, 1]):
+def detect_object(cascade, camera, classes, threshold, out_dir, range_x=[0, 1], range_y=[0, 1]):
     """Detects objects belonging to given classes in camera stream."""
     stream = io.BytesIO()
     camera.capture(stream, format='jpeg')
@@ -111,25 +111,28 @@ def detect_object(inference, camera, classes, threshold, out_dir, range_x=[0, 1]
         return False, None, None
 
     debug_data = []
-    detection = False
-    max_accumulator = 0.
-    print('Inferring...')
-    for p in crop_parameters(image, range_x, range_y):
-        im_crop = image.crop(p)
+    accumulators = []
+
+    def accumulate(region):
+        x, y, width, height = region.box
         accumulator = 0.
         infer_classes = image_classification.get_classes(
-            inference.run(im_crop), top_k=5, threshold=0.05)
-        corner = [p[0], p[1]]
-        print(corner)
+            region.result, top_k=5, threshold=0.05)
+        print([x, y])
         for idx, (label, score) in enumerate(infer_classes):
-            debug_data.append((corner, im_crop.size, idx, label, score))
+            debug_data.append(([x, y], (width, height), idx, label, score))
             if label in classes:
                 accumulator += score
-        if accumulator > max_accumulator:
-            max_accumulator = accumulator
-        if accumulator >= threshold:
-            detection = True
-            break
+        accumulators.append(accumulator)
+        return accumulator >= threshold
+
+    print('Inferring...')
+    # Crops are classified in pipelined batches, stops at the first detection.
+    boxes = [(x1, y1, x2 - x1, y2 - y1)
+             for x1, y1, x2, y2 in crop_parameters(image, range_x, range_y)]
+    cascade.run(image, boxes, stop=accumulate)
+    max_accumulator = max(accumulators, default=0.)
+    detection = max_accumulator >= threshold
     if out_dir:
         debug_output(image, debug_data, out_dir)
     print('Accumulator: %f' % (max_accumulator))
@@ -209,13 +212,13 @@ def main():
 
     debug_out = args.out_dir if args.debug else ''
 
-    with ImageInference(image_classification.model(model_type)) as inference:
+    with Cascade(image_classification.model(model_type)) as cascade:
         with picamera.PiCamera(resolution=(1920, 1080)) as camera:
             stream = picamera.PiCameraCircularIO(camera, seconds=args.capture_length)
             camera.start_recording(stream, format='h264')
             while True:
                 detection, image, inference_data = detect_object(
-                    inference, camera, classes, args.threshold, debug_out,
+                    cascade, camera, classes, args.threshold, debug_out,
                     (args.cropbox_left, args.cropbox_right),
                     (args.cropbox_top, args.cropbox_bottom))
                 if detection:
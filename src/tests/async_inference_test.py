@@ -0,0 +1,180 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""AsyncInferenceEngine tests against BonnetSimulator, no VisionBonnet required."""
+import asyncio
+import unittest
+
+from PIL import Image
+
+from aiy.vision import inference as sync_inference
+from aiy.vision.async_inference import AsyncCameraInference, AsyncInferenceEngine
+from aiy.vision.inference import CameraInference, ModelDescriptor, RetryPolicy
+from aiy.vision.simulator import DEFAULT_MODEL, LatencyProfile, SimulatedModel, simulated_bonnet
+
+DESCRIPTOR = ModelDescriptor(name='model', input_shape=(1, 160, 120, 3),
+                             input_normalizer=(128.0, 128.0), compute_graph=b'graph')
+
+SLOW_MODEL = SimulatedModel(tensors={'output': (1, 1, 1, 10)},
+                            latency=LatencyProfile(inference_ms=300))
+
+
+class AsyncInferenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        sync_inference.set_model_cache_size(0)
+        sync_inference._model_registry.clear()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_load_and_image_inference(self):
+        async def run():
+            async with AsyncInferenceEngine() as engine:
+                model_name = await engine.load_model(DESCRIPTOR)
+                state = await engine.get_inference_state()
+                self.assertEqual(['model'], list(state.loaded_models))
+                result = await engine.image_inference(model_name, Image.new('RGB', (64, 48)))
+                self.assertEqual((64, 48), (result.width, result.height))
+                await engine.unload_model(model_name)
+                state = await engine.get_inference_state()
+                self.assertFalse(state.loaded_models)
+
+        with simulated_bonnet():
+            self.run_async(run())
+
+    def test_camera_inference(self):
+        async def run():
+            async with AsyncCameraInference(DESCRIPTOR) as inference:
+                indices = []
+                async for result in inference.run(5):
+                    indices.append(result.frame.index)
+                self.assertEqual(5, inference.count)
+                self.assertEqual(sorted(indices), indices)
+                state = await inference.engine.get_inference_state()
+                self.assertEqual(['model'], list(state.processing_models))
+            # Model loaded by AsyncCameraInference is unloaded on exit.
+            async with AsyncInferenceEngine() as engine:
+                state = await engine.get_inference_state()
+                self.assertFalse(state.loaded_models)
+                self.assertFalse(state.processing_models)
+
+        with simulated_bonnet() as simulator:
+            self.run_async(run())
+        self.assertEqual(1, simulator.model_loads)
+
+    def test_model_registry(self):
+        async def run(simulator):
+            async with AsyncCameraInference(DESCRIPTOR):
+                pass
+            # Kept loaded by the shared registry and reused by CameraInference.
+            with CameraInference(DESCRIPTOR):
+                pass
+            self.assertEqual(1, simulator.model_loads)
+            # Changed compute graph with the same name is reloaded.
+            async with AsyncCameraInference(DESCRIPTOR._replace(compute_graph=b'v2')):
+                self.assertEqual(2, simulator.model_loads)
+
+        with simulated_bonnet() as simulator:
+            sync_inference.set_model_cache_size(1)
+            self.run_async(run(simulator))
+
+    def test_concurrent(self):
+        async def run():
+            async with AsyncInferenceEngine() as engine:
+                infos = await asyncio.gather(*[engine.get_system_info() for _ in range(50)])
+                self.assertEqual(50, len(infos))
+
+        with simulated_bonnet():
+            self.run_async(run())
+
+    def test_timeout(self):
+        async def run():
+            async with AsyncInferenceEngine(retry_policy=RetryPolicy(attempts=1,
+                                                                     recover=False)) as engine:
+                await engine.load_model(DESCRIPTOR)
+                with self.assertRaises(asyncio.TimeoutError):
+                    await engine.image_inference('model', Image.new('RGB', (8, 8)), timeout=0.05)
+                # Late response is discarded, next request gets its own response.
+                info = await engine.get_system_info(timeout=5.0)
+                self.assertTrue(info.uptime_seconds >= 0)
+
+        with simulated_bonnet(default_model=SLOW_MODEL, realtime=True):
+            self.run_async(run())
+
+    def test_retry(self):
+        async def run(simulator):
+            async with AsyncInferenceEngine() as engine:
+                await engine.load_model(DESCRIPTOR)
+                await engine.start_camera_inference('model')
+                # The first attempt times out, the retry is sent when the model is fast.
+                self.loop.call_later(0.1, simulator.set_model, 'model', DEFAULT_MODEL)
+                result = await engine.camera_inference(timeout=0.25)
+                self.assertEqual('model', result.model_name)
+                self.assertEqual(0, engine.recovery_stats.count)
+
+        with simulated_bonnet(default_model=SLOW_MODEL, realtime=True) as simulator:
+            self.run_async(run(simulator))
+
+    def test_recover(self):
+        async def run():
+            policy = RetryPolicy(attempts=2, backoff=0.0)
+            async with AsyncInferenceEngine(retry_policy=policy) as engine:
+                await engine.load_model(DESCRIPTOR)
+                await engine.start_camera_inference('model')
+                with self.assertRaises(asyncio.TimeoutError):
+                    await engine.camera_inference(timeout=0.1)
+                self.assertEqual(1, engine.recovery_stats.count)
+                state = await engine.get_inference_state(timeout=5.0)
+                self.assertEqual(['model'], list(state.processing_models))
+
+        with simulated_bonnet(default_model=SLOW_MODEL, realtime=True):
+            self.run_async(run())
+
+    def test_timing(self):
+        async def run():
+            async with AsyncCameraInference(DESCRIPTOR) as inference:
+                self.assertIsNone(inference.timing)
+                async for _ in inference.run(3):
+                    timing = inference.timing
+                    self.assertLess(timing.requested, timing.received)
+                    # Response is parsed after it was received.
+                    self.assertLess(timing.received, timing.consumed)
+
+        with simulated_bonnet():
+            self.run_async(run())
+
+    def test_cancel(self):
+        async def run():
+            async with AsyncInferenceEngine() as engine:
+                await engine.load_model(DESCRIPTOR)
+                task = self.loop.create_task(
+                    engine.image_inference('model', Image.new('RGB', (8, 8))))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                result = await engine.image_inference('model', Image.new('RGB', (16, 8)))
+                self.assertEqual((16, 8), (result.width, result.height))
+
+        with simulated_bonnet(default_model=SLOW_MODEL, realtime=True):
+            self.run_async(run())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""AsyncSpicomm tests and benchmark against a fake device, Linux only.
+
+The fake ioctl echoes the request as the response. It is installed before
+AsyncSpicomm forks its worker process, so the worker uses it as well.
+"""
+import os
+import struct
+import sys
+import time
+import unittest
+
+from unittest import mock
+
+from aiy.vision import _spicomm
+from aiy.vision._spicomm import (AsyncSpicomm, FLAG_ERROR, FLAG_TIMEOUT, HEADER_SIZE,
+                                 SPICOMM_IOCTL_TRANSACT, SpicommTimeoutError)
+
+TIMEOUT_REQUEST = b'timeout'
+
+
+def fake_ioctl(dev, request, buf, *args):
+    if request != SPICOMM_IOCTL_TRANSACT:
+        return 0
+    _, timeout_ms, buffer_size, payload_size = struct.unpack_from('IIII', buf)
+    if bytes(buf[HEADER_SIZE:HEADER_SIZE + payload_size]) == TIMEOUT_REQUEST:
+        flags = FLAG_ERROR | FLAG_TIMEOUT
+    else:
+        flags = 0
+    struct.pack_into('IIII', buf, 0, flags, timeout_ms, buffer_size, payload_size)
+    return 0
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+class AsyncSpicommTestBase(unittest.TestCase):
+
+    def setUp(self):
+        patches = [mock.patch.object(_spicomm, 'SPICOMM_DEV', os.devnull),
+                   mock.patch.object(_spicomm.fcntl, 'ioctl', fake_ioctl)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+
+class AsyncSpicommTest(AsyncSpicommTestBase):
+
+    def test_transact(self):
+        with AsyncSpicomm(default_payload_size=1024) as spicomm:
+            for size in (1, 100, 1024):
+                request = os.urandom(size)
+                self.assertEqual(request, spicomm.transact(request))
+
+    def test_lease_is_view_into_ring(self):
+        with AsyncSpicomm(default_payload_size=1024, num_buffers=2) as spicomm:
+            lease1 = spicomm.transact_lease(b'first')
+            lease2 = spicomm.transact_lease(b'second')
+            self.assertEqual(b'first', lease1.data.tobytes())
+            self.assertEqual(b'second', lease2.data.tobytes())
+            self.assertFalse(spicomm._free)
+
+            # All slots are leased, data goes through the pipe.
+            with spicomm.transact_lease(b'third') as data:
+                self.assertEqual(b'third', data.tobytes())
+
+            lease1.release()
+            lease2.release()
+            self.assertEqual(2, len(spicomm._free))
+
+    def test_large_request(self):
+        with AsyncSpicomm(default_payload_size=1024) as spicomm:
+            request = os.urandom(4096)
+            self.assertEqual(request, spicomm.transact(request))
+            self.assertEqual(1, len(spicomm._free))
+
+    def test_error(self):
+        with AsyncSpicomm(default_payload_size=1024) as spicomm:
+            with self.assertRaises(SpicommTimeoutError):
+                spicomm.transact(TIMEOUT_REQUEST, timeout=2.0)
+            # Slot is returned after error.
+            self.assertEqual(1, len(spicomm._free))
+            self.assertEqual(b'ok', spicomm.transact(b'ok'))
+
+    def test_stats(self):
+        with AsyncSpicomm(default_payload_size=1024) as spicomm:
+            spicomm.transact(b'ok')
+            spicomm.transact(os.urandom(4096))
+            stats = spicomm.stats()
+            self.assertEqual(2, stats.transactions)
+            self.assertEqual(0, stats.overflows)
+            self.assertEqual(len(spicomm._ring), stats.resident_bytes)
+            self.assertEqual({2: 1, 4096: 1}, stats.response_sizes.buckets())
+
+    def test_send_receive(self):
+        with AsyncSpicomm(default_payload_size=1024) as spicomm:
+            spicomm.send_request(b'request')
+            self.assertEqual(b'request', spicomm.receive_response())
+
+
+class AsyncSpicommBenchmark(AsyncSpicommTestBase):
+    FRAME_SIZE = 1024 * 1024
+    NUM_FRAMES = 200
+
+    def run_frames(self, spicomm):
+        frame = os.urandom(self.FRAME_SIZE)
+        start = time.monotonic()
+        for _ in range(self.NUM_FRAMES):
+            with spicomm.transact_lease(frame) as data:
+                self.assertEqual(self.FRAME_SIZE, len(data))
+        return self.NUM_FRAMES / (time.monotonic() - start)
+
+    def test_throughput(self):
+        with AsyncSpicomm(default_payload_size=self.FRAME_SIZE) as spicomm:
+            ring = self.run_frames(spicomm)
+        # Frames larger than the slots go through the pipe.
+        with AsyncSpicomm(default_payload_size=1024) as spicomm:
+            pipe = self.run_frames(spicomm)
+
+        print('\n%d KB frames, shared ring: %.0f frames/s, pipe: %.0f frames/s' %
+              (self.FRAME_SIZE // 1024, ring, pipe))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""CameraInference prefetching tests against BonnetSimulator, no VisionBonnet required."""
+import threading
+import time
+import unittest
+
+from aiy.vision.inference import CameraInference, InferenceEngine, InferenceException, \
+    ModelDescriptor
+from aiy.vision.simulator import simulated_bonnet
+
+DESCRIPTOR = ModelDescriptor(name='test_model', input_shape=(1, 160, 160, 3),
+                             input_normalizer=(128.0, 128.0), compute_graph=b'graph')
+
+
+class CameraPrefetchTest(unittest.TestCase):
+
+    def test_ordering(self):
+        for prefetch in (0, 1, 3):
+            with simulated_bonnet(), CameraInference(DESCRIPTOR) as inference:
+                indices = [result.frame.index
+                           for result in inference.run(20, prefetch=prefetch)]
+                self.assertEqual(list(range(20)), indices)
+                self.assertEqual(20, inference.count)
+                self.assertEqual(0, inference.dropped)
+
+    def test_drop_oldest(self):
+        with simulated_bonnet(), CameraInference(DESCRIPTOR) as inference:
+            indices = []
+            for result in inference.run(10, prefetch=1, drop_oldest=True):
+                indices.append(result.frame.index)
+                time.sleep(0.02)  # Slow consumer.
+            self.assertEqual(sorted(set(indices)), indices)
+            # Every frame skipped between returned ones was dropped.
+            self.assertGreater(inference.dropped, 0)
+            self.assertGreaterEqual(inference.dropped, indices[-1] - indices[0] + 1 - len(indices))
+
+    def test_worker_error(self):
+        with simulated_bonnet(), CameraInference(DESCRIPTOR) as inference:
+            results = inference.run(prefetch=2)
+            next(results)
+            with InferenceEngine() as other:
+                other.stop_camera_inference()  # Following requests fail.
+            with self.assertRaises(InferenceException):
+                for _ in results:
+                    pass
+            self.assertIsNone(inference._prefetcher)
+
+    def test_close_early(self):
+        threads = threading.active_count()
+        with simulated_bonnet(), CameraInference(DESCRIPTOR) as inference:
+            results = inference.run(prefetch=2)
+            next(results)
+            prefetcher = inference._prefetcher
+            results.close()
+            self.assertFalse(prefetcher._thread.is_alive())
+            self.assertIsNone(inference._prefetcher)
+            # Engine is usable again, also for a new prefetching run.
+            self.assertIsNotNone(inference.engine.camera_inference())
+            self.assertEqual(2, len(list(inference.run(2, prefetch=2))))
+
+            results = inference.run(prefetch=2)
+            next(results)
+        # Closing CameraInference stops the running prefetcher.
+        self.assertIsNone(inference._prefetcher)
+        results.close()
+        self.assertEqual(threads, threading.active_count())
+
+    def test_timing(self):
+        with simulated_bonnet(), CameraInference(DESCRIPTOR) as inference:
+            self.assertIsNone(inference.timing)
+            for prefetch in (0, 2):
+                for _ in inference.run(3, prefetch=prefetch):
+                    timing = inference.timing
+                    self.assertLessEqual(timing.requested, timing.received)
+                    self.assertLessEqual(timing.received, timing.consumed)
+                    self.assertEqual(timing.consumed - timing.requested, timing.latency)
+                    time.sleep(0.01)
+                if prefetch:
+                    # Next result was requested while the caller was busy.
+                    self.assertGreaterEqual(timing.latency, 0.01)
+
+if __name__ == '__main__':
+    unittest.main()
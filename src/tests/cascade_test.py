@@ -0,0 +1,59 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Cascade tests against BonnetSimulator, no VisionBonnet required."""
+import unittest
+
+from PIL import Image
+
+from aiy.vision.cascade import Cascade
+from aiy.vision.inference import ModelDescriptor
+from aiy.vision.models.detections import Detections
+from aiy.vision.simulator import simulated_bonnet
+
+DESCRIPTOR = ModelDescriptor(name='classifier', input_shape=(1, 160, 120, 3),
+                             input_normalizer=(128.0, 128.0), compute_graph=b'graph')
+
+IMAGE = Image.new('RGB', (640, 480))
+
+
+class CascadeTest(unittest.TestCase):
+
+    def test_regions(self):
+        detections = Detections([0, 0, 100, 100, 600, 400, 100, 100, 700, 0, 10, 10],
+                                [0.9, 0.8, 0.7])
+        with simulated_bonnet(), Cascade(DESCRIPTOR) as cascade:
+            regions = cascade.run(IMAGE, detections)
+        # Last box is outside of the image.
+        self.assertEqual([(0, 0, 100, 100), (600, 400, 100, 100)],
+                         [region.box for region in regions])
+        # Regions are resized to model input size.
+        for region in regions:
+            self.assertEqual((120, 160), (region.result.width, region.result.height))
+
+    def test_no_resize(self):
+        with simulated_bonnet(), Cascade(DESCRIPTOR, resize=False) as cascade:
+            region, = cascade.run(IMAGE, [(600, 400, 100, 100)])
+        # Clipped to image bounds.
+        self.assertEqual((40, 80), (region.result.width, region.result.height))
+
+    def test_stop(self):
+        boxes = [(10 * i, 0, 50, 50) for i in range(20)]
+        with simulated_bonnet(), Cascade(DESCRIPTOR) as cascade:
+            regions = cascade.run(IMAGE, boxes, stop=lambda region: region.box[0] == 30)
+            self.assertEqual(boxes[:4], [region.box for region in regions])
+            # Engine is still usable after the pipeline was stopped early.
+            self.assertEqual(20, len(cascade.run(IMAGE, boxes)))
+
+if __name__ == '__main__':
+    unittest.main()
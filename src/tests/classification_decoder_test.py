@@ -0,0 +1,64 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Classification decoder tests, no VisionBonnet required."""
+import random
+import unittest
+
+from aiy.vision.models import utils
+
+LABELS = tuple(('label%d' % i, 'synonym%d' % i) for i in range(1001))
+
+
+def reference_classes(probs, top_k, threshold):
+    """Original implementation from image_classification."""
+    pairs = [pair for pair in enumerate(probs) if pair[1] > threshold]
+    pairs = sorted(pairs, key=lambda pair: pair[1], reverse=True)
+    pairs = pairs[0:top_k]
+    return [('/'.join(LABELS[index]), prob) for index, prob in pairs]
+
+
+class ClassificationDecoderTestMixin:
+
+    def test_same_as_reference(self):
+        decoder = utils.ClassificationDecoder(LABELS)
+        rand = random.Random(0)
+        for _ in range(10):
+            # Few distinct values to get many ties.
+            probs = [rand.choice((0.0, 0.125, 0.25, rand.random())) for _ in LABELS]
+            for top_k in (None, 0, 1, 5, 1001, 2000):
+                for threshold in (0.0, 0.1, 0.2, 0.9):
+                    self.assertEqual(reference_classes(probs, top_k, threshold),
+                                     decoder.get_classes(probs, top_k, threshold))
+
+    def test_sparse(self):
+        decoder = utils.ClassificationDecoder(['a', 'b', 'c'])
+        self.assertEqual([('c', 0.5), ('a', 0.25)],
+                         decoder.get_classes_sparse([0, 2], [0.25, 0.5]))
+
+
+class PythonClassificationDecoderTest(ClassificationDecoderTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        utils.use_numpy(False)
+
+    def tearDown(self):
+        utils.use_numpy(True)
+
+
+@unittest.skipIf(utils.np is None, 'NumPy is not installed')
+class NumpyClassificationDecoderTest(ClassificationDecoderTestMixin, unittest.TestCase):
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
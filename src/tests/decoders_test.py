@@ -0,0 +1,175 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Generic model decoder tests against BonnetSimulator, no VisionBonnet required."""
+import collections
+import math
+import random
+import unittest
+
+from aiy.vision.inference import CameraInference, ModelDescriptor
+from aiy.vision.models import decoders
+from aiy.vision.models import utils
+from aiy.vision.simulator import SimulatedModel, simulated_bonnet
+
+NUM_ANCHORS = 200
+
+
+def make_anchors(seed):
+    rand = random.Random(seed)
+    anchors = []
+    for _ in range(NUM_ANCHORS):
+        y, x = rand.random(), rand.random()
+        anchors.append((y - 0.1, x - 0.1, y + 0.1, x + 0.1))
+    return tuple(anchors)
+
+
+SSD_SPEC = decoders.SsdSpec(score_tensor='scores', box_tensor='boxes', anchors=make_anchors(0),
+                            num_classes=3, box_scales=(8.0, 8.0, 4.0, 4.0))
+CLASSIFICATION_SPEC = decoders.ClassificationSpec('probs', ('a', 'b', 'c', 'd', 'e'))
+
+
+def ssd_generator(name, shape, rand):
+    if name == 'scores':
+        # Low background logits, so dense and sparse decoding find the same objects.
+        return [rand.gauss(-2.0, 2.0) if i % 3 else -10.0 for i in range(3 * NUM_ANCHORS)]
+    return [rand.gauss(0.0, 1.0) for _ in range(4 * NUM_ANCHORS)]
+
+
+SSD_MODEL = SimulatedModel(tensors={'scores': (1, NUM_ANCHORS, 1, 3),
+                                    'boxes': (1, NUM_ANCHORS, 1, 4)},
+                           generator=ssd_generator)
+CLASSIFICATION_MODEL = SimulatedModel(tensors={'probs': (1, 1, 1, 5)})
+
+
+def descriptor(name, spec):
+    return ModelDescriptor(name=name, input_shape=(1, 160, 160, 3),
+                           input_normalizer=(128.0, 128.0), compute_graph=b'graph',
+                           output_spec=spec)
+
+
+def results(model, desc, sparse_configs):
+    """Returns (dense, sparse) results of the same simulated frame."""
+    with simulated_bonnet(default_model=model):
+        with CameraInference(desc) as inference:
+            dense = next(inference.run(1))
+    with simulated_bonnet(default_model=model):
+        with CameraInference(desc, sparse_configs=sparse_configs) as inference:
+            sparse = next(inference.run(1))
+    return dense, sparse
+
+
+def as_tuples(objs):
+    return [(obj[0], obj[1], round(obj[2], 5)) for obj in objs]
+
+
+class SsdDecoderTest(unittest.TestCase):
+
+    def tearDown(self):
+        utils.use_numpy(True)
+
+    def test_dense_and_sparse(self):
+        desc = descriptor('ssd', SSD_SPEC)
+        dense, sparse = results(SSD_MODEL, desc, decoders.sparse_configs(desc, threshold=0.5))
+        self.assertTrue(sparse.tensors['scores'].indices)
+        for numpy_enabled in (False, True) if utils.np is not None else (False,):
+            utils.use_numpy(numpy_enabled)
+            expected = decoders.decode(dense, desc, threshold=0.5)
+            self.assertTrue(expected)
+            self.assertEqual(as_tuples(expected), as_tuples(decoders.decode(sparse, desc)))
+            for box, kind, score in expected:
+                self.assertIn(kind, (1, 2))
+                self.assertGreater(score, 0.5)
+
+    def test_anchor_geometry(self):
+        decoder = decoders.get_decoder(SSD_SPEC)
+        encoding = (0.5, -1.0, 0.2, -0.3)
+        for i, (ymin, xmin, ymax, xmax) in enumerate(SSD_SPEC.anchors):
+            ycenter = (ymin + ymax) / 2 + (ymax - ymin) * encoding[0] / 8.0
+            xcenter = (xmin + xmax) / 2 + (xmax - xmin) * encoding[1] / 8.0
+            height = math.exp(encoding[2] / 4.0) * (ymax - ymin)
+            width = math.exp(encoding[3] / 4.0) * (xmax - xmin)
+            expected = [min(max(0.0, value), 1.0) for value in
+                        (xcenter - width / 2, ycenter - height / 2,
+                         xcenter + width / 2, ycenter + height / 2)]
+            geometry = decoder._geometry().values[6 * i:6 * (i + 1)]
+            for e, a in zip(expected, decoder._decode_box_encoding(encoding, geometry)):
+                self.assertAlmostEqual(e, a, places=12)
+
+    @unittest.skipIf(utils.np is None, 'NumPy is not installed')
+    def test_numpy(self):
+        decoder = decoders.get_decoder(SSD_SPEC)
+        rand = random.Random(1)
+        logit_scores = ssd_generator('scores', None, rand)
+        box_encodings = ssd_generator('boxes', None, rand)
+        expected = decoder._decode_dense(logit_scores, box_encodings, 0.3, (640, 480), (5, 5))
+        actual = decoder._decode_dense_numpy(logit_scores, box_encodings, 0.3, (640, 480), (5, 5))
+        self.assertEqual(list(expected), list(actual))
+
+    def test_sparse_configs(self):
+        configs = decoders.sparse_configs(SSD_SPEC, threshold=0.5)
+        self.assertEqual([NUM_ANCHORS, 3], configs['scores'].logical_shape)
+        self.assertEqual('scores', configs['boxes'].tensor_name)
+        with self.assertRaises(ValueError):
+            decoders.sparse_configs(SSD_SPEC, threshold=2.0)
+
+    def test_make_item(self):
+        Item = collections.namedtuple('Item', ('kind', 'score'))
+        spec = SSD_SPEC._replace(make_item=lambda d, i: Item(d.kinds[i], d.scores[i]))
+        desc = descriptor('ssd', spec)
+        dense, _ = results(SSD_MODEL, desc, None)
+        for item in decoders.decode(dense, desc):
+            self.assertIsInstance(item, Item)
+
+
+class ClassificationDecoderTest(unittest.TestCase):
+
+    def test_dense_and_sparse(self):
+        desc = descriptor('classifier', CLASSIFICATION_SPEC)
+        dense, sparse = results(CLASSIFICATION_MODEL, desc,
+                                decoders.sparse_configs(desc, top_k=3, threshold=0.2))
+        expected = decoders.decode(dense, desc, top_k=3, threshold=0.2)
+        self.assertTrue(expected)
+        self.assertEqual(expected, decoders.decode(sparse, desc))
+        self.assertEqual(expected[:1], decoders.decode(sparse, desc, top_k=1))
+
+
+class RegistryTest(unittest.TestCase):
+
+    def test_memoized(self):
+        self.assertIs(decoders.get_decoder(SSD_SPEC),
+                      decoders.get_decoder(descriptor('ssd', SSD_SPEC)))
+
+    def test_no_spec(self):
+        with self.assertRaises(ValueError):
+            decoders.get_decoder(ModelDescriptor('model', (1, 1, 1, 3), (0, 0), b''))
+        with self.assertRaises(ValueError):
+            decoders.get_decoder(('unknown', 'spec'))
+
+    def test_register_decoder(self):
+        CountSpec = collections.namedtuple('CountSpec', ('tensor_name',))
+
+        class CountDecoder:
+            def __init__(self, spec):
+                self.spec = spec
+
+            def decode(self, result):
+                return len(result.tensors[self.spec.tensor_name].data)
+
+        decoders.register_decoder(CountSpec, CountDecoder)
+        desc = descriptor('counter', CountSpec('probs'))
+        dense, _ = results(CLASSIFICATION_MODEL, desc, None)
+        self.assertEqual(5, decoders.decode(dense, desc))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Detections container tests, no VisionBonnet required."""
+import unittest
+
+import aiy.vision.proto.protocol_pb2 as pb2
+
+from aiy.vision.models import face_detection
+from aiy.vision.models.detections import Detections
+
+
+def face_result():
+    result = pb2.InferenceResult()
+    result.tensors['bounding_boxes'].data.extend([812.0, 44.0, 1000.0, 1000.0,
+                                                  748.0, 1063.0, 496.0, 496.0])
+    result.tensors['face_scores'].data.extend([1.0, 0.875])
+    result.tensors['joy_scores'].data.extend([0.5, 0.25])
+    return result
+
+
+class DetectionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.detections = Detections([0, 0, 10, 10, 5, 5, 20, 30, 1, 2, 3, 4],
+                                     [0.5, 0.75, 0.25], [1, 2, 1], box_typecode='i')
+
+    def test_sequence(self):
+        self.assertEqual(3, len(self.detections))
+        self.assertEqual(((5, 5, 20, 30), 2, 0.75), self.detections[1])
+        self.assertEqual(((1, 2, 3, 4), 1, 0.25), self.detections[-1])
+        self.assertEqual([0.5, 0.75, 0.25], [score for _, _, score in self.detections])
+        with self.assertRaises(IndexError):
+            self.detections[3]
+
+    def test_slice(self):
+        detections = self.detections[1:]
+        self.assertEqual(2, len(detections))
+        self.assertEqual([(5, 5, 20, 30), (1, 2, 3, 4)], detections.bounding_boxes())
+
+    def test_filter(self):
+        self.assertEqual([(0, 0, 10, 10), (5, 5, 20, 30)],
+                         self.detections.filter(min_score=0.5).bounding_boxes())
+        self.assertEqual([(0, 0, 10, 10), (1, 2, 3, 4)],
+                         self.detections.filter(kinds={1}).bounding_boxes())
+
+    def test_scale(self):
+        detections = self.detections.scale(0.5)
+        self.assertEqual([(0, 0, 5, 5), (2, 2, 10, 15), (0, 1, 1, 2)],
+                         detections.bounding_boxes())
+        self.assertEqual(self.detections.scores, detections.scores)
+
+        detections = self.detections.transform(2.0, 1.0, 100, 10)
+        self.assertEqual((110, 15, 40, 30), detections.bounding_box(1))
+
+    def test_faces(self):
+        faces = face_detection.get_faces(face_result())
+        self.assertEqual(2, len(faces))
+        face_score, joy_score, bounding_box = faces[1]
+        self.assertEqual(0.875, face_score)
+        self.assertEqual(0.25, joy_score)
+        self.assertEqual((748.0, 1063.0, 496.0, 496.0), bounding_box)
+
+        faces = faces.filter(min_score=0.9)
+        self.assertEqual(1, len(faces))
+        self.assertEqual(0.5, faces[0].joy_score)
+
+if __name__ == '__main__':
+    unittest.main()
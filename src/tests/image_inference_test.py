@@ -0,0 +1,109 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""ImageInference resize and upload tests against BonnetSimulator."""
+import io
+import unittest
+
+from PIL import Image
+
+from aiy.vision import inference
+from aiy.vision.inference import ImageInference, ImageTransform, ModelDescriptor
+from aiy.vision.models.detections import Detections
+from aiy.vision.simulator import simulated_bonnet
+
+DESCRIPTOR = ModelDescriptor(name='model', input_shape=(1, 256, 256, 3),
+                             input_normalizer=(128.0, 128.0), compute_graph=b'graph')
+
+
+def jpeg(image):
+    stream = io.BytesIO()
+    image.save(stream, format='jpeg')
+    return stream.getvalue()
+
+
+class ImageInferenceTest(unittest.TestCase):
+
+    def test_fit(self):
+        self.assertEqual((0, 0, 256, 256), inference._fit((640, 480), (256, 256), False))
+        self.assertEqual((0, 32, 256, 192), inference._fit((640, 480), (256, 256), True))
+        self.assertEqual((96, 0, 64, 256), inference._fit((100, 400), (256, 256), True))
+
+    def test_letterbox(self):
+        image = Image.new('RGB', (640, 480), color=(255, 255, 255))
+        with simulated_bonnet(), \
+             ImageInference(DESCRIPTOR, resize=True, letterbox=True, upload='raw') as model:
+            result = model.run(image)
+            self.assertEqual((256, 256), (result.width, result.height))
+            transform = model.transform
+            self.assertEqual((0.0, 0.0), transform.point(0, 32))
+            self.assertEqual((640.0, 480.0), transform.point(256, 224))
+            self.assertEqual((0.0, 0.0, 640.0, 480.0), transform.box((0, 32, 256, 192)))
+
+            detections = Detections([128, 128, 10, 10], [1.0]).transform(*transform)
+            self.assertEqual((320.0, 240.0, 25.0, 25.0), detections.bounding_box(0))
+
+    def test_letterbox_pixels(self):
+        packer = inference._TensorPacker()
+        images = [Image.new('L', (4, 2), color=255)]
+        if inference.np is not None:
+            images.append(inference.np.full((2, 4), 255, dtype=inference.np.uint8))
+        for image in images:
+            tensor = packer.pack(image, size=(4, 4), letterbox=True)
+            self.assertEqual(bytes(4) + b'\xff' * 8 + bytes(4), tensor.data)
+
+    def test_stretch(self):
+        with simulated_bonnet(), ImageInference(DESCRIPTOR, resize=True) as model:
+            result = model.run(Image.new('L', (512, 128)))
+            self.assertEqual((256, 256), (result.width, result.height))
+            self.assertEqual(ImageTransform(2.0, 0.5, 0.0, 0.0), model.transform)
+
+    def test_no_resize(self):
+        with simulated_bonnet(), ImageInference(DESCRIPTOR) as model:
+            result = model.run(Image.new('RGB', (64, 48)))
+            self.assertEqual((64, 48), (result.width, result.height))
+            self.assertEqual(ImageTransform.IDENTITY, model.transform)
+
+    def test_jpeg_upload(self):
+        small = jpeg(Image.new('RGB', (320, 240)))
+        with simulated_bonnet(), ImageInference(DESCRIPTOR, resize=True, upload='auto') as model:
+            # Smaller than raw 256x256 tensor, sent as is.
+            result = model.run(small)
+            self.assertEqual((320, 240), (result.width, result.height))
+            self.assertEqual(ImageTransform.IDENTITY, model.transform)
+
+        with simulated_bonnet(), \
+             ImageInference(DESCRIPTOR, resize=True, upload='raw') as model:
+            result = model.run(small)
+            self.assertEqual((256, 256), (result.width, result.height))
+            self.assertEqual(ImageTransform(1.25, 240 / 256, 0.0, 0.0), model.transform)
+
+    def test_default_upload(self):
+        large = jpeg(Image.new('RGB', (1640, 1232)))
+        with simulated_bonnet(), ImageInference(DESCRIPTOR, resize=True) as model:
+            # Images are sent in their input format, nothing is JPEG encoded.
+            self.assertFalse(model._encode_jpeg(Image.new('RGB', (1640, 1232)), (1640, 1232)))
+            self.assertTrue(model._send_jpeg(large))
+            result = model.run(large)
+            self.assertEqual((1640, 1232), (result.width, result.height))
+
+    def test_jpeg_encode(self):
+        with simulated_bonnet(), ImageInference(DESCRIPTOR, upload='auto') as model:
+            self.assertTrue(model._encode_jpeg(Image.new('RGB', (1640, 1232)), (1640, 1232)))
+            self.assertFalse(model._encode_jpeg(Image.new('RGB', (256, 256)), (256, 256)))
+            # Simulator decodes JPEG to get the image size.
+            result = model.run(Image.new('RGB', (1640, 1232)))
+            self.assertEqual((1640, 1232), (result.width, result.height))
+
+if __name__ == '__main__':
+    unittest.main()
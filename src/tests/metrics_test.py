@@ -0,0 +1,136 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Metrics tests, no VisionBonnet required."""
+import json
+import random
+import socket
+import time
+import unittest
+
+from aiy.vision import metrics
+from aiy.vision._spicomm import SpicommOverflowError
+from aiy.vision.inference import (CameraInference, InferenceEngine, ModelDescriptor,
+                                  RetryPolicy, _REQ_CAMERA_INFERENCE)
+from aiy.vision.simulator import LatencyProfile, SimulatedModel, simulated_bonnet
+
+DESCRIPTOR = ModelDescriptor(name='model', input_shape=(1, 160, 120, 3),
+                             input_normalizer=(128.0, 128.0), compute_graph=b'graph')
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_bucket_bounds(self):
+        for value in list(range(1000)) + [random.randrange(1 << 40) for _ in range(1000)]:
+            index = metrics._bucket_index(value)
+            self.assertLessEqual(value, metrics._bucket_upper(index))
+            if index:
+                self.assertGreater(value, metrics._bucket_upper(index - 1))
+
+    def test_percentile(self):
+        histogram = metrics.LatencyHistogram()
+        values = [i / 1000.0 for i in range(1, 1001)]  # 1ms - 1s.
+        random.Random(0).shuffle(values)
+        for value in values:
+            histogram.record(value)
+        self.assertEqual(1000, histogram.count)
+        self.assertEqual(0.001, histogram.min)
+        self.assertEqual(1.0, histogram.max)
+        for q in (0.5, 0.9, 0.99):
+            self.assertAlmostEqual(q, histogram.percentile(q), delta=q * 0.04)
+        self.assertEqual(1.0, histogram.percentile(1.0))
+        self.assertEqual(0.0, metrics.LatencyHistogram().percentile(0.5))
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_record(self):
+        m = metrics.Metrics()
+        m.record('camera_inference', 4, 100, transport=0.01, bonnet=0.008, parse=0.001)
+        m.record_error('camera_inference', 4, socket.timeout())
+        m.record_error('camera_inference', 4, SpicommOverflowError(100))
+        m.record_error('camera_inference', 4, ValueError())
+        snapshot = m.snapshot()['camera_inference']
+        self.assertEqual(4, snapshot['count'])
+        self.assertEqual(16, snapshot['request_bytes'])
+        self.assertEqual(100, snapshot['response_bytes'])
+        self.assertEqual({'error': 1, 'timeout': 1, 'overflow': 1}, snapshot['errors'])
+        self.assertEqual({'transport', 'bonnet', 'parse'}, set(snapshot['latency']))
+        self.assertEqual(json.loads(m.to_json()), m.snapshot())
+
+    def test_prometheus(self):
+        m = metrics.Metrics()
+        m.record('get_system_info', 4, 20, transport=0.5)
+        text = m.to_prometheus(prefix='test')
+        self.assertIn('test_requests_total{type="get_system_info"} 1\n', text)
+        self.assertIn('test_errors_total{type="get_system_info",kind="timeout"} 0\n', text)
+        self.assertIn('test_latency_seconds{type="get_system_info",phase="transport",'
+                      'quantile="0.5"} 0.5\n', text)
+        self.assertIn('test_latency_seconds_count{type="get_system_info",phase="transport"} 1\n',
+                      text)
+
+    def test_exporter(self):
+        m = metrics.Metrics()
+        snapshots = []
+        m.add_exporter(snapshots.append)
+        m.record('reset', 4, 2)
+        m.export()
+        m.remove_exporter(snapshots.append)
+        m.export()
+        self.assertEqual(1, len(snapshots))
+        self.assertEqual(1, snapshots[0]['reset']['count'])
+
+
+class EngineMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        metrics.get_metrics().reset()
+
+    def tearDown(self):
+        metrics.set_enabled(True)
+
+    def test_camera_inference(self):
+        model = SimulatedModel(tensors={'output': (1, 1, 1, 10)},
+                               latency=LatencyProfile(inference_ms=20))
+        with simulated_bonnet(default_model=model), CameraInference(DESCRIPTOR) as inference:
+            for _ in inference.run(5):
+                pass
+            snapshot = inference.engine.metrics.snapshot()
+        camera = snapshot['camera_inference']
+        self.assertEqual(5, camera['count'])
+        self.assertEqual(20.0 / 1000, camera['latency']['bonnet']['max'])
+        self.assertEqual(5, camera['latency']['transport']['count'])
+        self.assertEqual(1, snapshot['load_model']['count'])
+        self.assertIn('serialize', snapshot['load_model']['latency'])
+
+    def test_timeout(self):
+        model = SimulatedModel(tensors={'output': (1, 1, 1, 10)},
+                               latency=LatencyProfile(inference_ms=300))
+        with simulated_bonnet(default_model=model, realtime=True), \
+             InferenceEngine(RetryPolicy(attempts=1, recover=False)) as engine:
+            engine.load_model(DESCRIPTOR)
+            engine.start_camera_inference('model')
+            with self.assertRaises(socket.timeout):
+                engine._communicate_bytes(_REQ_CAMERA_INFERENCE, timeout=0.05)
+            time.sleep(0.3)
+        errors = metrics.get_metrics().snapshot()['camera_inference']['errors']
+        self.assertEqual(1, errors['timeout'])
+
+    def test_disabled(self):
+        metrics.set_enabled(False)
+        with simulated_bonnet(), InferenceEngine() as engine:
+            engine.get_system_info()
+        self.assertEqual({}, metrics.get_metrics().snapshot())
+
+if __name__ == '__main__':
+    unittest.main()
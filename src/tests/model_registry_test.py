@@ -0,0 +1,138 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Model registry tests against BonnetSimulator, no VisionBonnet required."""
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+from aiy.vision import inference
+from aiy.vision.inference import ImageInference, InferenceEngine, ModelDescriptor
+from aiy.vision.simulator import simulated_bonnet
+
+
+def descriptor(name, graph=b'graph'):
+    return ModelDescriptor(name=name, input_shape=(1, 160, 160, 3),
+                           input_normalizer=(128.0, 128.0), compute_graph=graph)
+
+
+def loaded_models():
+    with InferenceEngine() as engine:
+        return sorted(engine.get_inference_state().loaded_models)
+
+
+class ModelRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        inference._model_registry.clear()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patch = mock.patch.dict(os.environ, {'VISION_BONNET_CACHE_PATH': cache_dir.name})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        inference.set_model_cache_size(0)
+        inference._model_registry.clear()
+
+    def test_unload_on_close(self):
+        with simulated_bonnet() as simulator:
+            with ImageInference(descriptor('a')):
+                with ImageInference(descriptor('a')):
+                    self.assertEqual(['a'], loaded_models())
+                self.assertEqual(['a'], loaded_models())
+            self.assertEqual([], loaded_models())
+            self.assertEqual(1, simulator.model_loads)
+
+    def test_changed_graph(self):
+        with simulated_bonnet() as simulator:
+            inference.set_model_cache_size(2)
+            with ImageInference(descriptor('a', b'v1')):
+                pass
+            with ImageInference(descriptor('a', b'v1')):
+                pass
+            self.assertEqual(1, simulator.model_loads)
+            with ImageInference(descriptor('a', b'v2')):
+                self.assertEqual(2, simulator.model_loads)
+                with self.assertRaises(inference.InferenceException):
+                    ImageInference(descriptor('a', b'v3'))
+
+    def test_lru_eviction(self):
+        with simulated_bonnet() as simulator:
+            inference.set_model_cache_size(2)
+            for name in ('a', 'b', 'a', 'c'):
+                with ImageInference(descriptor(name)):
+                    pass
+            # 'b' is least recently used.
+            self.assertEqual(['a', 'c'], loaded_models())
+            self.assertEqual(3, simulator.model_loads)
+
+            with ImageInference(descriptor('a')), ImageInference(descriptor('c')):
+                # Models in use are not evicted.
+                with ImageInference(descriptor('b')):
+                    self.assertEqual(['a', 'b', 'c'], loaded_models())
+            self.assertEqual(2, len(loaded_models()))
+
+    def test_reset(self):
+        with simulated_bonnet() as simulator:
+            inference.set_model_cache_size(1)
+            with ImageInference(descriptor('a')):
+                pass
+            with InferenceEngine() as engine:
+                engine.reset()
+            with ImageInference(descriptor('a')):
+                pass
+            self.assertEqual(2, simulator.model_loads)
+
+    def test_reset_by_other_engine(self):
+        with simulated_bonnet() as simulator:
+            first = ImageInference(descriptor('a'))
+            with InferenceEngine() as engine:
+                engine.reset()
+            with ImageInference(descriptor('a')):
+                self.assertEqual(2, simulator.model_loads)
+                # Release of the model acquired before reset keeps it loaded.
+                first.close()
+                self.assertEqual(['a'], loaded_models())
+            self.assertEqual([], loaded_models())
+
+    def test_loaded_outside(self):
+        with simulated_bonnet() as simulator:
+            with InferenceEngine() as engine:
+                engine.load_model(descriptor('a', b'other graph'))
+                with ImageInference(descriptor('a')):
+                    pass
+                # Model of somebody else is neither reloaded nor unloaded.
+                self.assertEqual(1, simulator.model_loads)
+                self.assertEqual(['a'], loaded_models())
+                engine.unload_model('a')
+
+    def test_left_loaded_by_earlier_process(self):
+        with simulated_bonnet() as simulator:
+            inference.set_model_cache_size(1)
+            with ImageInference(descriptor('a', b'v1')):
+                pass
+            # Next process reuses the model left loaded with the same graph.
+            inference._model_registry.clear()
+            with ImageInference(descriptor('a', b'v1')):
+                pass
+            self.assertEqual(1, simulator.model_loads)
+            # And reloads it when the graph has changed.
+            inference._model_registry.clear()
+            with ImageInference(descriptor('a', b'v2')):
+                self.assertEqual(2, simulator.model_loads)
+
+if __name__ == '__main__':
+    unittest.main()
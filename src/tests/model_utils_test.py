@@ -0,0 +1,189 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Model file loading and caching tests, no VisionBonnet required."""
+import os
+import subprocess
+import sys
+import tempfile
+import types
+import unittest
+
+import aiy.vision.proto.protocol_pb2 as pb2
+
+from aiy.vision.models import utils
+
+
+class ModelFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.old_env = {name: os.environ.get(name)
+                        for name in ('VISION_BONNET_MODELS_PATH', 'VISION_BONNET_CACHE_PATH')}
+        os.environ['VISION_BONNET_MODELS_PATH'] = self.dir.name
+        os.environ['VISION_BONNET_CACHE_PATH'] = os.path.join(self.dir.name, 'cache')
+        utils.clear_caches()
+
+    def tearDown(self):
+        for name, value in self.old_env.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+        utils.clear_caches()
+        self.dir.cleanup()
+
+    def write(self, filename, data, mtime=None):
+        path = os.path.join(self.dir.name, filename)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_import_loads_nothing(self):
+        code = ('from aiy.vision.models import dish_classification, dish_detection, '
+                'face_detection, image_classification, inaturalist_classification, '
+                'object_detection')
+        env = dict(os.environ, VISION_BONNET_MODELS_PATH=os.path.join(self.dir.name, 'none'))
+        subprocess.check_call([sys.executable, '-c', code], env=env)
+
+    def test_labels(self):
+        self.write('labels.txt', b'cat, kitty\ndog\n')
+        labels = utils.load_labels('labels.txt')
+        self.assertEqual((('cat', 'kitty'), ('dog',)), labels)
+        self.assertIs(labels, utils.load_labels('labels.txt'))
+        decoder = utils.load_classification_decoder('labels.txt')
+        self.assertEqual(('cat/kitty', 'dog'), decoder.names)
+        self.assertIs(decoder, utils.load_classification_decoder('labels.txt'))
+
+    def test_ssd_anchors(self):
+        self.write('anchors.txt', b'0.1 0.2 0.3 0.4\n0.5 0.6 0.7 0.8\n', mtime=1000)
+        anchors = utils.load_ssd_anchors('anchors.txt')
+        self.assertEqual(((0.1, 0.2, 0.3, 0.4), (0.5, 0.6, 0.7, 0.8)), anchors)
+        self.assertIs(anchors, utils.load_ssd_anchors('anchors.txt'))
+        self.assertEqual([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8],
+                         list(utils.load_ssd_anchors_array('anchors.txt')))
+
+        self.write('bad.txt', b'0.1 0.2 0.3\n')
+        with self.assertRaises(ValueError):
+            utils.load_ssd_anchors('bad.txt')
+
+    def test_ssd_anchors_cache(self):
+        self.write('anchors.txt', b'0.1 0.2 0.3 0.4\n', mtime=1000)
+        path = os.path.join(self.dir.name, 'anchors.txt')
+        cache_path = utils._cache_path(path, 'anchors')
+        utils.load_ssd_anchors('anchors.txt')
+        self.assertTrue(os.path.exists(cache_path))
+
+        # Cached anchors are used without parsing the text file.
+        utils.clear_caches()
+        real_parse = utils._parse_ssd_anchors
+        utils._parse_ssd_anchors = None
+        try:
+            self.assertEqual(((0.1, 0.2, 0.3, 0.4),), utils.load_ssd_anchors('anchors.txt'))
+        finally:
+            utils._parse_ssd_anchors = real_parse
+
+        # Changed file is parsed again.
+        utils.clear_caches()
+        self.write('anchors.txt', b'0.5 0.6 0.7 0.8\n', mtime=2000)
+        self.assertEqual(((0.5, 0.6, 0.7, 0.8),), utils.load_ssd_anchors('anchors.txt'))
+
+        # Corrupted cache is ignored and rewritten.
+        utils.clear_caches()
+        with open(cache_path, 'r+b') as f:
+            f.truncate(30)
+        self.assertEqual(((0.5, 0.6, 0.7, 0.8),), utils.load_ssd_anchors('anchors.txt'))
+        self.assertEqual(utils._ANCHORS_CACHE_HEADER.size + 32, os.path.getsize(cache_path))
+
+    def test_ssd_anchors_no_cache(self):
+        self.write('anchors.txt', b'0.1 0.2 0.3 0.4\n')
+        os.environ['VISION_BONNET_CACHE_PATH'] = ''
+        self.assertEqual(((0.1, 0.2, 0.3, 0.4),), utils.load_ssd_anchors('anchors.txt'))
+        self.assertFalse(os.path.exists(os.path.join(self.dir.name, 'cache')))
+
+        # Unwritable cache directory doesn't break loading.
+        utils.clear_caches()
+        self.write('cache', b'')
+        os.environ['VISION_BONNET_CACHE_PATH'] = os.path.join(self.dir.name, 'cache')
+        self.assertEqual(((0.1, 0.2, 0.3, 0.4),), utils.load_ssd_anchors('anchors.txt'))
+
+    def test_compute_graph(self):
+        self.write('a.binaryproto', b'a' * 100, mtime=1000)
+        graph = utils.load_compute_graph('a.binaryproto')
+        self.assertEqual(b'a' * 100, graph)
+        self.assertIs(graph, utils.load_compute_graph('a.binaryproto'))
+
+        # Changed file is reloaded.
+        self.write('a.binaryproto', b'b' * 100, mtime=2000)
+        self.assertEqual(b'b' * 100, utils.load_compute_graph('a.binaryproto'))
+
+        self.write('empty.binaryproto', b'')
+        self.assertEqual(b'', utils.load_compute_graph('empty.binaryproto'))
+
+    def test_compute_graph_lru(self):
+        cache = utils._GraphCache(max_size=250)
+        paths = []
+        for name in 'abc':
+            self.write(name, name.encode() * 100)
+            paths.append(os.path.join(self.dir.name, name))
+
+        a = cache.get(paths[0])
+        cache.get(paths[1])
+        self.assertIs(a, cache.get(paths[0]))  # 'a' becomes most recently used.
+        cache.get(paths[2])  # Evicts 'b'.
+        self.assertEqual(200, cache.size)
+        self.assertIs(a, cache.get(paths[0]))
+
+        cache.max_size = 50
+        self.assertEqual(b'a' * 100, cache.get(paths[0]))  # Too large to be cached.
+
+
+class SparseTensorTest(unittest.TestCase):
+
+    def test_sparse_tensor(self):
+        tensor = pb2.FloatTensor(data=[0.5, 0.25, 0.125])
+        for index in ((0, 3), (1, 1), (4, 2)):
+            tensor.indices.add().values.extend(index)
+        sparse = utils.sparse_tensor(tensor)
+        self.assertEqual(2, sparse.rank)
+        self.assertEqual(3, len(sparse))
+        self.assertEqual([0, 3, 1, 1, 4, 2], list(sparse.indices))
+        self.assertEqual([0.5, 0.25, 0.125], list(sparse.values))
+        self.assertEqual([0, 1, 4], list(sparse.column(0)))
+        self.assertEqual([3, 1, 2], list(sparse.column(1)))
+
+    def test_values_per_index(self):
+        tensor = pb2.FloatTensor(data=range(8))
+        tensor.indices.add().values.append(7)
+        tensor.indices.add().values.append(2)
+        sparse = utils.sparse_tensor(tensor)
+        self.assertEqual((1, 2), (sparse.rank, len(sparse)))
+        self.assertEqual([7, 2], list(sparse.column(0)))
+
+    def test_plain_sequences(self):
+        # Protobuf implementations without element lists are iterated as is.
+        Index = types.SimpleNamespace
+        tensor = types.SimpleNamespace(data=(0.5, 0.25), indices=(Index(values=(0, 3)),
+                                                                   Index(values=(4, 2))))
+        sparse = utils.sparse_tensor(tensor)
+        self.assertEqual([0, 3, 4, 2], list(sparse.indices))
+        self.assertEqual([0.5, 0.25], list(sparse.values))
+
+    def test_empty(self):
+        sparse = utils.sparse_tensor(pb2.FloatTensor())
+        self.assertEqual((0, 0), (sparse.rank, len(sparse)))
+        self.assertEqual([], list(sparse.column(0)))
+
+if __name__ == '__main__':
+    unittest.main()
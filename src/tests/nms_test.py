@@ -0,0 +1,102 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Non-maximum suppression tests, no VisionBonnet required."""
+import random
+import unittest
+
+from aiy.vision.models import nms
+from aiy.vision.models import utils
+
+
+def random_boxes(seed, count):
+    rand = random.Random(seed)
+    boxes = [(rand.randint(0, 500), rand.randint(0, 500),
+              rand.randint(0, 200), rand.randint(0, 200)) for _ in range(count)]
+    scores = [rand.choice((0.25, 0.5, rand.random())) for _ in range(count)]
+    kinds = [rand.randint(1, 3) for _ in range(count)]
+    return boxes, scores, kinds
+
+
+def reference_nms(boxes, scores, kinds, overlap_threshold):
+    """Original O(n^2) implementation from object_detection."""
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    suppressed = set()
+    for n, i in enumerate(order):
+        if i in suppressed:
+            continue
+        for j in order[n + 1:]:
+            if j in suppressed or (kinds and kinds[i] != kinds[j]):
+                continue
+            if nms.iou(boxes[i], boxes[j]) > overlap_threshold:
+                suppressed.add(j)
+    return [i for i in order if i not in suppressed]
+
+
+class NmsTestMixin:
+
+    def test_empty(self):
+        self.assertEqual(([], []), nms.non_maximum_suppression([], []))
+
+    def test_same_as_reference(self):
+        for seed in range(20):
+            boxes, scores, kinds = random_boxes(seed, 60)
+            for threshold in (0.0, 0.3, 0.5, 0.9):
+                for per_class in (False, True):
+                    indices, kept_scores = nms.non_maximum_suppression(
+                        boxes, scores, threshold, kinds if per_class else None)
+                    self.assertEqual(reference_nms(boxes, scores, per_class and kinds,
+                                                   threshold), indices)
+                    self.assertEqual([scores[i] for i in indices], kept_scores)
+
+    def test_top_k(self):
+        boxes, scores, _ = random_boxes(0, 60)
+        all_indices, _ = nms.non_maximum_suppression(boxes, scores)
+        indices, _ = nms.non_maximum_suppression(boxes, scores, top_k=3)
+        self.assertEqual(all_indices[:3], indices)
+
+    def test_soft_nms(self):
+        boxes = [(0, 0, 100, 100), (10, 0, 100, 100), (500, 500, 10, 10)]
+        scores = [0.9, 0.8, 0.7]
+        indices, kept_scores = nms.non_maximum_suppression(boxes, scores, soft_sigma=0.5)
+        self.assertEqual([0, 2, 1], indices)
+        self.assertAlmostEqual(0.9, kept_scores[0])
+        self.assertAlmostEqual(0.7, kept_scores[1])
+        self.assertLess(kept_scores[2], 0.8)
+
+        indices, _ = nms.non_maximum_suppression(boxes, scores, soft_sigma=0.5,
+                                                 score_threshold=0.5)
+        self.assertEqual([0, 2], indices)
+
+    def test_inputs_unchanged(self):
+        boxes, scores, kinds = random_boxes(1, 30)
+        copies = (list(boxes), list(scores), list(kinds))
+        nms.non_maximum_suppression(boxes, scores, kinds=kinds, soft_sigma=0.5)
+        self.assertEqual(copies, (boxes, scores, kinds))
+
+
+class PythonNmsTest(NmsTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        utils.use_numpy(False)
+
+    def tearDown(self):
+        utils.use_numpy(True)
+
+
+@unittest.skipIf(utils.np is None, 'NumPy is not installed')
+class NumpyNmsTest(NmsTestMixin, unittest.TestCase):
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Host-side object detection decoder tests, no VisionBonnet required."""
+import math
+import os
+import random
+import tempfile
+import time
+import unittest
+
+import aiy.vision.proto.protocol_pb2 as pb2
+
+from aiy.vision.models import decoders
+from aiy.vision.models import object_detection as od
+from aiy.vision.models import utils
+
+NUM_ANCHORS = 1917  # Same as the real model.
+
+_models_dir = None
+_old_env = {}
+
+
+def setUpModule():
+    """Points VISION_BONNET_MODELS_PATH to synthetic anchors of the model."""
+    global _models_dir
+    _models_dir = tempfile.TemporaryDirectory()
+    rand = random.Random(0)
+    with open(os.path.join(_models_dir.name, od._ANCHORS_FILE), 'w') as f:
+        for _ in range(NUM_ANCHORS):
+            y, x = rand.random(), rand.random()
+            h, w = rand.uniform(0.05, 0.5), rand.uniform(0.05, 0.5)
+            f.write('%r %r %r %r\n' % (y - h / 2, x - w / 2, y + h / 2, x + w / 2))
+    for name, value in (('VISION_BONNET_MODELS_PATH', _models_dir.name),
+                        ('VISION_BONNET_CACHE_PATH', '')):
+        _old_env[name] = os.environ.get(name)
+        os.environ[name] = value
+    utils.clear_caches()
+
+
+def tearDownModule():
+    for name, value in _old_env.items():
+        if value is None:
+            del os.environ[name]
+        else:
+            os.environ[name] = value
+    utils.clear_caches()
+    _models_dir.cleanup()
+
+
+def random_tensors(seed):
+    rand = random.Random(seed)
+    logit_scores = [rand.gauss(-2.0, 2.0) for _ in range(4 * len(od._anchors()))]
+    box_encodings = [rand.gauss(0.0, 1.0) for _ in range(4 * len(od._anchors()))]
+    return logit_scores, box_encodings
+
+
+def dense_result(logit_scores, box_encodings):
+    result = pb2.InferenceResult(model_name='object_detection')
+    result.window.width, result.window.height = 640, 480
+    result.tensors[od._SCORE_TENSOR_NAME].data.extend(logit_scores)
+    result.tensors[od._ANCHOR_TENSOR_NAME].data.extend(box_encodings)
+    return result
+
+
+def sparse_result(logit_scores, box_encodings, threshold):
+    """Returns result with tensors thresholded like od.sparse_configs()."""
+    logit_threshold = decoders._logit(max(threshold, decoders._MACHINE_EPS))
+    result = dense_result([], [])
+    scores = result.tensors[od._SCORE_TENSOR_NAME]
+    encodings = result.tensors[od._ANCHOR_TENSOR_NAME]
+    anchors = set()
+    for i, logit in enumerate(logit_scores):
+        anchor, label = divmod(i, 4)
+        if label and logit >= logit_threshold:
+            scores.data.append(logit)
+            scores.indices.add().values.extend((anchor, label))
+            anchors.add(anchor)
+    for anchor in sorted(anchors):
+        encodings.data.extend(box_encodings[4 * anchor:4 * (anchor + 1)])
+        encodings.indices.add().values.append(anchor)
+    return result
+
+
+def as_tuples(objs):
+    return [(obj.bounding_box, obj.kind, obj.score) for obj in objs]
+
+
+@unittest.skipIf(utils.np is None, 'NumPy is not installed')
+class NumpyDecoderTest(unittest.TestCase):
+
+    def test_same_objects(self):
+        for seed in range(10):
+            logit_scores, box_encodings = random_tensors(seed)
+            for threshold in (0.0, 0.1, 0.3, 0.9, 0.99):
+                expected = od._decoder()._decode_dense(
+                    logit_scores, box_encodings, threshold, (640, 480), (10, 20))
+                actual = od._decoder()._decode_dense_numpy(
+                    logit_scores, box_encodings, threshold, (640, 480), (10, 20))
+                self.assertEqual(as_tuples(expected), as_tuples(actual))
+
+class SparseDecoderTest(unittest.TestCase):
+
+    def tearDown(self):
+        utils.use_numpy(True)
+
+    def test_objects(self):
+        logit_scores = [-10.0] * (4 * len(od._anchors()))
+        box_encodings = [0.0] * (4 * len(od._anchors()))
+        logit_scores[4 * 3 + od.Object.CAT] = 2.0
+        logit_scores[4 * 3 + od.Object.DOG] = 1.0
+        logit_scores[4 * 7 + od.Object.PERSON] = 0.5
+        result = sparse_result(logit_scores, box_encodings, threshold=0.2)
+        for numpy_enabled in (False, True):
+            utils.use_numpy(numpy_enabled)
+            objs = od.get_objects_sparse(result)
+            self.assertEqual([(od.Object.CAT, 1.0 / (1.0 + math.exp(-2.0))),
+                              (od.Object.PERSON, 1.0 / (1.0 + math.exp(-0.5)))],
+                             [(obj.kind, obj.score) for obj in objs])
+
+    @unittest.skipIf(utils.np is None, 'NumPy is not installed')
+    def test_same_objects(self):
+        for seed in range(3):
+            logit_scores, box_encodings = random_tensors(seed)
+            for threshold in (0.3, 0.5, 0.9):
+                result = sparse_result(logit_scores, box_encodings, threshold)
+                utils.use_numpy(False)
+                expected = od.get_objects_sparse(result)
+                utils.use_numpy(True)
+                self.assertEqual(as_tuples(expected), as_tuples(od.get_objects_sparse(result)))
+
+
+def decode_dense(result, threshold):
+    """get_objects() without non-maximum suppression."""
+    size = (result.window.width, result.window.height)
+    logit_scores = result.tensors[od._SCORE_TENSOR_NAME].data
+    box_encodings = result.tensors[od._ANCHOR_TENSOR_NAME].data
+    if utils.numpy_enabled():
+        return od._decoder()._decode_dense_numpy(logit_scores, box_encodings, threshold,
+                                                 size, (0, 0))
+    return od._decoder()._decode_dense(tuple(logit_scores), tuple(box_encodings), threshold,
+                                       size, (0, 0))
+
+
+def decode_sparse(result):
+    """get_objects_sparse() without non-maximum suppression."""
+    size = (result.window.width, result.window.height)
+    logit_scores = utils.sparse_tensor(result.tensors[od._SCORE_TENSOR_NAME])
+    box_encodings = utils.sparse_tensor(result.tensors[od._ANCHOR_TENSOR_NAME])
+    if utils.numpy_enabled():
+        return od._decoder()._decode_sparse_numpy(logit_scores, box_encodings,
+                                                        size, (0, 0))
+    return od._decoder()._decode_sparse(logit_scores, box_encodings, size, (0, 0))
+
+
+class SparseDecoderBenchmark(unittest.TestCase):
+    NUM_FRAMES = 10
+
+    def tearDown(self):
+        utils.use_numpy(True)
+
+    def measure(self, decode):
+        start = time.monotonic()
+        for _ in range(self.NUM_FRAMES):
+            decode()
+        return 1000 * (time.monotonic() - start) / self.NUM_FRAMES
+
+    def test_decode_time(self):
+        logit_scores, box_encodings = random_tensors(0)
+        dense = dense_result(logit_scores, box_encodings)
+        print()
+        for numpy_enabled in (False, True) if utils.np is not None else (False,):
+            utils.use_numpy(numpy_enabled)
+            for threshold in (0.1, 0.3, 0.5, 0.9, 0.99):
+                sparse = sparse_result(logit_scores, box_encodings, threshold)
+                print('numpy=%d threshold=%.2f (%4d scores): dense %.2f ms, sparse %.2f ms' %
+                      (numpy_enabled, threshold, len(sparse.tensors[od._SCORE_TENSOR_NAME].data),
+                       self.measure(lambda: decode_dense(dense, threshold)),
+                       self.measure(lambda: decode_sparse(sparse))))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Streaming operator tests, no VisionBonnet required."""
+import random
+import unittest
+
+from aiy.vision import operators
+from aiy.vision.inference import CameraInference, ModelDescriptor
+from aiy.vision.simulator import simulated_bonnet
+
+
+def run(operator, values, timestamps=None):
+    timestamps = timestamps or range(len(values))
+    return [operator.update(value, timestamp) for value, timestamp in zip(values, timestamps)]
+
+
+class AverageTest(unittest.TestCase):
+
+    def test_exponential_average(self):
+        ema = operators.ExponentialAverage(alpha=0.5)
+        self.assertIsNone(ema.value)
+        self.assertEqual([4.0, 2.0, 3.0], run(ema, [4.0, 0.0, 4.0]))
+        ema.reset()
+        self.assertEqual([1.0], run(ema, [1.0]))
+
+    def test_half_life(self):
+        ema = operators.ExponentialAverage(half_life=2.0)
+        self.assertEqual([0.0, 0.5], run(ema, [0.0, 1.0], timestamps=[0.0, 2.0]))
+        # A longer gap gives the new value more weight.
+        self.assertAlmostEqual(0.5 + 0.5 * 0.75, ema.update(1.0, 6.0))
+        with self.assertRaises(ValueError):
+            operators.ExponentialAverage()
+        with self.assertRaises(ValueError):
+            operators.ExponentialAverage(alpha=0.5, half_life=1.0)
+
+    def test_window_average(self):
+        average = operators.WindowAverage(3)
+        self.assertEqual([3.0, 2.0, 2.0, 1.0], run(average, [3.0, 1.0, 2.0, 0.0]))
+        values = [random.Random(0).uniform(-1e6, 1e6) for _ in range(1000)]
+        average = operators.WindowAverage(7)
+        for i, value in enumerate(values):
+            window = values[max(0, i - 6):i + 1]
+            self.assertAlmostEqual(sum(window) / len(window), average.update(value), places=6)
+
+
+class EventTest(unittest.TestCase):
+
+    def test_hysteresis(self):
+        hysteresis = operators.Hysteresis(low=0.1, high=0.8)
+        self.assertEqual([None, 'high', None, None, None, 'low', None, 'high'],
+                         run(hysteresis, [0.5, 0.9, 0.5, 0.9, 0.1, 0.05, 0.0, 0.85]))
+        self.assertEqual('high', hysteresis.state)
+        self.assertEqual(['low', 'high'],
+                         run(operators.Hysteresis(0.1, 0.8, initial=None), [0.0, 1.0]))
+        with self.assertRaises(ValueError):
+            operators.Hysteresis(0.8, 0.1)
+
+    def test_change_detector(self):
+        self.assertEqual([False, None, True, None, False],
+                         run(operators.ChangeDetector(), [False, False, True, True, False]))
+        self.assertEqual([None, None, 1.5, None, 0.5],
+                         run(operators.ChangeDetector(min_delta=1.0, report_first=False),
+                             [0.0, 0.9, 1.5, 0.6, 0.5]))
+
+    def test_debounce(self):
+        debounce = operators.Debounce(count=3)
+        self.assertEqual([None, None, True, None, None, None, None, False, None, None],
+                         run(debounce, [True, True, True, False, True, False, False, False,
+                                        True, False]))
+        debounce = operators.Debounce(duration=1.0)
+        self.assertEqual([None, None, 'a', None, 'b'],
+                         run(debounce, ['a', 'a', 'a', 'b', 'b'],
+                             timestamps=[0.0, 0.5, 1.0, 1.2, 2.2]))
+        self.assertEqual('b', debounce.value)
+
+    def test_rate_limiter(self):
+        limiter = operators.RateLimiter(1.0)
+        self.assertTrue(limiter.ready(0.0))
+        self.assertEqual([1, None, None, 4, None, 6],
+                         run(limiter, [1, 2, 3, 4, 5, 6],
+                             timestamps=[0.0, 0.4, 0.9, 1.0, 1.5, 2.5]))
+        self.assertFalse(limiter.ready(2.6))
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_pipeline(self):
+        pipeline = operators.Pipeline(operators.WindowAverage(2),
+                                      operators.Hysteresis(low=0.2, high=0.8))
+        self.assertEqual(['high', None, None, 'low'], run(pipeline, [1.0, 1.0, 0.0, 0.0]))
+        pipeline.reset()
+        self.assertEqual('low', pipeline.operators[1].state)
+
+    def test_camera_inference(self):
+        descriptor = ModelDescriptor(name='model', input_shape=(1, 160, 120, 3),
+                                     input_normalizer=(128.0, 128.0), compute_graph=b'graph')
+        pipeline = operators.Pipeline(operators.ExponentialAverage(alpha=0.1),
+                                      operators.ChangeDetector(min_delta=0.01))
+        with simulated_bonnet(), CameraInference(descriptor) as inference:
+            averages = list(pipeline.map(inference.run(50),
+                                         key=lambda result: result.tensors['output'].data[0]))
+        self.assertTrue(averages)
+        self.assertLess(len(averages), 50)
+        for average in averages:
+            self.assertTrue(0.0 <= average <= 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Retry and recovery tests against BonnetSimulator, no VisionBonnet required."""
+import socket
+import threading
+import unittest
+
+from unittest import mock
+
+from aiy.vision import metrics
+from aiy.vision.inference import (InferenceEngine, ModelDescriptor, RetryPolicy,
+                                  _REQ_CAMERA_INFERENCE, _REQ_STOP_CAMERA_INFERENCE,
+                                  _model_registry)
+from aiy.vision.simulator import DEFAULT_MODEL, LatencyProfile, SimulatedModel, simulated_bonnet
+
+
+def descriptor(name):
+    return ModelDescriptor(name=name, input_shape=(1, 160, 120, 3),
+                           input_normalizer=(128.0, 128.0), compute_graph=b'graph')
+
+
+SLOW_MODEL = SimulatedModel(tensors={'output': (1, 1, 1, 10)},
+                            latency=LatencyProfile(inference_ms=400))
+
+
+def camera_inference(engine, timeout):
+    return engine._communicate_bytes(_REQ_CAMERA_INFERENCE, timeout=timeout).inference_result
+
+
+class RecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        metrics.get_metrics().reset()
+        _model_registry.clear()
+
+    def tearDown(self):
+        _model_registry.clear()
+
+    def test_recover(self):
+        with simulated_bonnet() as simulator, InferenceEngine() as engine:
+            engine.load_model(descriptor('a'))
+            engine.load_model(descriptor('b'))
+            engine.unload_model('a')
+            engine.start_camera_inference('b')
+
+            # Bonnet is reset behind the engine's back.
+            with InferenceEngine() as other:
+                other.reset()
+                self.assertFalse(other.get_inference_state().loaded_models)
+
+            engine.recover()
+            state = engine.get_inference_state()
+            self.assertEqual(['b'], list(state.loaded_models))
+            self.assertEqual(['b'], list(state.processing_models))
+            self.assertEqual('b', engine.camera_inference().model_name)
+
+            count, last, total = engine.recovery_stats
+            self.assertEqual(1, count)
+            self.assertEqual(last, total)
+            self.assertEqual(3, simulator.model_loads)
+
+    @mock.patch.object(_model_registry, 'capacity', 2)
+    def test_recover_registry_models(self):
+        with simulated_bonnet() as simulator, InferenceEngine() as engine, \
+             InferenceEngine() as other:
+            _model_registry.acquire(other, descriptor('a'))
+            _model_registry.acquire(other, descriptor('b'))
+            _model_registry.release(other, 'b')  # Unused, but stays loaded.
+            self.assertEqual(2, simulator.model_loads)
+
+            engine.recover()
+            # Model in use by the other engine is restored, the unused one is not.
+            self.assertEqual(['a'], list(engine.get_inference_state().loaded_models))
+            self.assertEqual(['a'], list(_model_registry._resident))
+            self.assertEqual(3, simulator.model_loads)
+
+            self.assertEqual('a', _model_registry.acquire(other, descriptor('a')))
+            self.assertEqual(3, simulator.model_loads)
+            self.assertEqual('b', _model_registry.acquire(other, descriptor('b')))
+            self.assertEqual(4, simulator.model_loads)
+            for name in ('a', 'a', 'b'):
+                _model_registry.release(other, name)
+
+    def test_retry(self):
+        with simulated_bonnet(default_model=SLOW_MODEL, realtime=True) as simulator, \
+             InferenceEngine() as engine:
+            engine.load_model(descriptor('model'))
+            engine.start_camera_inference('model')
+            # The first attempt times out, the retry is sent when the model is fast.
+            threading.Timer(0.1, simulator.set_model, ('model', DEFAULT_MODEL)).start()
+            result = camera_inference(engine, timeout=0.3)
+            self.assertEqual('model', result.model_name)
+            self.assertEqual(0, engine.recovery_stats.count)
+        self.assertEqual(1, metrics.get_metrics().snapshot()['camera_inference']['retries'])
+
+    def test_recover_after_retries(self):
+        policy = RetryPolicy(attempts=2, backoff=0.0)
+        with simulated_bonnet(default_model=SLOW_MODEL, realtime=True), \
+             InferenceEngine(policy) as engine:
+            engine.load_model(descriptor('model'))
+            engine.start_camera_inference('model')
+            with self.assertRaises(socket.timeout):
+                camera_inference(engine, timeout=0.1)
+            self.assertEqual(1, engine.recovery_stats.count)
+        self.assertEqual(2, metrics.get_metrics().snapshot()['camera_inference']['retries'])
+
+    def test_no_retry_of_state_changes(self):
+        with simulated_bonnet(default_model=SLOW_MODEL, realtime=True), \
+             InferenceEngine() as engine:
+            engine.load_model(descriptor('model'))
+            engine.start_camera_inference('model')
+            # Queued behind a slow camera inference request.
+            engine._transport.submit(_REQ_CAMERA_INFERENCE)
+            with self.assertRaises(socket.timeout):
+                engine._communicate_bytes(_REQ_STOP_CAMERA_INFERENCE, timeout=0.1)
+            self.assertEqual(0, engine.recovery_stats.count)
+        self.assertEqual(0, metrics.get_metrics().snapshot()['stop_camera_inference']['retries'])
+
+if __name__ == '__main__':
+    unittest.main()
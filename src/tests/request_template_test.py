@@ -0,0 +1,114 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Image inference request template tests and benchmark, no VisionBonnet required."""
+import time
+import unittest
+
+from unittest import mock
+
+from PIL import Image
+
+import aiy.vision.proto.protocol_pb2 as pb2
+
+from aiy.vision import inference
+from aiy.vision.inference import (ThresholdingConfig, _RequestTemplates, _TensorPacker,
+                                  _image_inference_request, _varint)
+
+PARAMS = {'threshold': 0.5, 'top_k': 3}
+SPARSE_CONFIGS = {'output': ThresholdingConfig(logical_shape=[1, 1001], threshold=0.1,
+                                               top_k=5, to_ignore=[(1, 0)])}
+
+
+def parse(request_bytes):
+    request = pb2.Request()
+    request.ParseFromString(request_bytes)
+    return request
+
+
+def reference(packer, model_name, image, params, sparse_configs):
+    return _image_inference_request(model_name, packer.pack(image), params, sparse_configs)
+
+
+class RequestTemplateTest(unittest.TestCase):
+
+    def test_varint(self):
+        self.assertEqual(b'\x00', _varint(0))
+        self.assertEqual(b'\x7f', _varint(127))
+        self.assertEqual(b'\x80\x01', _varint(128))
+        self.assertEqual(b'\xac\x02', _varint(300))
+        self.assertEqual(b'\xff\xff\xff\xff\x0f', _varint(2 ** 32 - 1))
+
+    def test_same_as_reference(self):
+        packer = _TensorPacker()
+        templates = _RequestTemplates()
+        images = [Image.new('RGB', (8, 6), 'red'), Image.new('L', (200, 100), 50),
+                  Image.new('RGB', (300, 300)), b'\xff\xd8jpeg']
+        for params, sparse_configs in ((None, None), (PARAMS, None), (PARAMS, SPARSE_CONFIGS)):
+            for image in images:
+                template = templates.get('model', params, sparse_configs)
+                request = parse(template.render(*packer.pack_parts(image)))
+                self.assertEqual(reference(packer, 'model', image, params, sparse_configs),
+                                 request)
+
+    def test_reused(self):
+        templates = _RequestTemplates()
+        params = dict(PARAMS)
+        template = templates.get('model', params, SPARSE_CONFIGS)
+        self.assertIs(template, templates.get('model', dict(PARAMS), SPARSE_CONFIGS))
+        self.assertIsNot(template, templates.get('other', params, SPARSE_CONFIGS))
+        # Changed params are detected even when the dict is the same object.
+        params['top_k'] = 10
+        changed = templates.get('model', params, SPARSE_CONFIGS)
+        self.assertIsNot(template, changed)
+        self.assertEqual('10', parse(changed.render(0, 0, 0, (b'',)))
+                         .image_inference.params['top_k'])
+
+    def test_alternating_params(self):
+        templates = _RequestTemplates()
+        other_configs = {'output': ThresholdingConfig(logical_shape=[1, 1001], threshold=0.2,
+                                                      top_k=5, to_ignore=[(1, 0)])}
+        with mock.patch.object(inference, '_ImageInferenceTemplate',
+                               wraps=inference._ImageInferenceTemplate) as template_class:
+            for _ in range(5):
+                templates.get('model', PARAMS, SPARSE_CONFIGS)
+                templates.get('model', {'threshold': 0.2}, other_configs)
+        self.assertEqual(2, template_class.call_count)
+
+
+class RequestTemplateBenchmark(unittest.TestCase):
+    NUM_FRAMES = 200
+
+    def test_build_time(self):
+        packer = _TensorPacker()
+        templates = _RequestTemplates()
+        image = Image.new('RGB', (640, 480))
+        # Image packing is the same for both, only request building is measured.
+        tensor = packer.pack(image)
+        parts = packer.pack_parts(image)
+
+        start = time.monotonic()
+        for _ in range(self.NUM_FRAMES):
+            _image_inference_request('model', tensor, PARAMS, SPARSE_CONFIGS).SerializeToString()
+        messages = (time.monotonic() - start) / self.NUM_FRAMES
+
+        start = time.monotonic()
+        for _ in range(self.NUM_FRAMES):
+            templates.get('model', PARAMS, SPARSE_CONFIGS).render(*parts)
+        spliced = (time.monotonic() - start) / self.NUM_FRAMES
+
+        print('\n640x480 request build: messages %.3f ms, template %.3f ms' %
+              (1000 * messages, 1000 * spliced))
+
+if __name__ == '__main__':
+    unittest.main()
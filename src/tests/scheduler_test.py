@@ -0,0 +1,84 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""InferenceScheduler tests against BonnetSimulator, no VisionBonnet required."""
+import collections
+import time
+import unittest
+
+from PIL import Image
+
+from aiy.vision.inference import InferenceEngine, ModelDescriptor
+from aiy.vision.scheduler import InferenceScheduler, ScheduledModel
+from aiy.vision.simulator import simulated_bonnet
+
+
+def descriptor(name):
+    return ModelDescriptor(name=name, input_shape=(1, 160, 160, 3),
+                           input_normalizer=(128.0, 128.0), compute_graph=name.encode())
+
+
+class InferenceSchedulerTest(unittest.TestCase):
+
+    def test_rates(self):
+        models = [ScheduledModel(descriptor('fast'), rate=100),
+                  ScheduledModel(descriptor('slow'), rate=25)]
+        with simulated_bonnet() as simulator:
+            with InferenceScheduler(models) as scheduler:
+                results = list(scheduler.run(50))
+                counts = collections.Counter(name for name, _ in results)
+                self.assertEqual(50, counts['fast'] + counts['slow'])
+                self.assertGreater(counts['fast'], 2 * counts['slow'])
+                self.assertGreater(counts['slow'], 0)
+                for name, result in results:
+                    self.assertEqual(name, result.model_name)
+
+                stats = scheduler.stats
+                self.assertEqual(counts['fast'], stats['fast'].count)
+                self.assertGreater(stats['slow'].mean_latency, 0.0)
+                # Both models are loaded at once, switching doesn't reload them.
+                self.assertEqual(2, simulator.model_loads)
+
+            with InferenceEngine() as engine:
+                self.assertFalse(engine.get_camera_state().running)
+                self.assertFalse(engine.get_inference_state().loaded_models)
+
+    def test_crop(self):
+        frames = []
+
+        def frame_source():
+            frames.append(Image.new('RGB', (640, 480)))
+            return frames[-1]
+
+        models = [ScheduledModel(descriptor('camera')),
+                  ScheduledModel(descriptor('crop'), crop=(10, 20, 100, 50))]
+        with simulated_bonnet(), InferenceScheduler(models, frame_source) as scheduler:
+            results = dict(scheduler.run(2))
+            self.assertEqual((100, 50), (results['crop'].width, results['crop'].height))
+            self.assertEqual(1, len(frames))
+
+    def test_dropped(self):
+        models = [ScheduledModel(descriptor('a'), rate=1000)]
+        with simulated_bonnet(), InferenceScheduler(models) as scheduler:
+            for _ in scheduler.run(3):
+                time.sleep(0.01)
+            self.assertGreater(scheduler.stats['a'].dropped, 10)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            InferenceScheduler([ScheduledModel(descriptor('a'), crop=(0, 0, 0, 0))])
+        with self.assertRaises(ValueError):
+            InferenceScheduler([ScheduledModel(descriptor('a')), ScheduledModel(descriptor('a'))])
+
+if __name__ == '__main__':
+    unittest.main()
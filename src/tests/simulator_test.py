@@ -0,0 +1,143 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""BonnetSimulator tests and camera inference benchmark, no VisionBonnet required."""
+import threading
+import time
+import unittest
+
+from PIL import Image
+
+import aiy.vision.proto.protocol_pb2 as pb2
+
+from aiy.vision.inference import CameraInference, ImageInference, InferenceEngine, \
+    ModelDescriptor, ThresholdingConfig, FromSparseTensorConfig
+from aiy.vision.simulator import LatencyProfile, SimulatedModel, simulated_bonnet
+
+DESCRIPTOR = ModelDescriptor(name='test_model', input_shape=(1, 160, 160, 3),
+                             input_normalizer=(128.0, 128.0), compute_graph=b'\0' * 1000)
+
+SCORES = [0.125, 0.875, 0.25, 0.0,
+          0.75, 0.375, 0.0, 0.625,
+          0.0625, 0.125, 0.25, 0.125]
+BOXES = list(range(12))
+
+
+def generator(name, shape, rand):
+    return {'scores': SCORES, 'boxes': BOXES}[name]
+
+DETECTION_MODEL = SimulatedModel(tensors={'scores': (1, 1, 1, 12), 'boxes': (1, 1, 1, 12)},
+                                 latency=LatencyProfile(inference_ms=25.0),
+                                 generator=generator)
+
+
+class BonnetSimulatorTest(unittest.TestCase):
+
+    def test_models(self):
+        with simulated_bonnet(), InferenceEngine() as engine:
+            self.assertEqual((1, 2), engine.get_firmware_info())
+            model_name = engine.load_model(DESCRIPTOR)
+            self.assertEqual([model_name], list(engine.get_inference_state().loaded_models))
+            # Already loaded model is reported as error and ignored.
+            self.assertEqual(model_name, engine.load_model(DESCRIPTOR))
+            self.assertEqual([model_name], list(engine.get_inference_state().loaded_models))
+            engine.unload_model(model_name)
+            self.assertFalse(engine.get_inference_state().loaded_models)
+
+    def test_image_inference(self):
+        with simulated_bonnet(models={'test_model': DETECTION_MODEL}), \
+             ImageInference(DESCRIPTOR) as inference:
+            result = inference.run(Image.new('RGB', (320, 240)))
+            self.assertEqual((320, 240), (result.width, result.height))
+            self.assertEqual(25, result.duration_ms)
+            self.assertEqual(SCORES, list(result.tensors['scores'].data))
+            self.assertEqual((1, 1, 1, 12), (result.tensors['scores'].shape.batch,
+                                             result.tensors['scores'].shape.height,
+                                             result.tensors['scores'].shape.width,
+                                             result.tensors['scores'].shape.depth))
+
+    def test_sparse_configs(self):
+        sparse_configs = {
+            'scores': ThresholdingConfig(logical_shape=[3, 4], threshold=0.3, top_k=3,
+                                         to_ignore=[(1, 0)]),
+            'boxes': FromSparseTensorConfig(logical_shape=[3], tensor_name='scores',
+                                            squeeze_dims=[1]),
+        }
+        with simulated_bonnet(models={'test_model': DETECTION_MODEL}), \
+             ImageInference(DESCRIPTOR) as inference:
+            result = inference.run(Image.new('L', (16, 16)), sparse_configs=sparse_configs)
+
+        scores = result.tensors['scores']
+        self.assertEqual([(0, 1), (1, 3), (1, 1)],
+                         [tuple(index.values) for index in scores.indices])
+        self.assertEqual([0.875, 0.625, 0.375], list(scores.data))
+
+        boxes = result.tensors['boxes']
+        self.assertEqual([(0,), (1,)], [tuple(index.values) for index in boxes.indices])
+        self.assertEqual([0, 1, 2, 3, 4, 5, 6, 7], list(boxes.data))
+
+    def test_camera_inference(self):
+        with simulated_bonnet(camera_size=(820, 616)) as simulator, \
+             CameraInference(DESCRIPTOR) as inference:
+            state = inference.engine.get_camera_state()
+            self.assertTrue(state.running)
+            self.assertEqual((820, 616), (state.width, state.height))
+            results = list(inference.run(5))
+            self.assertEqual(list(range(5)), [result.frame.index for result in results])
+            self.assertEqual([10] * 5, [len(result.tensors['output'].data) for result in results])
+        self.assertGreater(simulator.requests, 5)
+
+    def test_realtime(self):
+        model = DETECTION_MODEL._replace(latency=LatencyProfile(inference_ms=50.0))
+        with simulated_bonnet(models={'test_model': model}, realtime=True), \
+             ImageInference(DESCRIPTOR) as inference:
+            start = time.monotonic()
+            inference.run(Image.new('L', (16, 16)))
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_realtime_camera_wait(self):
+        def request(**kwargs):
+            response = pb2.Response()
+            response.ParseFromString(simulator.transact(pb2.Request(**kwargs).SerializeToString()))
+            self.assertEqual(pb2.Response.Status.OK, response.status.code, response.status.message)
+            return response
+
+        with simulated_bonnet(realtime=True, frame_rate=2.0) as simulator:
+            request(load_model=pb2.Request.LoadModel(model_name='test_model'))
+            request(start_camera_inference=pb2.Request.StartCameraInference(
+                model_name='test_model'))
+            request(camera_inference=pb2.Request.CameraInference())
+            # The next frame is captured in 0.5 seconds.
+            thread = threading.Thread(target=request,
+                                      kwargs={'camera_inference': pb2.Request.CameraInference()})
+            thread.start()
+            time.sleep(0.1)
+            start = time.monotonic()
+            request(get_inference_state=pb2.Request.GetInferenceState())
+            self.assertLess(time.monotonic() - start, 0.2)
+            thread.join()
+
+
+class CameraInferenceBenchmark(unittest.TestCase):
+    NUM_FRAMES = 2000
+
+    def test_frame_rate(self):
+        with simulated_bonnet(), CameraInference(DESCRIPTOR) as inference:
+            start = time.monotonic()
+            for _ in inference.run(self.NUM_FRAMES):
+                pass
+            fps = self.NUM_FRAMES / (time.monotonic() - start)
+        print('\nCamera inference: %.0f frames/s' % fps)
+
+if __name__ == '__main__':
+    unittest.main()
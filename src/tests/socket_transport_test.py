@@ -0,0 +1,212 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Socket transport tests and throughput benchmark against BonnetSimulator."""
+import asyncio
+import contextlib
+import socket
+import threading
+import time
+import unittest
+
+import aiy.vision.proto.protocol_pb2 as pb2
+
+from aiy.vision import _transport
+from aiy.vision.inference import InferenceEngine
+from aiy.vision.simulator import simulated_bonnet
+
+GET_SYSTEM_INFO = pb2.Request(get_system_info=pb2.Request.GetSystemInfo()).SerializeToString()
+
+
+def parse(response_bytes):
+    response = pb2.Response()
+    response.ParseFromString(response_bytes)
+    return response
+
+
+@contextlib.contextmanager
+def fake_bonnet(handle):
+    """Runs handle(connected socket) for the first connection, yields address."""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+
+    def run():
+        conn, _ = server.accept()
+        with conn:
+            handle(conn)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        yield server.getsockname()
+    finally:
+        thread.join(5.0)
+        server.close()
+
+
+class SocketTransportTest(unittest.TestCase):
+
+    def test_send(self):
+        with simulated_bonnet(), contextlib.closing(_transport._SocketTransport()) as transport:
+            response = parse(transport.send(GET_SYSTEM_INFO))
+            self.assertEqual(pb2.Response.Status.OK, response.status.code)
+            self.assertTrue(response.HasField('system_info'))
+
+    def test_pipelined(self):
+        requests = [pb2.Request(load_model=pb2.Request.LoadModel(model_name=str(i),
+                        compute_graph=b'\0' * i * 1000)).SerializeToString()
+                    for i in range(50)]
+        with simulated_bonnet(), contextlib.closing(_transport._SocketTransport()) as transport:
+            pendings = [transport.submit(request) for request in requests]
+            for pending in pendings:
+                self.assertEqual(pb2.Response.Status.OK, parse(pending.result()).status.code)
+            state = parse(transport.send(pb2.Request(
+                get_inference_state=pb2.Request.GetInferenceState()).SerializeToString()))
+            self.assertEqual([str(i) for i in range(50)], list(state.inference_state.loaded_models))
+
+    def test_shared_connection(self):
+        with simulated_bonnet():
+            engines = [InferenceEngine() for _ in range(4)]
+            try:
+                self.assertEqual(1, len({engine._transport._connection for engine in engines}))
+
+                def run(engine):
+                    for _ in range(100):
+                        engine.get_system_info()
+
+                threads = [threading.Thread(target=run, args=(engine,)) for engine in engines]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                for engine in engines:
+                    engine.close()
+            self.assertFalse(_transport._connections)
+
+    def test_closed_connection(self):
+        with simulated_bonnet() as simulator:
+            transport = _transport._SocketTransport()
+        try:
+            with self.assertRaises(ConnectionError):
+                for _ in range(10):
+                    transport.send(GET_SYSTEM_INFO, timeout=1.0)
+                    time.sleep(0.1)
+        finally:
+            transport.close()
+
+
+class SocketConnectionErrorTest(unittest.TestCase):
+
+    def test_send_error(self):
+        done = threading.Event()
+        with fake_bonnet(lambda conn: done.wait(5.0)) as address:
+            connection = _transport._SocketConnection(address)
+            try:
+                pending = connection.submit(GET_SYSTEM_INFO)
+
+                def send_partially(sock, msg):
+                    sock.sendall(b'\0\0')
+                    raise OSError('Send failed.')
+
+                real_send = _transport._socket_send_message
+                _transport._socket_send_message = send_partially
+                try:
+                    with self.assertRaises(OSError):
+                        connection.submit(GET_SYSTEM_INFO)
+                finally:
+                    _transport._socket_send_message = real_send
+
+                # Connection is torn down, nothing waits forever.
+                with self.assertRaises(ConnectionError):
+                    pending.result(timeout=1.0)
+                with self.assertRaises(ConnectionError):
+                    connection.submit(GET_SYSTEM_INFO)
+                self.assertFalse(connection._pending)
+            finally:
+                done.set()
+                connection.close()
+
+    def test_unexpected_response(self):
+        def handle(conn):
+            _transport._socket_receive_message(conn)
+            # Two responses to one request.
+            _transport._socket_send_message(conn, b'first')
+            _transport._socket_send_message(conn, b'second')
+            conn.recv(1)  # Wait until the client closes.
+
+        with fake_bonnet(handle) as address:
+            connection = _transport._SocketConnection(address)
+            try:
+                self.assertEqual(b'first', connection.submit(GET_SYSTEM_INFO).result(1.0))
+                connection._reader.join(1.0)
+                self.assertFalse(connection._reader.is_alive())
+                with self.assertRaises(ConnectionError):
+                    connection.submit(GET_SYSTEM_INFO)
+            finally:
+                connection.close()
+
+
+class AsyncSocketTransportErrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_unexpected_response(self):
+        def handle(conn):
+            _transport._socket_receive_message(conn)
+            # Two responses to one request.
+            _transport._socket_send_message(conn, b'first')
+            _transport._socket_send_message(conn, b'second')
+            conn.recv(1)  # Wait until the client closes.
+
+        async def run(transport):
+            try:
+                self.assertEqual(b'first', await transport.send(GET_SYSTEM_INFO, timeout=1.0))
+                await asyncio.wait_for(transport._read_task, 1.0)
+                with self.assertRaises(ConnectionError):
+                    await transport.send(GET_SYSTEM_INFO, timeout=1.0)
+            finally:
+                await transport.close()
+
+        with fake_bonnet(handle) as address:
+            transport = _transport._AsyncSocketTransport(self.loop)
+            transport._address = address
+            self.loop.run_until_complete(run(transport))
+
+
+class SocketTransportBenchmark(unittest.TestCase):
+    NUM_REQUESTS = 2000
+
+    def test_throughput(self):
+        with simulated_bonnet(), contextlib.closing(_transport._SocketTransport()) as transport:
+            start = time.monotonic()
+            for _ in range(self.NUM_REQUESTS):
+                transport.send(GET_SYSTEM_INFO)
+            sequential = self.NUM_REQUESTS / (time.monotonic() - start)
+
+            start = time.monotonic()
+            pendings = [transport.submit(GET_SYSTEM_INFO) for _ in range(self.NUM_REQUESTS)]
+            for pending in pendings:
+                pending.result()
+            pipelined = self.NUM_REQUESTS / (time.monotonic() - start)
+
+        print('\nSequential: %.0f requests/s, pipelined: %.0f requests/s' %
+              (sequential, pipelined))
+
+if __name__ == '__main__':
+    unittest.main()
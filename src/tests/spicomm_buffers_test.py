@@ -0,0 +1,155 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Spicomm buffer pool tests against a fake device, no VisionBonnet required.
+
+Requests to the fake device are b'<response size>', responses are zero bytes.
+"""
+import os
+import struct
+import unittest
+
+from unittest import mock
+
+from aiy.vision import _spicomm
+from aiy.vision._spicomm import (FLAG_ERROR, FLAG_OVERFLOW, HEADER_SIZE, SPICOMM_IOCTL_TRANSACT,
+                                 SizeHistogram, SpicommOverflowError, SyncSpicomm)
+
+KB = 1024
+MB = 1024 * KB
+
+
+def fake_ioctl(dev, request, buf, *args):
+    if request != SPICOMM_IOCTL_TRANSACT:
+        return 0
+    _, timeout_ms, buffer_size, payload_size = struct.unpack_from('IIII', buf)
+    response_size = int(bytes(buf[HEADER_SIZE:HEADER_SIZE + payload_size]).rstrip(b'\0'))
+    if response_size > buffer_size - HEADER_SIZE:
+        flags = FLAG_ERROR | FLAG_OVERFLOW
+    else:
+        flags = 0
+        buf[HEADER_SIZE:HEADER_SIZE + response_size] = bytes(response_size)
+    struct.pack_into('IIII', buf, 0, flags, timeout_ms, buffer_size, response_size)
+    return 0
+
+
+def request(response_size, request_size=0):
+    return str(response_size).encode().ljust(request_size, b'\0')
+
+
+class SizeHistogramTest(unittest.TestCase):
+
+    def test_buckets(self):
+        histogram = SizeHistogram()
+        for size in (0, 1, 2, 3, 4, 5, 1000, 1024, 1025):
+            histogram.add(size)
+        self.assertEqual({1: 2, 2: 1, 4: 2, 8: 1, 1024: 2, 2048: 1}, histogram.buckets())
+        self.assertEqual(9, histogram.count)
+        self.assertEqual(2048, histogram.max())
+        self.assertEqual(0, SizeHistogram().max())
+
+
+class BufferPoolTest(unittest.TestCase):
+
+    def test_default_until_observed(self):
+        pool = _spicomm._BufferPool(12 * MB, 64 * KB)
+        self.assertEqual(16 * MB, len(pool.acquire(request(100, 10))) - HEADER_SIZE)
+        for _ in range(_spicomm._MIN_OBSERVATIONS):
+            pool.record(request(100, 10), 100)
+        self.assertEqual(64 * KB, len(pool.acquire(request(100, 10))) - HEADER_SIZE)
+        # Other requests of the same size and larger requests are not affected.
+        self.assertEqual(16 * MB, len(pool.acquire(request(200, 10))) - HEADER_SIZE)
+        self.assertEqual(16 * MB, len(pool.acquire(request(100, 100 * KB))) - HEADER_SIZE)
+
+    def test_large_requests_keyed_by_size_class(self):
+        pool = _spicomm._BufferPool(12 * MB, 64 * KB)
+        for _ in range(_spicomm._MIN_OBSERVATIONS):
+            pool.record(request(100, 100 * KB), 100)
+        self.assertEqual(128 * KB, len(pool.acquire(request(200, 90 * KB))) - HEADER_SIZE)
+
+    def test_keyed_requests_limit(self):
+        pool = _spicomm._BufferPool(12 * MB, 64 * KB)
+        for i in range(_spicomm._MAX_KEYED_REQUESTS + 1):
+            for _ in range(_spicomm._MIN_OBSERVATIONS):
+                pool.record(request(i), 100)
+        self.assertEqual(64 * KB, len(pool.acquire(request(0))) - HEADER_SIZE)
+        last = request(_spicomm._MAX_KEYED_REQUESTS)
+        self.assertEqual(16 * MB, len(pool.acquire(last)) - HEADER_SIZE)
+
+    def test_large_buffers_reused(self):
+        pool = _spicomm._BufferPool(1 * MB, 64 * KB)
+        first = pool.acquire(bytes(3 * MB))
+        self.assertIs(first, pool.acquire(bytes(3 * MB + 1)))
+        pool.acquire(bytes(5 * MB))
+        pool.acquire(bytes(9 * MB))
+        # Least recently used buffer is dropped.
+        self.assertIsNot(first, pool.acquire(bytes(3 * MB)))
+        stats = pool.stats()
+        self.assertEqual(4, stats.allocations)
+        self.assertEqual(HEADER_SIZE * 3 + 64 * KB + 4 * MB + 16 * MB, stats.resident_bytes)
+
+
+class SyncSpicommTest(unittest.TestCase):
+
+    def setUp(self):
+        patches = [mock.patch.object(_spicomm, 'SPICOMM_DEV', os.devnull),
+                   mock.patch.object(_spicomm.fcntl, 'ioctl', fake_ioctl)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_small_buffer(self):
+        with SyncSpicomm(default_payload_size=1 * MB, small_payload_size=4 * KB) as spicomm:
+            for _ in range(2 * _spicomm._MIN_OBSERVATIONS):
+                self.assertEqual(100, len(spicomm.transact(request(100))))
+            stats = spicomm.stats()
+        self.assertEqual(2 * _spicomm._MIN_OBSERVATIONS, stats.transactions)
+        self.assertEqual(_spicomm._MIN_OBSERVATIONS, stats.small_buffer_hits)
+        self.assertEqual(1, stats.allocations)
+        self.assertEqual({128: 2 * _spicomm._MIN_OBSERVATIONS}, stats.response_sizes.buckets())
+
+    def test_overflow_grows_buffer(self):
+        with SyncSpicomm(default_payload_size=1 * MB, small_payload_size=4 * KB) as spicomm:
+            for _ in range(_spicomm._MIN_OBSERVATIONS):
+                spicomm.transact(request(100, 1 * KB))
+            with self.assertRaises(SpicommOverflowError) as cm:
+                spicomm.transact(request(10 * KB, 1 * KB))
+            self.assertEqual(10 * KB, cm.exception.size)
+            self.assertEqual(10 * KB, len(spicomm.transact(request(10 * KB, 1 * KB))))
+            self.assertEqual(1, spicomm.stats().overflows)
+
+    def test_control_requests_keyed_by_bytes(self):
+        with SyncSpicomm(default_payload_size=1 * MB, small_payload_size=4 * KB) as spicomm:
+            for _ in range(_spicomm._MIN_OBSERVATIONS):
+                spicomm.transact(request(100))
+            # Request of the same size class, but not observed before.
+            self.assertEqual(10 * KB, len(spicomm.transact(request(10 * KB))))
+            self.assertEqual(0, spicomm.stats().overflows)
+
+    def test_grow(self):
+        with SyncSpicomm(default_payload_size=1 * MB) as spicomm:
+            with self.assertRaises(SpicommOverflowError) as cm:
+                spicomm.transact(request(3 * MB, 100))
+            spicomm.grow(cm.exception.size)
+            # Requests of other size classes fit as well.
+            self.assertEqual(3 * MB, len(spicomm.transact(request(3 * MB, 10))))
+
+    def test_large_request(self):
+        with SyncSpicomm(default_payload_size=1 * MB) as spicomm:
+            for _ in range(3):
+                self.assertEqual(10, len(spicomm.transact(request(10, 3 * MB))))
+            # Allocated once, then reused.
+            self.assertEqual(1, spicomm.stats().allocations)
+
+if __name__ == '__main__':
+    unittest.main()
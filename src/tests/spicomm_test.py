@@ -1,4 +1,5 @@
 import contextlib
+import functools
 import mmap
 import os
 import unittest
@@ -32,6 +33,13 @@ def get_camera_state(spicomm, timeout=None):
     response.ParseFromString(spicomm.transact(request.SerializeToString(), timeout))
     return response
 
+def get_camera_state_lease(spicomm, timeout=None):
+    request = pb2.Request(get_camera_state=pb2.Request.GetCameraState())
+    response = pb2.Response()
+    with spicomm.transact_lease(request.SerializeToString(), timeout) as data:
+        response.ParseFromString(data)
+    return response
+
 def get_invalid(spicomm, size, timeout=None):
     response = pb2.Response()
     response.ParseFromString(spicomm.transact(b'A' * size, timeout))
@@ -54,6 +62,17 @@ class SpicommTestMixin:
             response = get_camera_state(spicomm)
             self.assertEqual(pb2.Response.Status.OK, response.status.code)
 
+    def test_valid_request_lease(self):
+        with self.Spicomm() as spicomm:
+            for _ in range(3):
+                response = get_camera_state_lease(spicomm)
+                self.assertEqual(pb2.Response.Status.OK, response.status.code)
+
+    def test_valid_request_lease_force_allocate(self):
+        with self.Spicomm(default_payload_size=8) as spicomm:
+            response = get_camera_state_lease(spicomm)
+            self.assertEqual(pb2.Response.Status.OK, response.status.code)
+
     def test_invalid_request(self):
         with self.Spicomm() as spicomm:
             response = get_invalid(spicomm, 32)
@@ -81,6 +100,22 @@ class AsyncSpicommTest(SpicommTestMixin, unittest.TestCase):
 class SyncSpicommTest(SpicommTestMixin, unittest.TestCase):
     Spicomm = SyncSpicomm
 
+class SyncSpicommMmapDoubleBufferTest(SpicommTestMixin, unittest.TestCase):
+    Spicomm = functools.partial(SyncSpicommMmap, num_buffers=2)
+
+    def test_overlapping_leases(self):
+        request = pb2.Request(get_camera_state=pb2.Request.GetCameraState())
+        with self.Spicomm() as spicomm:
+            lease1 = spicomm.transact_lease(request.SerializeToString())
+            lease2 = spicomm.transact_lease(request.SerializeToString())
+            # Both buffers are leased, a temporary buffer is used.
+            lease3 = spicomm.transact_lease(request.SerializeToString())
+            for lease in (lease1, lease2, lease3):
+                response = pb2.Response()
+                response.ParseFromString(lease.data)
+                self.assertEqual(pb2.Response.Status.OK, response.status.code)
+                lease.release()
+
 class SyncSpicommMmapTest(SpicommTestMixin, unittest.TestCase):
     Spicomm = SyncSpicommMmap
 
@@ -0,0 +1,145 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Image to tensor packing tests, no VisionBonnet required."""
+import random
+import unittest
+
+from PIL import Image
+
+from aiy.vision import inference
+from aiy.vision.inference import InferenceException, RawImage
+
+
+def random_image(mode, size, seed=0):
+    rand = random.Random(seed)
+    depth = len(mode)
+    data = bytes(rand.randrange(256) for _ in range(size[0] * size[1] * depth))
+    return Image.frombytes(mode, size, data)
+
+
+def reference_data(image):
+    """Original planar conversion."""
+    if image.mode == 'RGB':
+        r, g, b = image.split()
+        return r.tobytes() + g.tobytes() + b.tobytes()
+    return image.tobytes()
+
+
+def shape(tensor):
+    return tensor.shape.width, tensor.shape.height, tensor.shape.depth
+
+
+class TensorPackerTestMixin:
+
+    def setUp(self):
+        self.packer = inference._TensorPacker()
+
+    def test_jpeg(self):
+        tensor = self.packer.pack(b'jpeg', size=(10, 10))
+        self.assertEqual((0, 0, 0), shape(tensor))
+        self.assertEqual(b'jpeg', tensor.data)
+
+    def test_pil(self):
+        for mode in ('RGB', 'L'):
+            image = random_image(mode, (31, 17))
+            tensor = self.packer.pack(image)
+            self.assertEqual((31, 17, len(mode)), shape(tensor))
+            self.assertEqual(reference_data(image), tensor.data)
+
+        tensor = self.packer.pack(random_image('RGB', (64, 48)), size=(16, 12))
+        self.assertEqual((16, 12, 3), shape(tensor))
+
+        image = random_image('RGB', (64, 48))
+        tensor = self.packer.pack(image, size=(20, 20), letterbox=True)
+        resized = inference._resize_pil(image, (20, 20),
+                                        inference._fit((64, 48), (20, 20), True))
+        self.assertEqual(reference_data(resized), tensor.data)
+
+        with self.assertRaises(InferenceException):
+            self.packer.pack(Image.new('RGBA', (4, 4)))
+
+    def test_raw(self):
+        image = random_image('RGB', (31, 17))
+        tensor = self.packer.pack(RawImage(image.tobytes(), 31, 17, 'rgb'))
+        self.assertEqual(reference_data(image), tensor.data)
+
+        bgr = image.tobytes('raw', 'BGR')
+        tensor = self.packer.pack(RawImage(bgr, 31, 17, 'bgr'))
+        self.assertEqual(reference_data(image), tensor.data)
+
+        gray = random_image('L', (31, 17))
+        tensor = self.packer.pack(RawImage(gray.tobytes(), 31, 17, 'gray'))
+        self.assertEqual((31, 17, 1), shape(tensor))
+        self.assertEqual(gray.tobytes(), tensor.data)
+
+        with self.assertRaises(InferenceException):
+            self.packer.pack(RawImage(b'', 0, 0, 'rgba'))
+
+
+class PythonTensorPackerTest(TensorPackerTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.np = inference.np
+        inference.np = None
+
+    def tearDown(self):
+        inference.np = self.np
+
+    def test_yuv(self):
+        with self.assertRaises(InferenceException):
+            self.packer.pack(RawImage(bytes(6), 2, 2, 'yuv'))
+
+
+@unittest.skipIf(inference.np is None, 'NumPy is not installed')
+class NumpyTensorPackerTest(TensorPackerTestMixin, unittest.TestCase):
+
+    def test_array(self):
+        np = inference.np
+        image = random_image('RGB', (31, 17))
+        tensor = self.packer.pack(np.asarray(image))
+        self.assertEqual((31, 17, 3), shape(tensor))
+        self.assertEqual(reference_data(image), tensor.data)
+
+        gray = random_image('L', (31, 17))
+        self.assertEqual(gray.tobytes(), self.packer.pack(np.asarray(gray)).data)
+
+        # Nearest neighbour resize by 2x takes every other pixel.
+        array = np.arange(64, dtype=np.uint8).reshape(8, 8)
+        tensor = self.packer.pack(array, size=(4, 4))
+        self.assertEqual((4, 4, 1), shape(tensor))
+        self.assertEqual(array[1::2, 1::2].tobytes(), tensor.data)
+
+        with self.assertRaises(InferenceException):
+            self.packer.pack(np.zeros((4, 4, 3), dtype=np.float32))
+
+    def test_yuv(self):
+        # Uniform gray, and picamera-padded uniform red (Y=76, U=85, V=255).
+        for (width, height), (y, u, v), rgb in (((8, 4), (128, 128, 128), (128, 128, 128)),
+                                                ((20, 10), (76, 85, 255), (254, 0, 0))):
+            frame_width, frame_height = (width, height) if width == 8 else (32, 16)
+            data = (bytes([y]) * frame_width * frame_height +
+                    bytes([u]) * (frame_width * frame_height // 4) +
+                    bytes([v]) * (frame_width * frame_height // 4))
+            tensor = self.packer.pack(RawImage(data, width, height, 'yuv'))
+            self.assertEqual((width, height, 3), shape(tensor))
+            n = width * height
+            for i, value in enumerate(rgb):
+                self.assertTrue(all(abs(p - value) <= 1 for p in tensor.data[i * n:(i + 1) * n]))
+
+        tensor = self.packer.pack(RawImage(data, 20, 10, 'yuv'), size=(5, 5))
+        self.assertEqual((5, 5, 3), shape(tensor))
+
+if __name__ == '__main__':
+    unittest.main()
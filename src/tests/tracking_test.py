@@ -0,0 +1,147 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Multi-object tracker tests, no VisionBonnet required."""
+import itertools
+import random
+import unittest
+
+from aiy.vision.models import tracking
+from aiy.vision.models.detections import Detections
+
+
+def detections(boxes, kinds=None):
+    return Detections([value for box in boxes for value in box], [0.9] * len(boxes), kinds)
+
+
+def moving_box(t, x0, y0, vx, vy, size=40):
+    return (x0 + vx * t, y0 + vy * t, size, size)
+
+
+class LinearAssignmentTest(unittest.TestCase):
+
+    def brute_force(self, cost):
+        rows, cols = len(cost), len(cost[0])
+        if rows <= cols:
+            return min(sum(cost[i][j] for i, j in enumerate(p))
+                       for p in itertools.permutations(range(cols), rows))
+        return min(sum(cost[i][j] for j, i in enumerate(p))
+                   for p in itertools.permutations(range(rows), cols))
+
+    def test_optimal(self):
+        rand = random.Random(0)
+        for rows, cols in ((1, 1), (3, 3), (5, 5), (2, 5), (6, 3), (4, 4)):
+            for _ in range(20):
+                cost = [[rand.choice((rand.random(), 1.0)) for _ in range(cols)]
+                        for _ in range(rows)]
+                pairs = tracking.linear_assignment(cost)
+                self.assertEqual(min(rows, cols), len(pairs))
+                self.assertEqual(len(pairs), len({i for i, _ in pairs}))
+                self.assertEqual(len(pairs), len({j for _, j in pairs}))
+                self.assertAlmostEqual(self.brute_force(cost),
+                                       sum(cost[i][j] for i, j in pairs))
+
+    def test_empty(self):
+        self.assertEqual([], tracking.linear_assignment([]))
+        self.assertEqual([], tracking.linear_assignment([[]]))
+
+
+class TrackerTest(unittest.TestCase):
+
+    def test_stable_ids(self):
+        tracker = tracking.Tracker(min_hits=1)
+        rand = random.Random(0)
+        ids = set()
+        for t in range(30):
+            boxes = [moving_box(t, 0, 100, 8, 0), moving_box(t, 240, 100, -8, 0)]
+            noisy = [tuple(v + rand.gauss(0, 1) for v in box) for box in boxes]
+            order = rand.sample(range(2), 2)  # Detection order doesn't matter.
+            tracks = tracker.update(detections([noisy[i] for i in order]))
+            self.assertEqual(2, len(tracks))
+            if abs(t - 15) > 2:  # Boxes cross at t = 15, ids follow the motion.
+                nearest = [min(tracks, key=lambda track: abs(track.bounding_box[0] - box[0]))
+                           for box in boxes]
+                ids.add(tuple(track.track_id for track in nearest))
+        self.assertEqual(1, len(ids))
+        self.assertEqual({1, 2}, set(ids.pop()))
+        for track in tracks:
+            self.assertAlmostEqual(8, abs(track.velocity[0]), delta=0.5)
+
+    def test_birth(self):
+        tracker = tracking.Tracker(min_hits=3)
+        box = [(10, 10, 50, 50)]
+        self.assertEqual([], tracker.update(detections(box)))
+        self.assertEqual([], tracker.update(detections(box)))
+        tracks = tracker.update(detections(box))
+        self.assertEqual([1], [track.track_id for track in tracks])
+        self.assertEqual(3, tracks[0].hits)
+        # Tentative tracks die on first miss.
+        tracker.update(detections([(300, 300, 50, 50)]))
+        tracker.update(detections([]))
+        tracks = tracker.update(detections([(300, 300, 50, 50)] + box))
+        self.assertEqual([1], [track.track_id for track in tracks])
+
+    def test_death(self):
+        tracker = tracking.Tracker(min_hits=1, max_age=2)
+        tracker.update(detections([(10, 10, 50, 50)]))
+        for misses in (1, 2):
+            tracks = tracker.update(detections([]))
+            self.assertEqual([(1, misses)], [(t.track_id, t.misses) for t in tracks])
+        # Detection is back within max_age, the id is kept.
+        self.assertEqual([1], [t.track_id for t in tracker.update(detections([(12, 10, 50, 50)]))])
+        for _ in range(3):
+            tracks = tracker.update(detections([]))
+        self.assertEqual([], tracks)
+        self.assertEqual([2], [t.track_id for t in tracker.update(detections([(12, 10, 50, 50)]))])
+
+    def test_per_class(self):
+        tracker = tracking.Tracker(min_hits=1)
+        tracker.update(detections([(10, 10, 50, 50)], kinds=[1]))
+        tracks = tracker.update(detections([(10, 10, 50, 50)], kinds=[2]))
+        self.assertEqual([(1, 1, 1), (2, 2, 0)], [(t.track_id, t.kind, t.misses) for t in tracks])
+        tracker = tracking.Tracker(min_hits=1, per_class=False)
+        tracker.update(detections([(10, 10, 50, 50)], kinds=[1]))
+        tracks = tracker.update(detections([(10, 10, 50, 50)], kinds=[2]))
+        self.assertEqual([(1, 2, 0)], [(t.track_id, t.kind, t.misses) for t in tracks])
+
+    def test_interpolation(self):
+        tracker = tracking.Tracker(min_hits=1)
+        # Detection runs on every 4th frame only.
+        for t in range(0, 40, 4):
+            tracker.update(detections([moving_box(t, 0, 0, 3, 2)]), timestamp=t)
+        for dt in (1, 2, 3):
+            track, = tracker.predict(36 + dt)
+            for actual, expected in zip(track.bounding_box, moving_box(36 + dt, 0, 0, 3, 2)):
+                self.assertAlmostEqual(expected, actual, delta=0.5)
+        self.assertEqual(36, tracker.time)
+        with self.assertRaises(ValueError):
+            tracker.update(detections([]), timestamp=30)
+
+    def test_item(self):
+        faces = Detections((10, 10, 50, 50), (0.8,), columns={'joy_scores': (0.5,)},
+                           make_item=lambda d, i: ('face', d.columns['joy_scores'][i]))
+        track, = tracking.Tracker(min_hits=1).update(faces)
+        self.assertEqual(('face', 0.5), track.item)
+        self.assertEqual(0.8, track.score)
+        self.assertIsNone(track.kind)
+
+    def test_reset(self):
+        tracker = tracking.Tracker(min_hits=1)
+        tracker.update(detections([(10, 10, 50, 50)]))
+        tracker.reset()
+        self.assertEqual([], tracker.tracks)
+        self.assertIsNone(tracker.time)
+        self.assertEqual([2], [t.track_id for t in tracker.update(detections([(10, 10, 50, 50)]))])
+
+if __name__ == '__main__':
+    unittest.main()